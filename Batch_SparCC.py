@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+'''
+Script to run SparCC over many count tables on one process pool.
+'''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
+from pathlib import Path
+from wasabi import msg
+import typer
+
+from sparcc.batch_methods import read_manifest, run_batch
+
+
+def main(
+    manifest: str = typer.Argument(..., help="Manifest (csv or yaml) or glob of count tables, e.g. 'sites/*.txt'"),
+    outpath: str = typer.Option('batch_output/', help="Folder of the outputs of the jobs without save_cor"),
+    n_workers: int = typer.Option(None, "--n-workers", "-w", help="Processes of the pool (default: the CPU quota)"),
+    scratch: str = typer.Option(None, help="Parent of the per-job scratch folders (default: system temp)"),
+    summary: str = typer.Option(None, help="Summary csv (default OUTPATH/batch_summary.csv)"),
+    n_iteractions: int = typer.Option(20, "--niteractions", "-nit", help="Default number of inference iterations"),
+    x_iteractions: int = typer.Option(10, "--xiteractions", "-xit", help="Default number of exclusion iterations"),
+    threshold: float = typer.Option(0.1, "--threshold", "-th", help="Default exclusion threshold"),
+    method: str = typer.Option('sparcc', help="Default method, sparcc | clr"),
+    normalization: str = typer.Option('dirichlet', help="Default method used to normalize the counts to fractions"),
+    verbose: bool = typer.Option(True)
+    ):
+    """
+    SparCC batch mode
+
+    Every count table is a job of a shared process pool, with its own
+    scratch folder, so several jobs (and several batches) can run in the
+    same directory. The largest tables are submitted first. The manifest
+    columns (or yaml keys) are data_input, and optionally name, save_cor,
+    save_cov, method, norm, n_iter, x_iter and threshold; missing values
+    take the defaults given here.
+
+    Usage:
+        $ python Batch_SparCC.py 'sites/*.txt' --outpath results/ -w 8
+        $ python Batch_SparCC.py manifest.csv --summary nightly.csv
+    """
+    defaults={'method':method,'norm':normalization,'n_iter':n_iteractions,
+              'x_iter':x_iteractions,'threshold':threshold}
+    jobs=read_manifest(manifest,outpath=outpath,defaults=defaults)
+    Path(outpath).mkdir(parents=True,exist_ok=True)
+    summary=summary or str(Path(outpath)/'batch_summary.csv')
+
+    msg.info(f"{len(jobs)} jobs")
+    report=run_batch(jobs,n_workers=n_workers,scratch=scratch,summary=summary,verbose=verbose)
+    failed=(report['status']!='done').sum()
+    if failed>0:
+        msg.warn(f"{failed} jobs failed, see {summary}")
+    msg.good(f"Summary saved in {summary}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -8,12 +8,28 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
 from sparcc.SparCC import main_alg
-from sparcc.io_methods import read_txt
+from sparcc.distributed_methods import distributed_corr
+from sparcc.query_methods import main_alg_query,resolve_query
+from sparcc.io_methods import read_counts
 from sparcc.logger import create_logger
 from sparcc.args import args
 from sparcc.util import clean_data_folder
+from sparcc.planner import recommend
+from sparcc.filter_methods import prefilter,expand_result,expand_knn,filter_report
+from sparcc.knn_methods import top_k_rows,knn_edges
+from sparcc.approx_methods import approx_edges
+from sparcc.sketch_methods import CorrelationSketch
 from sparcc.io_methods import write_txt
+from sparcc.store_methods import write_store
+from sparcc.profiler import PROFILER,span,enable_profiling
+from sparcc.resources import set_thread_budget,get_thread_budget
+from pandas import DataFrame
+import numpy as np
 
 
 def main():
@@ -24,53 +40,158 @@ def main():
     logger.info('============ Initialized logger ============')
     logger.info('\n'.join('%s: %s' % (k, str(v)) for k, v in sorted(dict(vars(args)).items(), key=lambda x: x[0])))
     logger.info('Start of Process')
+    if args.profile:
+        enable_profiling()
+    set_thread_budget(args.threads or get_thread_budget())
+    logger.info('Thread budget: {}'.format(get_thread_budget()))
     logger.info('Loading the file {}'.format(args.data_input))
     
-    #Load the file
-    try:
-        L1=read_txt(args.data_input,index_col=0)
-    except IOError as IOE:
-        raise (IOE)
-    if L1.shape[0]==0:
-        logger.info('A problem has occurred with the file, it will be resolved.')
-        flags_write=True
-        
-        try:
-            L1=read_txt(args.data_input,sep=',')
-        except IOError as IOE:
-            raise (IOE)
-    assert L1.shape[0]!=0,"ERROR!"
-
-
+    #Load the file, OTUs in the rows
+    with span('read_counts'):
+        counts,otus,samples=read_counts(args.data_input)
+        L1=DataFrame(counts,index=samples,columns=otus,copy=False)
     
     logger.info('Data loading done.')
+    labels=L1.columns
+    keep=None
+    if any(v is not None for v in [args.prevalence,args.min_count,args.top_n]):
+        with span('prefilter'):
+            filtered,keep=prefilter(L1,prevalence=args.prevalence,min_count=args.min_count,top_n=args.top_n)
+        report=filter_report(L1,keep,n_iter=args.n_iter,x_iter=args.x_iter)
+        logger.info('Prefilter: {components_before} -> {components_after} components, '
+                    '{pooled_count_fraction:.2%} of the counts pooled into "other", '
+                    'estimated speedup {speedup:.1f}x'.format(**report))
+        L1=filtered
+    choice=recommend(L1.shape[0],L1.shape[1],n_iter=args.n_iter,x_iter=args.x_iter)
+    logger.info('Memory plan:\n{}'.format(choice['modes'].to_string()))
+    # main_alg runs the spilled mode
+    if choice['mode'] is None:
+        logger.warning('The predicted peak memory ({:.2f} GB) is above the available memory'.format(
+            choice['modes'].loc['spilled','peak_bytes']/1e9))
     logger.info("Calculation started")
-    
+
+    #Query mode: only the rows of the given OTUs
+    if args.query is not None:
+        if keep is not None and not all(q in [str(c) for c in L1.columns] for q in args.query.split(',')):
+            raise ValueError('Some query OTUs were removed by the prefilter')
+        query=resolve_query(L1,args.query.split(','))
+        cor,cov=main_alg_query(frame=L1,query=query,method=args.method,norm=args.norm,
+        n_iter=args.n_iter,verbose=args.verbose,th=args.threshold,x_iter=args.x_iter)
+        logger.info("Calculation done!")
+        print("Shape of Correlation Matrix:",cor.shape)
+
+        if keep is None:
+            cor=DataFrame(cor,columns=labels)
+            cov=DataFrame(cov,columns=labels)
+        else:
+            cor=expand_result(cor,keep,labels,rows=False)
+            cov=expand_result(cov,keep,labels,rows=False)
+        cor.index=cov.index=L1.columns[query]
+        logger.info("Saving Correlation file in {}".format(args.save_cor))
+        with span('write_txt'):
+            write_txt(frame=cor,file_name=args.save_cor,T=False)
+        if args.save_cov !=None:
+            logger.info("Saving Covariance file in {}".format(args.save_cov))
+            write_txt(frame=cov,file_name=args.save_cov,T=False)
+
+    #k-NN graph: only the top_k partners of every OTU
+    elif args.top_k is not None:
+        if args.backend=='distributed':
+            cor,_=distributed_corr(frame=L1,method=args.method,norm=args.norm,
+            n_iter=args.n_iter,verbose=args.verbose,th=args.threshold,x_iter=args.x_iter,
+            client=args.scheduler)
+            knn_index,knn_value=top_k_rows(cor,args.top_k)
+        else:
+            knn_index,knn_value=main_alg(frame=L1,method=args.method,norm=args.norm,
+            n_iter=args.n_iter,verbose=args.verbose,log=args.log,
+            th=args.threshold,x_iter=args.x_iter,path_subdir_cor=args.path_corr_file,
+            path_subdir_cov=args.path_cov_file,top_k=args.top_k)
+
+        logger.info("Calculation done!")
+        if keep is not None:
+            knn_index,knn_value=expand_knn(knn_index,knn_value,keep)
+        edges=knn_edges(knn_index,knn_value,labels)
+        print("Edges of the k-NN graph:",edges.shape[0])
+
+        logger.info("Saving the k-NN edge list in {}".format(args.save_cor))
+        with span('write_txt'):
+            write_txt(frame=edges,file_name=args.save_cor,T=False,index=False)
+
+        if args.store is not None:
+            logger.info("Saving the result store in {}".format(args.store))
+            with span('write_store'):
+                write_store(args.store,labels,knn_index=knn_index,knn_value=knn_value)
+
+    #Approximate edge list, without any D x D matrix
+    elif args.approx is not None:
+        if args.method!='sparcc':
+            raise ValueError('--approx only supports the sparcc method')
+        edges=approx_edges(L1,edge_th=args.approx,norm=args.norm,th=args.threshold,
+        x_iter=args.x_iter,k=args.sketch_dim)
+        # the pooled "other" component is not an OTU
+        edges=edges[edges['source'].isin(labels)&edges['target'].isin(labels)]
+        logger.info("Calculation done!")
+        print("Edges with |cor| >= {}:".format(args.approx),edges.shape[0])
+
+        logger.info("Saving the edge list in {}".format(args.save_cor))
+        with span('write_txt'):
+            write_txt(frame=edges,file_name=args.save_cor,T=False,index=False)
+
     #SparCC Algorithm
-    cor,cov=main_alg(frame=L1,method=args.method,norm=args.norm,
-    n_iter=args.n_iter,verbose=args.verbose,log=args.log,
-    th=args.threshold,x_iter=args.x_iter,path_subdir_cor=args.path_corr_file,
-    path_subdir_cov=args.path_cov_file)
-    
-    logger.info("Calculation done!")
-    print("Shape of Correlation Matrix:",cor.shape)
-    print("Shape of Covariance Matrix:",cov.shape)
+    else:
+        if args.backend=='distributed':
+            cor,cov=distributed_corr(frame=L1,method=args.method,norm=args.norm,
+            n_iter=args.n_iter,verbose=args.verbose,th=args.threshold,x_iter=args.x_iter,
+            client=args.scheduler)
+        else:
+            sketch=None
+            if args.ci is not None:
+                alpha=(1.-args.ci)/2
+                sketch=CorrelationSketch(L1.shape[1],quantiles=(alpha,1.-alpha))
+            cor,cov=main_alg(frame=L1,method=args.method,norm=args.norm,
+            n_iter=args.n_iter,verbose=args.verbose,log=args.log,
+            th=args.threshold,x_iter=args.x_iter,path_subdir_cor=args.path_corr_file,
+            path_subdir_cov=args.path_cov_file,sketch=sketch)
 
-    #Save Correlation
-    logger.info("Saving Correlation file in {}".format(args.save_cor))
-    
-    write_txt(frame=cor,file_name=args.save_cor)
-    print("Ok")
+        logger.info("Calculation done!")
+        if keep is not None:
+            cor=expand_result(cor,keep,labels)
+            cov=expand_result(cov,keep,labels)
+        print("Shape of Correlation Matrix:",cor.shape)
+        print("Shape of Covariance Matrix:",cov.shape)
 
+        #Save Correlation
+        logger.info("Saving Correlation file in {}".format(args.save_cor))
 
-    #Save Covariance
-    if args.save_cov !=None:
-        logger.info("Saving Covariance file in {}".format(args.save_cor))
-        write_txt(frame=cor,file_name=args.save_cov)
+        with span('write_txt'):
+            write_txt(frame=cor,file_name=args.save_cor)
+        print("Ok")
+
+
+        #Save Covariance
+        if args.save_cov !=None:
+            logger.info("Saving Covariance file in {}".format(args.save_cov))
+            write_txt(frame=cov,file_name=args.save_cov)
+
+        if args.store is not None:
+            logger.info("Saving the result store in {}".format(args.store))
+            with span('write_store'):
+                write_store(args.store,labels,cor=cor,cov=cov,variances=np.diag(cov))
+                if args.ci is not None:
+                    summary=sketch.result()
+                    intervals={'cor_'+name:summary[name] for name in summary if name.startswith('q')}
+                    intervals['cor_sd']=summary['sd']
+                    if keep is not None:
+                        intervals={name:expand_result(a,keep,labels) for name,a in intervals.items()}
+                    write_store(args.store,labels,**intervals)
 
     logger.info("Clean Folder")
-    clean_data_folder(path_folder=args.path_corr_file)
-    clean_data_folder(path_folder=args.path_cov_file)
+    clean_data_folder(path_folder=args.savedir)
+
+    if args.profile:
+        logger.info('Saving the run report in {}.profile.json/csv'.format(args.name))
+        logger.info('\n'+PROFILER.summary().to_string())
+        PROFILER.save('%s.profile' % (args.name))
     logger.info('Finished')
 
 if __name__ == '__main__':
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+'''
+Script to compare the SparCC correlations of two groups of samples.
+'''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
+from wasabi import msg
+import pandas as pd
+import typer
+
+from sparcc.io_methods import read_counts, write_txt
+from sparcc.store_methods import write_store
+from sparcc.differential_methods import differential_corr
+
+
+def main(
+    data_input: str = typer.Option('example/fake_data.txt', "--data_input", "-di", help="Path file input"),
+    groups: str = typer.Option(..., "--groups", "-g", help="Table of the samples (first column) and their group"),
+    group_column: str = typer.Option(None, help="Column of the groups (default: the first one after the samples)"),
+    nperm: int = typer.Option(100, "--nperm", "-np", help="Label permutations for the p-values"),
+    type_pvalues: str = typer.Option('two_sided', help="two_sided | one_sided"),
+    method: str = typer.Option('sparcc', help="sparcc | clr"),
+    normalization: str = typer.Option('dirichlet', help="pseudo | normalize | dirichlet"),
+    n_iteractions: int = typer.Option(20, "--niteractions", "-nit", help="Number of estimations, used only with dirichlet"),
+    x_iteractions: int = typer.Option(10, "--xiteractions", "-xit"),
+    threshold: float = typer.Option(0.1, "--threshold", "-th"),
+    seed: int = typer.Option(None, help="Seed of the permutations"),
+    out_diff: str = typer.Option(None, help="csv file for the differences of the correlations"),
+    out_pvals: str = typer.Option(None, help="csv file for the p-values of the differences"),
+    store: str = typer.Option(None, help="Result store for the correlations of both groups, diff and p_vals"),
+    verbose: bool = typer.Option(False)
+    ):
+    """
+    Differential SparCC
+
+    SparCC is computed in both groups and the difference of the
+    correlations of every pair is tested with label permutations. The
+    log fractions are computed once, every permutation only splits their
+    statistics between the groups.
+
+    Usage:
+        $ python Differential_SparCC.py -di counts.txt -g groups.csv -np 200 --out-diff diff.csv --out-pvals diff_pvals.csv
+    """
+    if out_diff is None and out_pvals is None and store is None:
+        msg.fail("Give --out-diff, --out-pvals and/or --store", exits=1)
+
+    counts,otus,samples=read_counts(data_input,verbose=verbose)
+    table=pd.read_csv(groups,sep=None,engine='python',index_col=0)
+    table.index=table.index.astype(str)
+    labels=table[group_column] if group_column is not None else table.iloc[:,0]
+    missing=samples.difference(labels.index)
+    if len(missing)>0:
+        msg.fail(f"{len(missing)} samples without group, e.g. {list(missing[:3])}", exits=1)
+    labels=labels.reindex(samples).astype(str).values
+
+    result=differential_corr(counts,labels,nperm=nperm,test_type=type_pvalues,method=method,
+                             norm=normalization,n_iter=n_iteractions,th=threshold,
+                             x_iter=x_iteractions,seed=seed,verbose=verbose)
+    a,b=sorted(set(labels))
+    msg.info(f"diff = {a} - {b}")
+    for name,file_name in [('diff',out_diff),('p_vals',out_pvals)]:
+        if file_name is not None and name in result:
+            write_txt(pd.DataFrame(result[name],index=otus,columns=otus),file_name)
+            msg.good(f"{name} saved in {file_name}")
+    if store is not None:
+        write_store(store,otus,**result)
+        msg.good(f"Store saved in {store}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,4 +1,8 @@
 #!/usr/bin/env python3
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
 from pathlib import Path
 import shutil
 import yaml
@@ -8,6 +12,29 @@ import typer
 
 
 
+def run_pipeline(data_input,method,n_iteractions,x_iteractions,threshold,normalization,
+                 save_corr_file,save_cov_file,num_simulate_data,type_pvalues,outfile_pvals,
+                 queue_depth,n_workers,seed):
+    '''
+    SparCC and pseudo p-values with sampling, estimation and accumulation
+    running concurrently, see sparcc.pipeline_methods.
+    '''
+    import pandas as pd
+    from sparcc.io_methods import read_counts,write_txt
+    from sparcc.pipeline_methods import pipelined_pvalues
+
+    counts,otus,samples=read_counts(data_input)
+    cor,cov,p_vals=pipelined_pvalues(counts,nperm=int(num_simulate_data),test_type=type_pvalues,
+                                     method=method,th=threshold,x_iter=x_iteractions,
+                                     n_iter=n_iteractions,norm=normalization,n_workers=n_workers,
+                                     depth=queue_depth,seed=seed)
+    for frame,file_name in [(cor,save_corr_file),(cov,save_cov_file),(p_vals,outfile_pvals)]:
+        if file_name is not None:
+            Path(file_name).parent.mkdir(parents=True,exist_ok=True)
+            write_txt(pd.DataFrame(frame,index=otus,columns=otus),file_name)
+            msg.good(f"Saved {file_name}")
+
+
 def main(
     configuration_file: str = typer.Option('configuration.yml', help="Configuration File"),
     name : str = typer.Option('experiment_sparCC', help="Log Name"),
@@ -25,7 +52,11 @@ def main(
     outpath:str=typer.Option('example/pvals/'),
     type_pvalues:str=typer.Option('one_sided'),
     outfile_pvals:str=typer.Option('example/pvals/pvals_one_sided.csv'),
-    name_output_file:str=typer.Option('sparcc_test_version_kambucha')
+    name_output_file:str=typer.Option('sparcc_test_version_kambucha'),
+    pipeline:bool=typer.Option(False,help="Overlap the sampling, the estimations and the p-values in one process pool"),
+    queue_depth:int=typer.Option(4,help="Permuted tables drawn ahead of the pool with --pipeline"),
+    n_workers:int=typer.Option(None,help="Processes of the pool with --pipeline (default: the CPU quota)"),
+    seed:int=typer.Option(0,help="Seed of the draws and permutations with --pipeline")
     ):
     """
     Script for end-to-end execution of SparCC
@@ -37,6 +68,13 @@ def main(
     Usage:
         $ python General_Execution.py
 
+    With --pipeline the permuted tables are drawn in a thread, ahead of
+    a process pool that estimates them while the previous results are
+    accumulated into the p-values; the permuted tables and their
+    correlations are not written to disk.
+
+        $ python General_Execution.py --pipeline --queue-depth 8
+
     Note: 
     Depending on the size of the given OTU matrix, it
     is the time it takes to calculate all the stages. 
@@ -70,6 +108,14 @@ def main(
         outpath=Conf_Cat['outpath'] 
         type_pvalues=Conf_Cat['type_pvalues']
         outfile_pvals=Conf_Cat['outfile_pvals']
+        pipeline=Conf_Cat.get('pipeline',pipeline)
+        queue_depth=Conf_Cat.get('queue_depth',queue_depth)
+
+    if pipeline:
+        run_pipeline(data_input,method,n_iteractions,x_iteractions,threshold,normalization,
+                     save_corr_file,save_cov_file,num_simulate_data,type_pvalues,outfile_pvals,
+                     queue_depth,n_workers,seed)
+        return
 
     #Covalence Matrix?
     if save_cov_file== None:
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+'''
+Script for the jackknife stability of the SparCC correlations.
+'''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
+from wasabi import msg
+import pandas as pd
+import typer
+
+from sparcc.io_methods import read_counts, write_txt
+from sparcc.store_methods import write_store
+from sparcc.jackknife_methods import jackknife_corr
+
+
+def main(
+    data_input: str = typer.Option('example/fake_data.txt', "--data_input", "-di", help="Path file input"),
+    method: str = typer.Option('sparcc', help="sparcc | clr"),
+    normalization: str = typer.Option('pseudo', help="pseudo | normalize | dirichlet"),
+    n_iteractions: int = typer.Option(20, "--niteractions", "-nit", help="Number of estimations, used only with dirichlet"),
+    x_iteractions: int = typer.Option(10, "--xiteractions", "-xit"),
+    threshold: float = typer.Option(0.1, "--threshold", "-th"),
+    out_cor: str = typer.Option(None, help="csv file for the correlations of all the samples"),
+    out_var: str = typer.Option(None, help="csv file for the jackknife variances"),
+    store: str = typer.Option(None, help="Result store for cor, cov, jack_mean, jack_var and n"),
+    verbose: bool = typer.Option(False)
+    ):
+    """
+    Jackknife SparCC
+
+    Every sample is left out in turn and the spread of the correlations
+    is reported as the jackknife variance of every pair. The statistics
+    of the log fractions are computed once and downdated for every
+    sample left out.
+
+    Usage:
+        $ python Jackknife_SparCC.py -di counts.txt --out-cor cor.csv --out-var jack_var.csv
+    """
+    if out_cor is None and out_var is None and store is None:
+        msg.fail("Give --out-cor, --out-var and/or --store", exits=1)
+
+    counts,otus,samples=read_counts(data_input,verbose=verbose)
+    result=jackknife_corr(counts,method=method,norm=normalization,n_iter=n_iteractions,
+                          th=threshold,x_iter=x_iteractions,verbose=verbose)
+    for name,file_name in [('cor',out_cor),('jack_var',out_var)]:
+        if file_name is not None:
+            write_txt(pd.DataFrame(result[name],index=otus,columns=otus),file_name)
+            msg.good(f"{name} saved in {file_name}")
+    if store is not None:
+        write_store(store,otus,**result)
+        msg.good(f"Store saved in {store}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -4,49 +4,13 @@
 Script for making simulated datasets used to get pseudo p-values.
 
 '''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
 import os
-import numpy as np 
-import pandas as pd 
 from sparcc.io_methods import read_txt, write_txt
-from typing import Union
-
-def permute_w_replacement(frame:Union[pd.DataFrame,np.ndarray], axis=0):
-    '''
-    Permute the frame values across the given axis.
-    Create simulated dataset were the counts of each component (column)
-    in each sample (row), are randomly sampled from the all the 
-    counts of that component in all samples.
-    
-    Parameters
-    ----------
-    frame : Numpy Array
-        Frame to permute.
-    axis : {0, 1}
-        - 0 - Permute row values across columns
-        - 1 - Permute column values across rows    
-    
-    Returns
-    -------
-    Permuted DataFrame (new instance).
-    '''
- 
-    if isinstance(frame,pd.DataFrame):
-        frame=frame.values
-
-    fp=lambda x:np.random.permutation(x)  
-
-    if axis==0:
-        #Along the columns
-        aux=np.apply_along_axis(fp,0,frame)        
-        aux=np.apply_along_axis(fp,1,aux)
-        return  aux
-
-    elif axis==1:
-        #Along the rows
-        aux=np.apply_along_axis(fp,1,frame)
-        aux=np.apply_along_axis(fp,0,aux)
-        return aux
-    
+from sparcc.permutation_methods import permute_w_replacement
 
 def make_bootstraps(counts, nperm, perm_template, outpath='./', iprint=0):
     '''
@@ -3,18 +3,15 @@ Created on Apr 8, 2013
 @author: jonathanfriedman
 '''
 
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
 import numpy as np
-from pathlib import Path
 from pandas import DataFrame as DF
 from sparcc.io_methods import read_txt, write_txt
-
-def compare2sided(perm,real):
-    return np.abs(perm) >= np.abs(real)
-
-def compare1sided(perm,real): 
-    inds_abs = compare2sided(perm,real)
-    inds_sign = np.sign(perm) == np.sign(real)
-    return inds_abs & inds_sign
+from sparcc.permutation_methods import get_compare
+from sparcc.store_methods import write_store
 
 def get_pvalues(cor, perm_template, nperm, test_type='two_sided',iprint=0):
 
@@ -49,12 +46,7 @@ def get_pvalues(cor, perm_template, nperm, test_type='two_sided',iprint=0):
         Computed pseudo p-values.
     '''
     #Definition of the type of test
-    if test_type == 'two_sided': 
-        cmpfun = compare2sided
-    elif test_type == 'one_sided':
-        cmpfun = compare1sided
-    else:
-        raise ValueError('unsupported test type "%s"' %test_type)
+    cmpfun = get_compare(test_type)
     
     #DataFrame
     n_sig = DF(np.zeros(cor.shape), 
@@ -68,13 +60,14 @@ def get_pvalues(cor, perm_template, nperm, test_type='two_sided',iprint=0):
         cor_perm = read_txt(permfile,index_col=0).values #Read each file
         n_sig[cmpfun(cor_perm, cor)] += 1  
     
-    p_vals = 1.*n_sig/nperm
-    p_vals.values[np.diag_indices_from(p_vals.values)] = 1 
+    p_vals = 1.*n_sig.values/nperm
+    p_vals[np.diag_indices_from(p_vals)] = 1 
+    p_vals = DF(p_vals, index=cor.index, columns=cor.columns)
     
     return p_vals
     
 
-def main(cor_file, perm_template, nperm, test_type='two_sided', outfile=None):
+def main(cor_file, perm_template, nperm, test_type='two_sided', outfile=None, store=None):
     '''
     Compute pseudo p-vals from a set correlations obtained from permuted data' 
     Pseudo p-vals are the percentage of times a correlation at least 
@@ -97,6 +90,8 @@ def main(cor_file, perm_template, nperm, test_type='two_sided', outfile=None):
         outfile = cor_file +'.nperm_%d.pvals' %nperm
     
     write_txt(p_vals, outfile)
+    if store is not None:
+        write_store(store, p_vals.columns, p_vals=p_vals.values)
     
 
 if __name__ == '__main__':
@@ -119,6 +114,8 @@ if __name__ == '__main__':
                       help="Type of p-values to computed.  one_sided | two_sided (default).")
     parser.add_option("-o", "--outfile", dest="outfile", default=None, type = 'str',
                       help="Name of file to which p-values will be written.")
+    parser.add_option("-s", "--store", dest="store", default=None, type = 'str',
+                      help="Result store (folder) to which p-values will also be added.")
     (options, args) = parser.parse_args()
     real_cor_file   = args[0]
     perm_template   = args[1]
@@ -126,5 +123,5 @@ if __name__ == '__main__':
     test_type = options.type
     outfile = options.outfile
      
-    main(real_cor_file, perm_template, n, test_type, outfile)
+    main(real_cor_file, perm_template, n, test_type, outfile, options.store)
     
\ No newline at end of file
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+'''
+Script to compute the pseudo p-values in shards (e.g. array jobs).
+
+Each shard runs the permutations [start, stop) and writes only their
+exceedance counts. merge sums the partial files into the p-values.
+'''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
+from glob import glob
+from pathlib import Path
+from wasabi import msg
+import typer
+
+from sparcc.io_methods import read_txt, write_txt
+from sparcc.shard_methods import shard_counts, save_partial, merge_partials
+from sparcc.store_methods import write_store
+
+app = typer.Typer()
+
+
+def _read(file_name):
+    frame=read_txt(file_name,index_col=0,verbose=False)
+    if frame.shape[0]==0:
+        frame=read_txt(file_name,sep=',',index_col=0,verbose=False)
+    assert frame.shape[0]!=0,"ERROR!"
+    return frame
+
+@app.command()
+def shard(
+    counts_file: str = typer.Argument(..., help="Counts file (OTUs x samples, as Compute_SparCC.py)"),
+    cor_file: str = typer.Argument(..., help="Correlations whose p-values are computed"),
+    start: int = typer.Option(0, help="First permutation of the shard"),
+    stop: int = typer.Option(100, help="End (excluded) of the permutations of the shard"),
+    seed: int = typer.Option(0, help="Seed of the permutation stream, the same for all the shards"),
+    test_type: str = typer.Option('two_sided', "--type", "-t", help="one_sided | two_sided"),
+    n_iteractions: int = typer.Option(20, "--niteractions", "-nit", help="Number of inference iterations to average over"),
+    x_iteractions: int = typer.Option(10, "--xiteractions", "-xit", help="Number of exclusion iterations"),
+    threshold: float = typer.Option(0.1, "--threshold", "-th", help="Correlation strength exclusion threshold"),
+    method: str = typer.Option('sparcc', help="sparcc | clr"),
+    normalization: str = typer.Option('dirichlet', help="Method used to normalize the counts to fractions"),
+    output: str = typer.Option(None, "--output", "-o", help="Partial file (default partial_START_STOP.npz)"),
+    verbose: bool = typer.Option(False)
+    ):
+    """
+    Exceedance counts of the permutations [start, stop)
+
+    Usage:
+        $ python Shard_Pvalues.py shard example/fake_data.txt cor_sparcc.csv --start 0 --stop 100 -o partials/p0.npz
+    """
+    counts=_read(counts_file)
+    cor=_read(cor_file)
+    if output is None:
+        output=f'partial_{start}_{stop}.npz'
+    Path(output).parent.mkdir(parents=True,exist_ok=True)
+
+    msg.info(f"Permutations [{start}, {stop}), counts shape {counts.shape}")
+    n_sig=shard_counts(counts,cor.values,start,stop,seed=seed,test_type=test_type,
+                       method=method,th=threshold,x_iter=x_iteractions,
+                       n_iter=n_iteractions,norm=normalization,verbose=verbose)
+    save_partial(output,n_sig,start,stop,seed,test_type,cor.values,labels=cor.columns,
+                 method=method,th=threshold,x_iter=x_iteractions,
+                 n_iter=n_iteractions,norm=normalization)
+    msg.good(f"Partial counts saved in {output}")
+
+@app.command()
+def merge(
+    partials: str = typer.Argument(..., help="Glob of the partial files, e.g. 'partials/*.npz'"),
+    output: str = typer.Option('pvals.csv', "--output", "-o", help="p-values file"),
+    store: str = typer.Option(None, help="Result store (folder) to which the p-values are also added")
+    ):
+    """
+    Sum the partial counts into the pseudo p-values
+
+    Usage:
+        $ python Shard_Pvalues.py merge 'partials/*.npz' -o pvals.csv
+    """
+    files=sorted(glob(partials))
+    p_vals,nperm=merge_partials(files)
+    write_txt(p_vals,output)
+    if store is not None:
+        write_store(store,p_vals.columns,p_vals=p_vals.values)
+    msg.good(f"p-values of {nperm} permutations ({len(files)} partials) saved in {output}")
+
+
+if __name__ == "__main__":
+    app()
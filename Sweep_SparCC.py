@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+'''
+Script to evaluate SparCC over a grid of thresholds and exclusion iterations.
+'''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
+from pathlib import Path
+from pandas import DataFrame
+from wasabi import msg
+import typer
+
+from sparcc.io_methods import read_txt, write_txt
+from sparcc.sweep_methods import make_grid, sweep_corr
+
+
+def main(
+    data_input: str = typer.Option('example/fake_data.txt', "--data_input", "-di", help="Path file input"),
+    thresholds: str = typer.Option('0.05,0.1,0.2', "--thresholds", "-th", help="Comma separated exclusion thresholds"),
+    x_iteractions: str = typer.Option('5,10', "--xiteractions", "-xit", help="Comma separated numbers of exclusion iterations"),
+    n_iteractions: int = typer.Option(20, "--niteractions", "-nit", help="Number of inference iterations to average over"),
+    method: str = typer.Option('sparcc', help="sparcc | clr"),
+    normalization: str = typer.Option('dirichlet', help="Method used to normalize the counts to fractions"),
+    outpath: str = typer.Option('example/sweep/', help="Folder for the output files"),
+    save_cov: bool = typer.Option(False, help="Save the covariance of each grid point"),
+    verbose: bool = typer.Option(False)
+    ):
+    """
+    SparCC parameter sweep
+
+    The fractions and the variation matrix are computed once per
+    iteration and shared by all the grid points.
+    The output folder gets sweep_grid.csv, with the label of each
+    grid point, and cor_sweep_#.csv (cov_sweep_#.csv) where # is the
+    row of the grid.
+
+    Usage:
+        $ python Sweep_SparCC.py -di example/fake_data.txt -th 0.05,0.1,0.2 -xit 5,10 -nit 5
+    """
+    counts=read_txt(data_input,index_col=0,verbose=False)
+    if counts.shape[0]==0:
+        counts=read_txt(data_input,sep=',',index_col=0,verbose=False)
+    assert counts.shape[0]!=0,"ERROR!"
+
+    grid=make_grid([float(t) for t in thresholds.split(',')],
+                   [int(x) for x in x_iteractions.split(',')])
+    msg.info(f"Sweep over {len(grid)} grid points, counts shape {counts.shape}")
+
+    grid,cor_stack,cov_stack=sweep_corr(counts,grid,method=method,
+                                        n_iter=n_iteractions,norm=normalization,
+                                        verbose=verbose)
+
+    outpath=Path(outpath)
+    outpath.mkdir(parents=True,exist_ok=True)
+    labels=counts.columns
+    for g in range(len(grid)):
+        write_txt(DataFrame(cor_stack[g],index=labels,columns=labels),outpath/f'cor_sweep_{g}.csv')
+        if save_cov:
+            write_txt(DataFrame(cov_stack[g],index=labels,columns=labels),outpath/f'cov_sweep_{g}.csv')
+    grid.to_csv(outpath/'sweep_grid.csv',index_label='grid_point')
+    print(grid.to_string())
+    msg.good(f"Sweep saved in {outpath}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
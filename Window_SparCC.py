@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+'''
+Script to compute SparCC over sliding windows of a sample-ordered count table.
+'''
+# numba and BLAS read their thread counts when they are loaded
+from sparcc.resources import default_thread_env
+default_thread_env()
+
+from wasabi import msg
+import typer
+
+from sparcc.io_methods import read_txt
+from sparcc.window_methods import sliding_window_corr
+
+
+def main(
+    data_input: str = typer.Option('example/fake_data.txt', "--data_input", "-di", help="Path file input, samples (columns) in time order"),
+    window: int = typer.Option(50, "--window", "-w", help="Number of samples per window"),
+    step: int = typer.Option(10, "--step", "-s", help="Shift between consecutive windows"),
+    method: str = typer.Option('sparcc', help="sparcc | clr"),
+    normalization: str = typer.Option('pseudo', help="pseudo | normalize | dirichlet"),
+    n_iteractions: int = typer.Option(20, "--niteractions", "-nit", help="Number of estimations, used only with dirichlet"),
+    x_iteractions: int = typer.Option(10, "--xiteractions", "-xit"),
+    threshold: float = typer.Option(0.1, "--threshold", "-th"),
+    out_stack: str = typer.Option(None, help="hdf5 file for the stack of correlation matrices"),
+    out_edges: str = typer.Option(None, help="csv file for the edges of each window"),
+    edge_th: float = typer.Option(0.3, help="Minimum |cor| of the edges written to out_edges"),
+    verbose: bool = typer.Option(False)
+    ):
+    """
+    Sliding-window SparCC
+
+    The statistics of the log fractions are updated with the samples
+    entering and leaving the window, so each step costs in proportion
+    to the shift and not to the window size.
+
+    Usage:
+        $ python Window_SparCC.py -di example/fake_data.txt -w 50 -s 10 --out-edges example/window_edges.csv
+    """
+    if out_stack is None and out_edges is None:
+        msg.fail("Give --out-stack and/or --out-edges", exits=1)
+
+    counts=read_txt(data_input,index_col=0,verbose=False)
+    if counts.shape[0]==0:
+        counts=read_txt(data_input,sep=',',index_col=0,verbose=False)
+    assert counts.shape[0]!=0,"ERROR!"
+
+    starts=sliding_window_corr(counts,window,step,out_stack=out_stack,out_edges=out_edges,
+                               edge_th=edge_th,verbose=verbose,method=method,norm=normalization,
+                               n_iter=n_iteractions,th=threshold,x_iter=x_iteractions)
+    msg.good(f"{len(starts)} windows processed")
+
+
+if __name__ == "__main__":
+    typer.run(main)
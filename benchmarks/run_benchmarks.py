@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+'''
+Benchmark suite of the SparCC stages over a ladder of sizes.
+
+Each stage (to_fractions, variation_mat, basis_var, run_sparcc, main_alg,
+get_pvalues and approx_sparcc) is timed on synthetic multinomial
+log-normal data with increasing number of components, each one in a new
+process so that its peak RSS is not hidden by the previous stages.
+approx_sparcc also records the recall of the exact edges and the error
+of the edges found, against run_sparcc. Wall time, CPU time and
+peak memory are written to a json file that can be compared between
+versions.
+
+Usage:
+    $ python benchmarks/run_benchmarks.py --sizes 50,100,200,500 --output bench.json
+    $ python benchmarks/run_benchmarks.py --sizes 50,100,200,500 --compare bench.json
+'''
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import warnings
+import multiprocessing
+from pathlib import Path
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import typer
+from wasabi import msg
+
+ROOT=Path(__file__).resolve().parents[1]
+sys.path.insert(0,str(ROOT))
+
+from sparcc.core_methods import to_fractions
+from sparcc.compositional_methods import variation_mat_tiled
+from sparcc.SparCC import basis_var_lowrank,run_sparcc,main_alg
+from sparcc.approx_methods import run_sparcc_approx
+from sparcc.io_methods import write_txt
+from sparcc.synthetic_methods import make_counts,make_frame
+from PseudoPvals import get_pvalues
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES=['to_fractions','variation_mat','basis_var','run_sparcc','main_alg','get_pvalues','approx_sparcc']
+# approx_sparcc is checked against run_sparcc up to this size
+APPROX_CHECK_MAX=5000
+APPROX_EDGE_TH=0.3
+
+
+def max_rss_mb():
+    '''
+    Peak RSS of this process so far, None without the resource module.
+    '''
+    if resource is None:
+        return None
+    rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss/1e6 if sys.platform=='darwin' else rss/1e3
+
+def measure(fun,*args,**kwargs):
+    '''
+    Run fun and return its output with the wall time, CPU time and
+    peak memory.
+
+    The times and the peak RSS come from a first pass; the traced
+    numpy/python allocations from a second pass, as tracemalloc slows
+    down every allocation. base_rss_mb and peak_rss_mb are the peak RSS
+    of the process before and after the first pass, the stage peak when
+    it runs in a new process (see stage_record).
+    '''
+    rss=max_rss_mb()
+    wall,cpu=time.perf_counter(),time.process_time()
+    out=fun(*args,**kwargs)
+    wall,cpu=time.perf_counter()-wall,time.process_time()-cpu
+    record={'wall_s':wall,'cpu_s':cpu}
+    if rss is not None:
+        record.update(base_rss_mb=rss,peak_rss_mb=max_rss_mb())
+
+    tracemalloc.start()
+    fun(*args,**kwargs)
+    _,peak=tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    record['peak_traced_mb']=peak/1e6
+    return out,record
+
+def run_stage(stage,counts,n_iter,nperm,x_iter):
+    '''
+    Prepare the inputs of a stage (untimed) and measure it.
+    '''
+    D=counts.shape[1]
+    fracs=to_fractions(counts)
+    if stage=='to_fractions':
+        return measure(to_fractions,counts)[1]
+    if stage=='variation_mat':
+        return measure(variation_mat_tiled,fracs)[1]
+    if stage=='basis_var':
+        # the solve of sparcc_path, without excluded pairs
+        return measure(basis_var_lowrank,variation_mat_tiled(fracs).sum(axis=1))[1]
+    if stage=='run_sparcc':
+        return measure(run_sparcc,fracs,x_iter=x_iter)[1]
+    if stage=='approx_sparcc':
+        (i,j,cor,_,_),record=measure(run_sparcc_approx,fracs,edge_th=APPROX_EDGE_TH,x_iter=x_iter,seed=0)
+        record['n_edges']=len(i)
+        if D<=APPROX_CHECK_MAX:
+            # recall of the exact edges and error of the edges found
+            C=run_sparcc(fracs,x_iter=x_iter)[0]
+            iu=np.triu_indices(D,1)
+            exact=np.abs(C[iu])>=APPROX_EDGE_TH
+            record['recall']=float(len(set(zip(i,j))&set(zip(iu[0][exact],iu[1][exact])))/max(exact.sum(),1))
+            record['max_abs_err']=float(np.max(np.abs(C[i,j]-cor))) if len(i) else 0.
+        return record
+
+    cwd=os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            if stage=='main_alg':
+                for sub in ['data/corr_files','data/cov_files']:
+                    os.makedirs(sub)
+                return measure(main_alg,make_frame(counts),n_iter=n_iter,x_iter=x_iter,
+                               path_subdir_cor='data/corr_files',path_subdir_cov='data/cov_files',
+                               verbose=False)[1]
+            if stage=='get_pvalues':
+                cor=make_frame(np.corrcoef(fracs.T))
+                cor.index=cor.columns
+                rng=np.random.default_rng(0)
+                for i in range(nperm):
+                    perm=np.tanh(rng.normal(0,0.3,(D,D)))
+                    write_txt(make_frame(perm),'perm_cor_%d.csv'%i,index=True)
+                return measure(get_pvalues,cor,'perm_cor_#.csv',nperm)[1]
+        finally:
+            os.chdir(cwd)
+    raise ValueError('Unknown stage "%s"' %stage)
+
+def stage_record(stage,n_samples,D,density,sparsity,seed,n_iter,nperm,x_iter):
+    '''
+    Measure a stage in this process, after compiling its numba kernels
+    on a small input.
+    '''
+    warnings.simplefilter('ignore')
+    run_stage(stage,make_counts(20,16,seed=seed)[0],1,1,x_iter)
+    counts,_=make_counts(n_samples,D,density=density,sparsity=sparsity,seed=seed)
+    return run_stage(stage,counts,n_iter,nperm,x_iter)
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git','rev-parse','--short','HEAD'],cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+def compare(results,previous_file):
+    '''
+    Print the wall time ratio against a previous results file.
+    '''
+    with open(previous_file) as f:
+        previous={(r['stage'],r['D']):r for r in json.load(f)['results'] if 'wall_s' in r}
+    print('%-14s %8s %12s %12s %8s'%('stage','D','previous_s','current_s','ratio'))
+    for r in results:
+        key=(r['stage'],r['D'])
+        if 'wall_s' in r and key in previous:
+            old=previous[key]['wall_s']
+            print('%-14s %8d %12.4f %12.4f %8.2f'%(r['stage'],r['D'],old,r['wall_s'],r['wall_s']/old))
+
+def main(
+    sizes: str = typer.Option('50,100,200,500,1000,2000,5000,10000,20000', help="Comma separated numbers of components"),
+    n_samples: int = typer.Option(200, help="Number of samples"),
+    density: float = typer.Option(0.01, help="Fraction of truly correlated pairs"),
+    sparsity: float = typer.Option(0.0, help="Extra fraction of zero counts"),
+    stages: str = typer.Option(','.join(STAGES), help="Comma separated stages"),
+    n_iter: int = typer.Option(5, help="Iterations of main_alg"),
+    x_iter: int = typer.Option(10, help="Exclusion iterations"),
+    nperm: int = typer.Option(10, help="Permutation files for get_pvalues"),
+    max_seconds: float = typer.Option(120., help="Larger sizes of a stage are skipped once it takes longer than this"),
+    seed: int = typer.Option(0),
+    output: str = typer.Option('bench_results.json', help="Results file"),
+    compare_to: str = typer.Option(None, "--compare", help="Previous results file to compare with")
+    ):
+    """
+    Timing and peak memory of each SparCC stage over a size ladder.
+    """
+    warnings.simplefilter('ignore')
+    sizes=[int(d) for d in sizes.split(',')]
+    stages=stages.split(',')
+
+    results,slow=[],set()
+    for D in sizes:
+        for stage in stages:
+            record={'stage':stage,'D':D,'n_samples':n_samples}
+            if stage in slow:
+                record['skipped']='previous size over max_seconds'
+            else:
+                # a new process per stage, for its own peak RSS
+                try:
+                    with ProcessPoolExecutor(1,mp_context=multiprocessing.get_context('spawn')) as pool:
+                        record.update(pool.submit(stage_record,stage,n_samples,D,density,sparsity,
+                                                  seed,n_iter,nperm,x_iter).result())
+                    if record['wall_s']>max_seconds:
+                        slow.add(stage)
+                except (MemoryError,BrokenProcessPool) as e:
+                    record['skipped']=type(e).__name__
+                    slow.add(stage)
+            results.append(record)
+            msg.info(json.dumps(record))
+
+    report={'revision':git_revision(),
+            'date':datetime.now().isoformat(),
+            'python':platform.python_version(),
+            'numpy':np.__version__,
+            'machine':platform.machine(),
+            'cpu_count':os.cpu_count(),
+            'parameters':{'n_samples':n_samples,'density':density,'sparsity':sparsity,
+                          'n_iter':n_iter,'x_iter':x_iter,'nperm':nperm,'seed':seed},
+            'results':results}
+    with open(output,'w') as f:
+        json.dump(report,f,indent=1)
+    msg.good(f"Results saved in {output}")
+
+    if compare_to is not None:
+        compare(results,compare_to)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -1,8 +1,7 @@
 '''
 Main functions for estimating SparCC
 '''
-from glob import glob
-from numba import njit
+from numba import njit,prange
 from typing import List,Any
 
 import h5py
@@ -13,7 +12,9 @@ import numpy as np
 
 
 from .core_methods import to_fractions
-from .compositional_methods import run_clr,variation_mat
+from .compositional_methods import run_clr,variation_mat_tiled
+from .profiler import span,count
+from .knn_methods import median_top_k
 
 
 try:
@@ -33,12 +34,11 @@ def Mesh(a:int):
     A2=A1.copy()
     return A1.T,A2
 
-def new_excluded_pair(C:Any,previously_excluded:List=[],th:float=0.1):
+def strongest_pair(C:Any,previously_excluded:List=[]):
     '''
     Find component pair with highest correlation among pairs that 
     weren't previously excluded.
-    Return the i,j of pair if it's correlaiton >= than th.
-    Otherwise return None.
+    Return the i,j of pair and its absolute correlation.
     '''
     C_temp = np.triu(np.abs(C),1).copy() # work only on upper triangle, excluding diagonal
     
@@ -46,7 +46,16 @@ def new_excluded_pair(C:Any,previously_excluded:List=[],th:float=0.1):
         C_temp[tuple(zip(*previously_excluded))] = 0
      
     a = np.unravel_index(np.argmax(C_temp), C_temp.shape) 
-    cmax = C_temp[a]
+    return a, C_temp[a]
+
+def new_excluded_pair(C:Any,previously_excluded:List=[],th:float=0.1):
+    '''
+    Find component pair with highest correlation among pairs that 
+    weren't previously excluded.
+    Return the i,j of pair if it's correlaiton >= than th.
+    Otherwise return None.
+    '''
+    a, cmax = strongest_pair(C, previously_excluded)
 
     if cmax > th:
         return a
@@ -58,6 +67,7 @@ def basis_var(Var_mat,M,V_min:float=1e-4):
     Estimate the variances of the basis of the compositional data x.
     Assumes that the correlations are sparse (mean correlation is small).
     The element of V_mat are refered to as t_ij in the SparCC paper.
+    Reference dense solve, sparcc_path uses basis_var_lowrank.
     '''
 
     if isinstance(Var_mat,np.ndarray):
@@ -72,87 +82,294 @@ def basis_var(Var_mat,M,V_min:float=1e-4):
     basis_variance=da.where(V_base <= 0,V_min,V_base).compute()
     return basis_variance
 
+def basis_var_lowrank(V_vec,excluded_pairs:List=[],excluded_comp:List=[],V_min:float=1e-4):
+    '''
+    Estimate the basis variances without building the D x D matrix M.
+
+    M starts as ones + diag(D-2) and every excluded pair (i,j) subtracts
+    (e_i+e_j)(e_i+e_j)^T, so it is a diagonal plus a low rank update and
+    the system can be solved with the Woodbury identity in O(D*k^2),
+    k being the number of excluded pairs.
+    Rows of excluded components are set to the identity, as in run_sparcc.
+
+    Parameters
+    ----------
+    V_vec : array
+        Row sums of the (masked) variation matrix, t_i in the SparCC paper.
+    excluded_pairs : list of (i,j)
+        Pairs removed from the system.
+    excluded_comp : list of int
+        Components removed from the system.
+    V_min : float, default 1e-4
+        Lower bound of the estimated variances.
+    '''
+    V_vec=np.asarray(V_vec,dtype=np.float64)
+    D=len(V_vec)
+    keep=np.ones(D,dtype=bool)
+    keep[np.asarray(excluded_comp,dtype=np.int64)]=False
+
+    U=np.zeros((D,len(excluded_pairs)+1))
+    U[:,0]=keep
+    for p,(i,j) in enumerate(excluded_pairs):
+        U[i,p+1]=keep[i]
+        U[j,p+1]=keep[j]
+    c_inv=-np.ones(U.shape[1])
+    c_inv[0]=1.
+
+    b=np.where(keep,V_vec,0.)
+    a=D-2.
+    K=np.diag(c_inv)+U.T@U/a
+    V_base=b/a-U@np.linalg.solve(K,U.T@b)/a**2
+    V_base=np.where(keep,V_base,0.)
+    return np.where(V_base <= 0,V_min,V_base)
+
+
+@njit()
+def _cov_cor_row(Var_mat,V_base,Cov,C,i):
+    sd_i=np.sqrt(V_base[i])
+    for j in range(i,V_base.shape[0]):
+        cov=0.5*(V_base[i]+V_base[j]-Var_mat[i,j])
+        c=cov/sd_i/np.sqrt(V_base[j])
+        Cov[i,j]=cov
+        Cov[j,i]=cov
+        C[i,j]=c
+        C[j,i]=c
+
+@njit(parallel=True)
+def _fill_cov_cor(Var_mat,V_base,Cov,C):
+    '''
+    Cov = 0.5*(Vi+Vj-Var_mat) and C = Cov/sqrt(Vi)/sqrt(Vj) in one pass
+    over the upper triangle, mirrored. Rows r and D-1-r go to the same
+    thread so every thread gets the same share of the triangle.
+    '''
+    D=V_base.shape[0]
+    for r in prange((D+1)//2):
+        _cov_cor_row(Var_mat,V_base,Cov,C,r)
+        if D-1-r!=r:
+            _cov_cor_row(Var_mat,V_base,Cov,C,D-1-r)
+
+@njit()
+def _cov_row(cor,var,cov,i):
+    sd_i=np.sqrt(var[i])
+    for j in range(i,var.shape[0]):
+        v=cor[i,j]*sd_i*np.sqrt(var[j])
+        cov[i,j]=v
+        cov[j,i]=v
+
+@njit(parallel=True)
+def _fill_cov_from_cor(cor,var,cov):
+    '''
+    cov = cor*sqrt(var_i)*sqrt(var_j) over the upper triangle, mirrored.
+    '''
+    D=var.shape[0]
+    for r in prange((D+1)//2):
+        _cov_row(cor,var,cov,r)
+        if D-1-r!=r:
+            _cov_row(cor,var,cov,D-1-r)
 
 def C_from_V(Var_mat,V_base):
     '''
     Given the estimated basis variances and observed fractions variation matrix, 
     compute the basis correlation & covaraince matrices.
     '''
-
-    Vi, Vj = Mesh(V_base)
-    Cov_base = 0.5*(Vi + Vj - Var_mat)
-    C_base = Cov_base/np.sqrt(Vi) / np.sqrt(Vj)
+    D=len(V_base)
+    C_base, Cov_base = np.empty((D,D)), np.empty((D,D))
+    _fill_cov_cor(np.asarray(Var_mat,dtype=np.float64),np.asarray(V_base,dtype=np.float64),Cov_base,C_base)
     return C_base, Cov_base
 
+def cov_from_cor(cor,var):
+    '''
+    Covariance matrix of the correlations cor (symmetric) and the
+    variances var.
+    '''
+    cov=np.empty(cor.shape)
+    _fill_cov_from_cor(np.asarray(cor,dtype=np.float64),np.asarray(var,dtype=np.float64),cov)
+    return cov
 
-def run_sparcc(frame, th:float=0.1,x_iter:int=10):
+
+class Workspace(object):
     '''
-    Estimate the correlations of the basis of the compositional data f.
-    Assumes that the correlations are sparse (mean correlation is small).
+    Buffers of sparcc_path for D components.
+
+    The masked variation matrix, the basis covariance and correlation
+    matrices and the vectors of the exclusion search are allocated once
+    and updated in place at every exclusion step, and by every call given
+    the same workspace. The basis variances are solved with the Woodbury
+    form of basis_var_lowrank, so M is never built.
     '''
-    ## observed log-ratio variances
-    Var_mat = variation_mat(frame)
-    Var_mat_temp=Var_mat.copy()
-    
-    ## Make matrix from eqs. 13 of SparCC paper such that: t_i = M * Basis_Varainces
-    D = frame.shape[1] # number of components
-    M = np.ones((D,D)) + np.diag([D-2]*D)
- 
-    ## get approx. basis variances and from them basis covariances/correlations 
-    V_base = basis_var(Var_mat_temp, M)
-    C_base, Cov_base = C_from_V(Var_mat, V_base)
+
+    def __init__(self, D:int, x_iter:int=10):
+        self.D = D
+        self.var_mat = np.empty((D,D))
+        self.C = np.empty((D,D))
+        self.Cov = np.empty((D,D))
+        self.V_vec = np.empty(D)
+        self.row_best = np.empty(D)
+        self.row_arg = np.empty(D, dtype=np.int64)
+        self.row_nan = np.empty(D, dtype=np.int64)
+        self.n_excluded = np.zeros(D, dtype=np.int64)
+        self.excluded = np.empty((max(x_iter,1),2), dtype=np.int64)
+
+    def reset(self, Var_mat, x_iter:int):
+        if Var_mat.shape != (self.D,self.D):
+            raise ValueError('Workspace for D=%d, got a %s matrix' %(self.D,Var_mat.shape))
+        if x_iter > len(self.excluded):
+            self.excluded = np.empty((x_iter,2), dtype=np.int64)
+        np.copyto(self.var_mat, Var_mat)
+        self.n_excluded[:] = 0
+
+@njit(parallel=True)
+def _row_strongest(C,excluded,row_best,row_arg,row_nan):
+    '''
+    Per row of the upper triangle of |C|: the first largest value and its
+    column (-1 if all zero), and the column of the first NaN (-1 if none),
+    skipping the excluded pairs.
+    '''
+    D=C.shape[0]
+    for i in prange(D):
+        best=0.
+        arg=-1
+        nan=-1
+        for j in range(i+1,D):
+            v=abs(C[i,j])
+            if v>best or v!=v:
+                skip=False
+                for p in range(excluded.shape[0]):
+                    if excluded[p,0]==i and excluded[p,1]==j:
+                        skip=True
+                if skip:
+                    continue
+                if v!=v:
+                    nan=j
+                    break
+                best=v
+                arg=j
+        row_best[i]=best
+        row_arg[i]=arg
+        row_nan[i]=nan
+
+def strongest_pair_inplace(ws:Workspace,n_excluded:int):
+    '''
+    strongest_pair on ws.C without copies: same pair and value as the
+    argmax over the upper triangle (first NaN if any, as np.argmax).
+    '''
+    _row_strongest(ws.C,ws.excluded[:n_excluded],ws.row_best,ws.row_arg,ws.row_nan)
+    nan_rows=np.flatnonzero(ws.row_nan>=0)
+    if len(nan_rows)>0:
+        i=nan_rows[0]
+        return (i,ws.row_nan[i]), np.nan
+    i=np.argmax(ws.row_best)
+    if ws.row_arg[i]<0:
+        return (0,0), 0.
+    return (i,ws.row_arg[i]), ws.row_best[i]
+
+def C_from_V_inplace(Var_mat,V_base,ws:Workspace):
+    '''
+    C_from_V writing into ws.Cov and ws.C.
+    '''
+    _fill_cov_cor(np.asarray(Var_mat,dtype=np.float64),V_base,ws.Cov,ws.C)
+    return ws.C, ws.Cov
+
+def sparcc_path(Var_mat, th:float=0.1,x_iter:int=10,workspace:Workspace=None):
+    '''
+    Generator over the states of the SparCC exclusion refinement.
+
+    The state after k exclusions does not depend on th or x_iter, these
+    only decide where the refinement stops, so a single path run with the
+    smallest th and the largest x_iter contains the results of any other
+    (th,x_iter) pair.
+
+    The states are written in the buffers of workspace (a new Workspace
+    by default): the yielded arrays are overwritten by the next step,
+    copy them to keep intermediate states.
+
+    Yields
+    ------
+    C_base: array
+        Basis correlation matrix of the current state.
+    Cov_base: array
+        Basis covariance matrix of the current state.
+    cmax: float
+        Correlation of the strongest pair not yet excluded, the refinement
+        continues only if cmax > th. None for the state reached after x_iter
+        exclusions.
+    If too many components are excluded (None,None,None) is yielded and
+    the clr result should be used.
+    '''
+    D = Var_mat.shape[1] # number of components
+    ws = Workspace(D, x_iter) if workspace is None else workspace
+    ws.reset(Var_mat, x_iter)
+
+    ## get approx. basis variances (eqs. 13 of SparCC paper: t_i = M * Basis_Varainces)
+    ## and from them basis covariances/correlations
+    with span('basis_var'):
+        np.sum(ws.var_mat, axis=1, out=ws.V_vec)
+        V_base = basis_var_lowrank(ws.V_vec)
+    with span('C_from_V'):
+        C_base, Cov_base = C_from_V_inplace(Var_mat, V_base, ws)
     
     ## Refine by excluding strongly correlated pairs
     excluded_pairs = []
-    excluded_comp  = np.array([])
+    excluded_comp  = []
 
     for xi in range(x_iter):
         # search for new pair to exclude
-        to_exclude = new_excluded_pair(C=C_base,th=th, previously_excluded=excluded_pairs)
+        with span('exclusion_search'):
+            to_exclude, cmax = strongest_pair_inplace(ws, len(excluded_pairs))
+        yield C_base, Cov_base, cmax
     
-        if to_exclude is None: #terminate if no new pairs to exclude
-            break
+        if not cmax > th: #terminate if no new pairs to exclude
+            return
         # exclude pair
-        excluded_pairs.append(to_exclude)
         i,j = to_exclude
-        M[i,j] -= 1
-        M[j,i] -= 1
-        M[i,i] -= 1
-        M[j,j] -= 1
-        #inds = zip(*excluded_pairs)
-    
-        inda,indb=np.transpose(excluded_pairs)
-        Var_mat_temp[inda,indb]   = 0
-        Var_mat_temp.T[inda,indb] = 0
+        ws.excluded[len(excluded_pairs)] = i,j
+        excluded_pairs.append((i,j))
+        ws.var_mat[i,j] = 0
+        ws.var_mat[j,i] = 0
 
         # search for new components to exclude
-        nexcluded = np.bincount(np.ravel(excluded_pairs)) #number of excluded pairs for each component
-        excluded_comp_prev = set(excluded_comp.copy())
-        excluded_comp      = np.where(nexcluded>=D-3)[0]
-        excluded_comp_new  = set(excluded_comp) - excluded_comp_prev
+        ws.n_excluded[i] += 1 #number of excluded pairs for each component
+        ws.n_excluded[j] += 1
+        excluded_comp_new = [c for c in (i,j) if ws.n_excluded[c]>=D-3 and c not in excluded_comp]
 
         if len(excluded_comp_new)>0:
+            excluded_comp += excluded_comp_new
             # check if enough components left 
             if len(excluded_comp) > D-4:
-                warnings.warn('Too many component excluded. Returning clr result.')
-                return run_clr(frame)
-            for xcomp in excluded_comp_new:
-                Var_mat_temp[xcomp,:] = 0
-                Var_mat_temp[:,xcomp] = 0
-                M[xcomp,:] = 0
-                M[:,xcomp] = 0
-                M[xcomp,xcomp] = 1
+                yield None, None, None
+                return
+            ws.var_mat[excluded_comp_new,:] = 0
+            ws.var_mat[:,excluded_comp_new] = 0
         #run another sparcc iteration
-        V_base = basis_var(Var_mat_temp, M)
-        C_base, Cov_base = C_from_V(Var_mat, V_base)
+        with span('basis_var'):
+            np.sum(ws.var_mat, axis=1, out=ws.V_vec)
+            V_base = basis_var_lowrank(ws.V_vec, excluded_pairs, excluded_comp)
+        with span('C_from_V'):
+            C_base, Cov_base = C_from_V_inplace(Var_mat, V_base, ws)
         
         # set excluded components infered values to nans
-        for xcomp in excluded_comp:
-            V_base[xcomp] = np.nan
-            C_base[xcomp,:] = np.nan
-            C_base[:,xcomp] = np.nan
-            Cov_base[xcomp,:] = np.nan
-            Cov_base[:,xcomp] = np.nan
+        if len(excluded_comp)>0:
+            C_base[excluded_comp,:] = np.nan
+            C_base[:,excluded_comp] = np.nan
+            Cov_base[excluded_comp,:] = np.nan
+            Cov_base[:,excluded_comp] = np.nan
+    yield C_base, Cov_base, None
+
+def run_sparcc(frame, th:float=0.1,x_iter:int=10):
+    '''
+    Estimate the correlations of the basis of the compositional data f.
+    Assumes that the correlations are sparse (mean correlation is small).
+    '''
+    ## observed log-ratio variances
+    with span('variation_mat'):
+        Var_mat = variation_mat_tiled(frame)
+
+    for n_excluded, (C_base, Cov_base, _) in enumerate(sparcc_path(Var_mat, th=th, x_iter=x_iter)):
+        if C_base is None:
+            warnings.warn('Too many component excluded. Returning clr result.')
+            count('clr_fallback', 1)
+            return run_clr(frame)
+    count('excluded_pairs', n_excluded)
     return  C_base, Cov_base
 
 def basic_corr(frame, method:str='sparcc',th:float=0.1,x_iter:int=10):
@@ -202,6 +419,7 @@ def basic_corr(frame, method:str='sparcc',th:float=0.1,x_iter:int=10):
         tol = 1e-3 # tolerance for correlation range
         if np.max(np.abs(C_base)) > 1 + tol:
             warnings.warn('Sparcity assumption violated. Returning clr result.')
+            count('clr_fallback', 1)
             C_base, Cov_base = run_clr(frame)    
     else:
         raise ValueError('Unsupported basis correlation method: "%s"' %method)
@@ -215,6 +433,9 @@ def main_alg(frame,method:str='sparcc',
              log:bool=True,
              path_subdir_cor:str='./',
              path_subdir_cov:str='./',
+             top_k:int=None,
+             block_size:int=512,
+             sketch=None,
              verbose:bool=True):
     '''
     The main function to organize the execution of the algorithm and the 
@@ -246,6 +467,16 @@ def main_alg(frame,method:str='sparcc',
         Folder path for the temporary correlation estimates file.
     path_subdir_cov:str,default './'
         Folder path for the temporary covariance estimates file
+    top_k : int, default None
+        Keep only the top_k strongest partners (by |correlation|) of
+        every component. The median is then taken by row blocks and each
+        block reduced to its partners, the full correlation matrix is
+        never built, see knn_methods.
+    block_size : int, default 512
+        Rows of each median block with top_k.
+    sketch : QuantileSketch, default None
+        Updated with the correlations of every iteration as it finishes,
+        e.g. a CorrelationSketch for intervals, see sketch_methods.
     verbose : bool, default True 
 
     Returns
@@ -255,31 +486,54 @@ def main_alg(frame,method:str='sparcc',
     Cov_base: array
         Estimated basis covariance matrix.
 
+    With top_k, instead:
+
+    knn_index: array
+        D x top_k partners of every component, strongest first.
+    knn_value: array
+        D x top_k median correlations with the partners.
     '''
         
     if method in ['sparcc', 'clr']:
+        filenames_cor,filenames_cov=[],[]
         for i in range(n_iter):
             if verbose: print ('\tRunning iteration '+ str(i))
             logging.info("Running iteration {}".format(i))
-            fracs = to_fractions(frame, method=norm)
-            cor_sparse, cov_sparse = basic_corr(fracs, method=method,th=th,x_iter=x_iter)
-            var_cov=np.diag(cov_sparse)
-            #Create files 
-            
-            file_name_cor=path_subdir_cor+'/cor_{:08d}.hdf5'.format(i)
-            file_name_cov=path_subdir_cov+'/cov_{:08d}.hdf5'.format(i)
-
-            h5f_cor=h5py.File(file_name_cor,'w')
-            h5f_cov=h5py.File(file_name_cov,'w')
-            h5f_cor.create_dataset('dataset',data=cor_sparse,shape=cor_sparse.shape)
-            h5f_cov.create_dataset('dataset',data=var_cov,shape=var_cov.shape)
-            h5f_cor.close()
-            h5f_cov.close()
-
-        logging.info("Processing the files from data directory")
-        filenames_cor=sorted([f for f in glob('data' + "**/corr_files/*", recursive=True)])
-        filenames_cov=sorted([f for f in glob('data' + "**/cov_files/*", recursive=True)])
+            with span('iteration', iteration=i):
+                with span('to_fractions'):
+                    fracs = to_fractions(frame, method=norm)
+                with span('basic_corr'):
+                    cor_sparse, cov_sparse = basic_corr(fracs, method=method,th=th,x_iter=x_iter)
+                if sketch is not None:
+                    with span('sketch'):
+                        sketch.update(cor_sparse)
+                var_cov=np.diag(cov_sparse)
+                #Create files 
+                
+                file_name_cor=path_subdir_cor+'/cor_{:08d}.hdf5'.format(i)
+                file_name_cov=path_subdir_cov+'/cov_{:08d}.hdf5'.format(i)
+                filenames_cor.append(file_name_cor)
+                filenames_cov.append(file_name_cov)
+
+                with span('hdf5_write'):
+                    h5f_cor=h5py.File(file_name_cor,'w')
+                    h5f_cov=h5py.File(file_name_cov,'w')
+                    h5f_cor.create_dataset('dataset',data=cor_sparse,shape=cor_sparse.shape)
+                    h5f_cov.create_dataset('dataset',data=var_cov,shape=var_cov.shape)
+                    h5f_cor.close()
+                    h5f_cov.close()
+
+        # only the files written by this run, other runs may share the folders
+        logging.info("Processing the files from {} and {}".format(path_subdir_cor,path_subdir_cov))
         dsets_cor = [h5py.File(filename, mode='r') for filename in filenames_cor]
+        if top_k is not None:
+            with span('median_top_k'):
+                knn_index,knn_value=median_top_k([dset['dataset'] for dset in dsets_cor],top_k,block_size=block_size)
+            for dset in dsets_cor:
+                dset.close()
+            logging.info("The main process has finished")
+            return knn_index,knn_value
+
         dsets_cov = [h5py.File(filename, mode='r') for filename in filenames_cov]
         arrays_cor = [da.from_array(dset['dataset']) for dset in dsets_cor]
         arrays_cov = [da.from_array(dset['dataset']) for dset in dsets_cov]
@@ -287,13 +541,14 @@ def main_alg(frame,method:str='sparcc',
         cor_array = da.asarray(arrays_cor)
         cov_array = da.asarray(arrays_cov)
 
-        var_med=da.nanmedian(cov_array,axis=0).compute()
-        cor_med=da.nanmedian(cor_array,axis=0).compute()
-        
-        var_med=var_med
+        with span('median'):
+            var_med=da.nanmedian(cov_array,axis=0).compute()
+            cor_med=da.nanmedian(cor_array,axis=0).compute()
+        for dset in dsets_cor+dsets_cov:
+            dset.close()
 
-        x,y=Mesh(var_med)
-        cov_med=cor_med*x**0.5*y**0.5
+        with span('cov_med'):
+            cov_med=cov_from_cor(cor_med,var_med)
         logging.info("The main process has finished")
 
         return cor_med,cov_med
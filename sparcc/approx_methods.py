@@ -0,0 +1,252 @@
+'''
+Approximate SparCC for very many components, as a sparse edge list.
+
+Neither the D x D variation matrix nor any D x D result is built:
+
+- The basis variances only need the row sums of the variation matrix,
+  computed exactly in O(n*D) (query_methods.variation_row_sums) and
+  solved with basis_var_lowrank, also after every exclusion.
+- With L the centered log fractions and S=L^T L/n, the basis covariance
+  of SparCC is 0.5*(V_i+V_j-t_ij) = S_ij+u_i+u_j with u=0.5*(V-s), so the
+  basis correlation is C_ij = <z_i,z_j> + p_i*q_j + q_i*p_j with
+  z_i=L_i/(sqrt(n)*sd_i), p=u/sd and q=1/sd. The inner products are
+  screened with a Gaussian sketch G (k x n, entries N(0,1/k)) of the
+  columns, by blocks of rows, in O(k*D^2) flops and O(block_size*D)
+  memory instead of O(n*D^2) and O(D^2).
+- The correlations of the pairs that pass the screen are computed
+  exactly. The exclusion refinement of SparCC runs over the strongest
+  sketched pairs, and the edges are screened with the final variances.
+
+Error bound of the screen: the error of a sketched inner product is
+unbiased with variance (|z_i|^2*|z_j|^2+<z_i,z_j>^2)/k <= 2*r_i^2*r_j^2/k,
+r_i=|z_i|=sqrt(s_i/V_i) (exact for Gaussian sketches). A pair is kept
+when its sketched |C| is above cut-m*r_i*r_j, with m=z(1-delta/2)*sqrt(2/k),
+so a pair with |C| >= cut is missed with probability about delta (normal
+approximation, good for k of a few hundred) and at most
+1/z(1-delta/2)^2 by Chebyshev. The expected number of missed edges is
+then at most delta times the number of true edges. Uncorrelated pairs
+pass the screen when their sketch error, of sd about sqrt(2/k), exceeds
+cut-m: with the default k=1024 and delta=0.05 that is cut-0.087, about
+one pair in a million for cut=0.3, while for k=128 it would be most of
+them. When k >= n the columns are not sketched and the screen is exact. The correlations of
+the edges found are exact (the same values as run_sparcc) as long as the
+pairs excluded by the refinement, the strongest ones, are among the
+candidates of the refinement. The sketch only saves work when n is much
+larger than k: the screen costs k*D^2 flops, against n*D^2 exactly.
+'''
+import warnings
+import numpy as np
+import pandas as pd
+
+from statistics import NormalDist
+from numba import njit,prange
+from typing import Union
+
+from .core_methods import to_fractions
+from .SparCC import basis_var_lowrank
+from .query_methods import log_centered,variation_row_sums
+from .profiler import span,count
+
+__all__ = ["screen_margin",
+           "screen_pairs",
+           "run_sparcc_approx",
+           "approx_edges"]
+
+# candidates of the exclusion refinement per exclusion iteration
+EXCLUSION_PAIRS = 100
+
+
+def screen_margin(k:int, n_samples:int, delta:float=0.05):
+    '''
+    Half width m of the screen, for unit r_i*r_j. 0 when k >= n_samples,
+    as the columns are then not sketched.
+    '''
+    if k >= n_samples:
+        return 0.
+    return NormalDist().inv_cdf(1.-delta/2)*np.sqrt(2./k)
+
+def screen_pairs(Y:np.ndarray, s:np.ndarray, V_base:np.ndarray, cut:float, margin:float,
+                 block_size:int=256, max_pairs:int=None):
+    '''
+    Pairs i<j whose sketched basis correlation may be >= cut in absolute value.
+
+    Parameters
+    ----------
+    Y : array
+        k x D sketch of the centered log fractions, divided by sqrt(n).
+    s : array
+        Variances of the log fractions.
+    V_base : array
+        Basis variances.
+    cut : float
+        Screening threshold.
+    margin : float
+        See screen_margin.
+    block_size : int, default 256
+        Rows screened at once.
+    max_pairs : int, default None
+        Keep at most this many pairs, the largest sketched |C|.
+
+    Returns
+    -------
+    i, j: array
+        The pairs, i<j.
+    '''
+    D = Y.shape[1]
+    sd = np.sqrt(V_base)
+    Z = Y/sd
+    p, q = 0.5*(V_base-s)/sd, 1./sd
+    r = np.sqrt(s/V_base)
+    found_i, found_j, found_c = [], [], []
+    n_found, truncated = 0, False
+    for r0 in range(0, D, block_size):
+        r1 = min(r0+block_size, D)
+        C = Z[:, r0:r1].T@Z[:, r0:]
+        C += p[r0:r1,None]*q[None,r0:]+q[r0:r1,None]*p[None,r0:]
+        np.abs(C, out=C)
+        keep = C >= cut-margin*r[r0:r1,None]*r[None,r0:]
+        keep &= np.arange(r0, D)[None,:] > np.arange(r0, r1)[:,None]
+        ii, jj = np.nonzero(keep)
+        found_i.append(ii+r0)
+        found_j.append(jj+r0)
+        found_c.append(C[ii, jj])
+        n_found += len(ii)
+        if max_pairs is not None and n_found > max_pairs:
+            i, j, c = [np.concatenate(x) for x in (found_i, found_j, found_c)]
+            top = np.argpartition(-c, max_pairs-1)[:max_pairs]
+            found_i, found_j, found_c = [i[top]], [j[top]], [c[top]]
+            n_found, truncated = max_pairs, True
+    if truncated:
+        warnings.warn('More than %d pairs passed the screen, only the strongest were kept' %max_pairs)
+    i = np.concatenate(found_i).astype(np.int64)
+    j = np.concatenate(found_j).astype(np.int64)
+    return i, j
+
+@njit(parallel=True)
+def _pair_dots(LT, i, j, out):
+    for p in prange(len(i)):
+        a = LT[i[p]]
+        b = LT[j[p]]
+        acc = 0.
+        for t in range(len(a)):
+            acc += a[t]*b[t]
+        out[p] = acc
+
+def _pair_variation(LT:np.ndarray, s:np.ndarray, i:np.ndarray, j:np.ndarray):
+    '''
+    Exact t_ij of the given pairs, LT being the D x n centered log
+    fractions (one contiguous row per component).
+    '''
+    dots = np.empty(len(i))
+    _pair_dots(LT, i, j, dots)
+    return s[i]+s[j]-2.*dots/LT.shape[1]
+
+def _screen(LT, Y, s, V_base, cut, margin, block_size, max_pairs):
+    with span('screen'):
+        i, j = screen_pairs(Y, s, V_base, cut, margin, block_size, max_pairs)
+    count('candidate_pairs', len(i))
+    with span('exact_pairs'):
+        return i, j, _pair_variation(LT, s, i, j)
+
+def run_sparcc_approx(fracs:np.ndarray, edge_th:float=0.3, th:float=0.1, x_iter:int=10,
+                      k:int=1024, delta:float=0.05, block_size:int=256, max_pairs:int=None,
+                      seed=None):
+    '''
+    Approximate run_sparcc that only returns the pairs with |C| >= edge_th.
+
+    Parameters
+    ----------
+    fracs : array
+        n x D fractions.
+    edge_th : float, default 0.3
+        Minimum |correlation| of the returned pairs.
+    th, x_iter :
+        As in run_sparcc. The pairs are excluded among the
+        EXCLUSION_PAIRS*x_iter strongest sketched pairs.
+    k : int, default 1024
+        Rows of the sketch. Larger values give a narrower margin and
+        fewer candidate pairs, see screen_margin.
+    delta : float, default 0.05
+        Probability of missing a given pair with |C| >= edge_th.
+    block_size : int, default 256
+        Rows screened at once, the screen holds block_size x D floats.
+    max_pairs : int, default None
+        Cap of the candidate pairs, the strongest are kept.
+    seed : int, default None
+        Seed of the sketch.
+
+    Returns
+    -------
+    i, j: array
+        Pairs (i<j) with |C| >= edge_th.
+    C_base, Cov_base: array
+        Their exact basis correlations and covariances.
+    V_base: array
+        Basis variances of all the components.
+    '''
+    assert (th>0 and th<1.0),"The value must be between 0 and 1"
+    n, D = fracs.shape
+    if D-3 <= x_iter:
+        raise ValueError('The approximation is meant for many components, use run_sparcc for D=%d' %D)
+    with span('log_centered'):
+        Lc, s = log_centered(fracs)
+        V_vec = variation_row_sums(Lc, s)
+        V_base = basis_var_lowrank(V_vec)
+    with span('sketch'):
+        if k >= n:
+            Y = Lc/np.sqrt(n)
+        else:
+            G = np.random.default_rng(seed).standard_normal((k, n))/np.sqrt(k)
+            Y = G@Lc/np.sqrt(n)
+        LT = np.ascontiguousarray(Lc.T)
+    del Lc
+    margin = screen_margin(k, n, delta)
+
+    # exclusion refinement over the strongest sketched pairs
+    i, j, t = _screen(LT, Y, s, V_base, th, margin, block_size, EXCLUSION_PAIRS*max(x_iter, 1))
+    excluded = np.zeros(len(i), dtype=bool)
+    excluded_pairs = []
+    for xi in range(x_iter):
+        C = (0.5*(V_base[i]+V_base[j]-t))/np.sqrt(V_base[i]*V_base[j])
+        score = np.where(excluded, -np.inf, np.abs(C))
+        if len(score) == 0 or not score.max() > th:
+            break
+        a = np.argmax(score)
+        excluded[a] = True
+        excluded_pairs.append((i[a], j[a]))
+        V_vec[i[a]] -= t[a]
+        V_vec[j[a]] -= t[a]
+        V_base = basis_var_lowrank(V_vec, excluded_pairs)
+
+    i, j, t = _screen(LT, Y, s, V_base, edge_th, margin, block_size, max_pairs)
+    Cov_base = 0.5*(V_base[i]+V_base[j]-t)
+    C_base = Cov_base/np.sqrt(V_base[i]*V_base[j])
+    tol = 1e-3
+    if len(C_base) and np.max(np.abs(C_base)) > 1 + tol:
+        warnings.warn('Sparcity assumption violated.')
+    keep = np.abs(C_base) >= edge_th
+    return i[keep], j[keep], C_base[keep], Cov_base[keep], V_base
+
+def approx_edges(frame:Union[np.ndarray,pd.DataFrame], edge_th:float=0.3, norm:str='pseudo',
+                 p_counts:int=1, **kwargs):
+    '''
+    Edge list of run_sparcc_approx on the fractions of the counts.
+
+    A single estimation: with norm='dirichlet' the result comes from one
+    draw of the fractions, not from the median of several as main_alg.
+
+    Returns
+    -------
+    edges: DataFrame
+        source, target, cor and cov, strongest |cor| first.
+    '''
+    labels = np.asarray(frame.columns) if isinstance(frame,pd.DataFrame) else None
+    counts = frame.values if isinstance(frame,pd.DataFrame) else np.asarray(frame)
+    fracs = to_fractions(counts, method=norm, p_counts=p_counts)
+    i, j, C, Cov, _ = run_sparcc_approx(fracs, edge_th=edge_th, **kwargs)
+    order = np.argsort(-np.abs(C), kind='stable')
+    i, j = i[order], j[order]
+    return pd.DataFrame({'source':i if labels is None else labels[i],
+                         'target':j if labels is None else labels[j],
+                         'cor':C[order],
+                         'cov':Cov[order]})
@@ -8,6 +8,7 @@ from __future__ import print_function
 from __future__ import unicode_literals
 
 import argparse
+import multiprocessing
 from datetime import datetime
 import os
 import copy
@@ -66,20 +67,84 @@ help='Root path to save the covariance files.')
 parser.add_argument('-v','--verbose', type=bool, default=True,
 help='Print iteration progress?')
 
+parser.add_argument('--profile', action='store_true',
+help='Record time and memory of each stage in NAME.profile.json/csv, next to the log.')
+
+parser.add_argument('-t','--threads', type=int, default=None,
+help='Threads used by numba, BLAS and dask (default: the CPU quota of the process).')
+
+parser.add_argument('-b','--backend', type=str, default='local',
+help='local (default): iterations in this process | distributed: one dask task per iteration.')
+
+parser.add_argument('--scheduler', type=str, default=None,
+help='Address of a dask scheduler for the distributed backend (default: a LocalCluster).')
+
+parser.add_argument('--prevalence', type=float, default=None,
+help='Prefilter: keep OTUs present in at least this fraction of samples, the rest is pooled into "other".')
+
+parser.add_argument('--min_count', type=float, default=None,
+help='Prefilter: keep OTUs with at least this total count.')
+
+parser.add_argument('--top_n', type=int, default=None,
+help='Prefilter: keep at most the N most abundant OTUs.')
+
+parser.add_argument('-q','--query', type=str, default=None,
+help='Comma separated OTU labels. Only their correlations against all OTUs are computed.')
+
+parser.add_argument('--top_k', type=int, default=None,
+help='Keep only the K strongest partners of every OTU, save_cor is then an edge list (source,target,cor,rank).')
+
+parser.add_argument('--ci', type=float, default=None,
+help='Level (e.g. 0.95) of the intervals of the correlations over the iterations, saved in --store with their sd.')
+
+parser.add_argument('--store', type=str, default=None,
+help='Also write the results to this folder as memory mapped .npy arrays (see sparcc.store_methods).')
+
+parser.add_argument('--approx', type=float, default=None,
+help='Approximate mode for very many OTUs: save_cor is the edge list (source,target,cor,cov) of the pairs with |cor| above this value.')
+
+parser.add_argument('--sketch_dim', type=int, default=1024,
+help='Rows of the random sketch of the approximate mode (default 1024), not used with fewer samples.')
+
 
 def _check_save_files(opt):
     if opt.save_cor==None:
         opt.save_cor='Cor_SparCC.csv'
 
+def _check_modes(opt):
+    # --query, --top_k, --ci, --approx, --store and the backend: combinations that can not run together
+    if opt.query is not None and (opt.backend!='local' or opt.scheduler is not None):
+        parser.error('--query can not be combined with --backend distributed or --scheduler')
+    if opt.query is not None and opt.store is not None:
+        parser.error('--store needs the full matrices, it can not be combined with --query')
+    if opt.query is not None and opt.top_k is not None:
+        parser.error('--top_k can not be combined with --query')
+    if opt.ci is not None:
+        if opt.store is None:
+            parser.error('--ci needs --store')
+        if opt.query is not None or opt.top_k is not None or opt.backend!='local':
+            parser.error('--ci is only computed by the local backend, without --query or --top_k')
+        if not 0<opt.ci<1:
+            parser.error('--ci must be between 0 and 1')
+    if opt.approx is not None:
+        if opt.query is not None or opt.top_k is not None or opt.ci is not None or opt.store is not None:
+            parser.error('--approx can not be combined with --query, --top_k, --ci or --store')
+        if opt.backend!='local':
+            parser.error('--approx only runs in this process')
+        if not 0<opt.approx<1:
+            parser.error('--approx must be between 0 and 1')
+
 def preprocess(opt):
-    #Define Temp Folder
-    setattr(opt,'savedir','./data')
+    _check_modes(opt)
+
+    #Define Temp Folder, one per run so that runs in the same directory do not collide
+    setattr(opt,'savedir',os.path.join('./data','{}_{}'.format(opt.name,os.getpid())))
     
     _check_save_files(opt)
 
     if os.path.exists(opt.savedir) and os.path.isdir(opt.savedir):
         try:
-            shutil.rmtree("./data")
+            shutil.rmtree(opt.savedir)
 
         except OSError as e:
             print("Error: {0}:{1}".format('./temp_files/*',e.strerror))
@@ -97,4 +162,6 @@ def preprocess(opt):
         os.makedirs(opt.path_cov_file)
     
 args=parser.parse_args()
-preprocess(args)
\ No newline at end of file
+# worker processes (e.g. dask spawn) import the main script again
+if multiprocessing.current_process().name=='MainProcess':
+    preprocess(args)
\ No newline at end of file
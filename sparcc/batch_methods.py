@@ -0,0 +1,190 @@
+'''
+Batch execution of SparCC over many count tables.
+
+The jobs of a manifest (csv or yaml) or of a glob of count tables run on
+one shared process pool (see resources.worker_pool). Every job gets its
+own scratch folder for the hdf5 files of main_alg, so jobs never share
+temporary files, and jobs are submitted largest first so that the long
+ones do not end up running alone at the end. One summary row with the
+timings and outputs is written per job.
+'''
+import os
+import time
+import shutil
+import logging
+import tempfile
+import traceback
+from glob import glob
+from pathlib import Path
+from concurrent.futures import as_completed
+
+import pandas as pd
+
+from .SparCC import main_alg
+from .io_methods import read_counts, write_txt
+from .resources import worker_pool,get_thread_budget
+
+__all__ = ["JOB_DEFAULTS",
+           "read_manifest",
+           "run_job",
+           "run_batch"]
+
+JOB_DEFAULTS = {'method':'sparcc',
+                'norm':'dirichlet',
+                'n_iter':20,
+                'x_iter':10,
+                'threshold':0.1,
+                'save_cov':None}
+
+
+def read_manifest(manifest:str, outpath:str='./', defaults:dict=None):
+    '''
+    Table of jobs, one per count table.
+
+    Parameters
+    ----------
+    manifest : str
+        csv file with a column data_input and optionally name, save_cor,
+        save_cov, method, norm, n_iter, x_iter and threshold, or yaml
+        file with a list "jobs" of the same keys (and optional
+        "defaults"), or a glob of count tables.
+    outpath : str, default './'
+        Folder of the outputs of the jobs without save_cor.
+    defaults : dict, default None
+        Parameters of the jobs that do not give them, over JOB_DEFAULTS.
+
+    Returns
+    -------
+    jobs: DataFrame
+        One row per job with every parameter and size_bytes, the size of
+        the count table used to order the jobs.
+    '''
+    defaults = dict(JOB_DEFAULTS, **(defaults or {}))
+    if manifest.endswith(('.yml','.yaml')):
+        import yaml
+        with open(manifest) as f:
+            conf = yaml.load(f, Loader=yaml.FullLoader)
+        defaults.update(conf.get('defaults') or {})
+        jobs = pd.DataFrame(conf['jobs'])
+    elif manifest.endswith(('.csv','.tsv')) and not any(c in manifest for c in '*?['):
+        jobs = pd.read_csv(manifest, sep=None, engine='python')
+    else:
+        files = sorted(glob(manifest))
+        if len(files) == 0:
+            raise ValueError('No count tables match "%s"' %manifest)
+        jobs = pd.DataFrame({'data_input':files})
+
+    if 'data_input' not in jobs:
+        raise ValueError('The manifest needs a data_input column')
+    for key, value in defaults.items():
+        if key not in jobs:
+            jobs[key] = value
+        elif value is not None:
+            jobs[key] = jobs[key].fillna(value)
+    if 'name' not in jobs:
+        jobs['name'] = [Path(f).stem for f in jobs['data_input']]
+    if jobs['name'].duplicated().any():
+        raise ValueError('The names of the jobs must be unique')
+    if 'save_cor' not in jobs:
+        jobs['save_cor'] = None
+    jobs['save_cor'] = [s if isinstance(s, str) else os.path.join(outpath, n+'.cor.csv')
+                        for s, n in zip(jobs['save_cor'], jobs['name'])]
+    jobs['save_cov'] = [s if isinstance(s, str) else None for s in jobs['save_cov']]
+    jobs['size_bytes'] = [os.path.getsize(f) for f in jobs['data_input']]
+    return jobs
+
+def _read_counts(data_input:str):
+    counts, components, samples = read_counts(data_input, verbose=False)
+    return pd.DataFrame(counts, index=samples, columns=components, copy=False)
+
+def run_job(job:dict, scratch:str=None):
+    '''
+    Run one job (a row of read_manifest) in its own scratch folder,
+    removed at the end. Errors are reported in the returned record
+    instead of raised.
+
+    Returns
+    -------
+    record: dict
+        name, status (done|failed), error, shape, timings and outputs.
+    '''
+    record = {'name':job['name'], 'data_input':job['data_input'], 'pid':os.getpid(),
+              'status':'failed', 'error':None}
+    start = time.perf_counter()
+    folder = tempfile.mkdtemp(prefix='sparcc_%s_' %job['name'], dir=scratch)
+    try:
+        t = time.perf_counter()
+        counts = _read_counts(job['data_input'])
+        record['read_s'] = time.perf_counter()-t
+        record['n_samples'], record['n_components'] = counts.shape
+
+        path_cor = os.path.join(folder, 'corr_files')
+        path_cov = os.path.join(folder, 'cov_files')
+        os.makedirs(path_cor)
+        os.makedirs(path_cov)
+        t = time.perf_counter()
+        cor, cov = main_alg(counts, method=job['method'], th=float(job['threshold']),
+                            x_iter=int(job['x_iter']), n_iter=int(job['n_iter']), norm=job['norm'],
+                            path_subdir_cor=path_cor, path_subdir_cov=path_cov, verbose=False)
+        record['compute_s'] = time.perf_counter()-t
+
+        t = time.perf_counter()
+        labels = counts.columns
+        for frame, file_name in [(cor, job['save_cor']), (cov, job['save_cov'])]:
+            if file_name is not None:
+                Path(file_name).parent.mkdir(parents=True, exist_ok=True)
+                write_txt(pd.DataFrame(frame, index=labels, columns=labels), file_name)
+        record['write_s'] = time.perf_counter()-t
+        record.update(status='done', save_cor=job['save_cor'], save_cov=job['save_cov'])
+    except Exception as e:
+        record['error'] = repr(e)
+        logging.info('Job {} failed:\n{}'.format(job['name'], traceback.format_exc()))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    record['wall_s'] = time.perf_counter()-start
+    return record
+
+def run_batch(jobs:pd.DataFrame, n_workers:int=None, scratch:str=None,
+              summary:str=None, verbose:bool=True):
+    '''
+    Run the jobs on one process pool, largest count table first.
+
+    Parameters
+    ----------
+    jobs : DataFrame
+        Output of read_manifest.
+    n_workers : int, default None
+        Processes of the pool, the thread budget by default. The threads
+        of numba and BLAS are split among them.
+    scratch : str, default None
+        Parent of the scratch folders of the jobs, the system temporary
+        folder by default.
+    summary : str, default None
+        csv file for the summary.
+    verbose : bool, default True
+
+    Returns
+    -------
+    summary: DataFrame
+        One row per job (in the order of jobs) with its status, timings,
+        worker pid and outputs.
+    '''
+    if scratch is not None:
+        os.makedirs(scratch, exist_ok=True)
+    order = jobs.sort_values('size_bytes', ascending=False, kind='stable')
+    n_workers = max(1, min(n_workers or get_thread_budget(), len(jobs)))
+    records = {}
+    with worker_pool(n_workers) as pool:
+        futures = {pool.submit(run_job, job, scratch):i for i, job in order.iterrows()}
+        for future in as_completed(futures):
+            record = future.result()
+            records[futures[future]] = record
+            if verbose:
+                print('\t{} {} in {:.1f}s'.format(record['name'], record['status'], record['wall_s']))
+            logging.info('Job {name} {status} in {wall_s:.1f}s'.format(**record))
+
+    report = pd.DataFrame([records[i] for i in jobs.index], index=jobs.index)
+    report.insert(2, 'size_bytes', jobs['size_bytes'])
+    if summary is not None:
+        report.to_csv(summary, index=False)
+    return report
@@ -3,13 +3,48 @@ Modificated on April, 2020
 @author: Daniel Legorreta
 '''
 import numpy as np
-import dask
 import dask.array as da 
 import dask.dataframe as dd 
 
 from numba import njit,prange
 from typing import Union
 
+# Inputs with more elements than this (about 512 MB of float64) go to dask
+DASK_MIN_SIZE = 2**26
+
+def select_backend(frame, backend:str='auto'):
+    '''
+    Backend of the clr and basis variance computations.
+
+    Parameters
+    ----------
+    frame : numpy or dask array, dask DataFrame
+    backend : str, (auto|numpy|dask), default 'auto'
+        auto uses dask for dask inputs and for numpy arrays larger than
+        DASK_MIN_SIZE elements, numpy (BLAS) otherwise.
+    '''
+    if backend not in ['auto','numpy','dask']:
+        raise ValueError('Unsupported backend "%s"' %backend)
+    if backend != 'auto':
+        return backend
+    if isinstance(frame,(da.Array,dd.DataFrame)) or np.size(frame) > DASK_MIN_SIZE:
+        return 'dask'
+    return 'numpy'
+
+def dask_scheduler():
+    '''
+    Scheduler of the dask arrays computed here: synchronous inside a
+    dask.distributed task, whose arrays must not be sent back to the
+    cluster, the default scheduler otherwise. Chosen per compute call,
+    dask.config.set would change it for every thread of the process.
+    '''
+    try:
+        from distributed import get_worker
+        get_worker()
+    except (ImportError, ValueError):
+        return None
+    return 'synchronous'
+
 def clr(frame:Union[da.Array,dd.DataFrame,np.ndarray], centrality:str='mean', axis:int=1):
     '''
     Do the central log-ratio (clr) transformation of frame.
@@ -40,13 +75,49 @@ def clr(frame:Union[da.Array,dd.DataFrame,np.ndarray], centrality:str='mean', ax
         R=frame-v
         return R
 
-def run_clr(frame:np.ndarray):
-    '''CLR estimation in the matrix'''
-    z        = clr(frame)
-    Cov_base = da.cov(z, rowvar=0)
-    C_base   = da.corrcoef(z,rowvar=0)
+def cov_to_corr(Cov_base):
+    '''
+    Correlation matrix from a covariance matrix.
+    '''
+    sd=np.sqrt(np.diag(Cov_base))
+    return Cov_base/sd[:,None]/sd[None,:]
+
+def run_clr(frame:np.ndarray, backend:str='auto'):
+    '''
+    CLR estimation in the matrix.
+    The covariance is computed once and the correlation derived from it.
+    See select_backend for the backend.
+    '''
+    if select_backend(frame,backend) == 'dask':
+        z        = clr(frame)
+        Cov_base = da.cov(z, rowvar=0).compute(scheduler=dask_scheduler())
+    else:
+        z        = np.log(np.asarray(frame,dtype=np.float64))
+        z       -= z.mean(axis=1,keepdims=True)
+        z       -= z.mean(axis=0,keepdims=True)
+        Cov_base = z.T@z/(z.shape[0]-1)
+    C_base   = cov_to_corr(Cov_base)
+
+    return  C_base, Cov_base
+
+def variation_from_cov(S:np.ndarray):
+    '''
+    Variation matrix from the covariance (ddof=0) of the log fractions:
+    var(log(x_i/x_j)) = S_ii + S_jj - 2*S_ij.
+    '''
+    s=np.diag(S)
+    V=s[:,None]+s[None,:]-2.*S
+    np.fill_diagonal(V,0.)
+    return V
 
-    return  dask.compute(C_base, Cov_base)
+def clr_from_cov(S:np.ndarray):
+    '''
+    CLR correlation & covariance from the covariance of the log fractions.
+    The clr covariance is J*S*J, J being the centering matrix.
+    '''
+    Cov_base=S-S.mean(axis=0,keepdims=True)
+    Cov_base=Cov_base-Cov_base.mean(axis=1,keepdims=True)
+    return cov_to_corr(Cov_base), Cov_base
 
 @njit(parallel=True)
 def variation_mat(frame):
@@ -54,6 +125,7 @@ def variation_mat(frame):
     Return the variation matrix of frame.
     Element i,j is the variance of the log ratio of components i and j.
     Slower version to be used in case the fast version runs out of memory.
+    Reference kernel, run_sparcc uses variation_mat_tiled.
     '''
     k = frame.shape[1]
     V = np.zeros((k,k))
@@ -67,3 +139,48 @@ def variation_mat(frame):
             V[i,j] = v
             V[j,i] = v
     return V
+
+@njit()
+def _variation_tile(L,V,i0,i1,j0,j1):
+    n=L.shape[0]
+    for i in range(i0,i1):
+        for j in range(max(j0,i+1),j1):
+            # single pass, shifted by the first log ratio so that the
+            # sums do not cancel when the variance is small
+            k=L[0,i]-L[0,j]
+            s=0.
+            s2=0.
+            for t in range(n):
+                d=L[t,i]-L[t,j]-k
+                s+=d
+                s2+=d*d
+            v=max((s2-s*s/n)/n,0.)
+            V[i,j]=v
+            V[j,i]=v
+
+@njit(parallel=True)
+def _variation_tiles(L,V,tiles,tile):
+    D=L.shape[1]
+    for p in prange(tiles.shape[0]):
+        i0=tiles[p,0]*tile
+        j0=tiles[p,1]*tile
+        _variation_tile(L,V,i0,min(i0+tile,D),j0,min(j0+tile,D))
+
+def variation_mat_tiled(frame, tile:int=64):
+    '''
+    Variation matrix of frame, as variation_mat.
+
+    The log fractions are computed once, in column major order so every
+    component is contiguous, and the pairs are processed by tiles of
+    tile x tile components that stay in cache. The variance of every
+    log ratio is taken in a single pass without temporaries. The tiles
+    of the upper triangle are spread over the threads as one list, so
+    every thread gets a similar share of the triangle.
+    '''
+    L=np.asfortranarray(np.log(np.asarray(frame,dtype=np.float64)))
+    D=L.shape[1]
+    nt=-(-D//tile)
+    tiles=np.array([(a,b) for a in range(nt) for b in range(a,nt)],dtype=np.int64).reshape(-1,2)
+    V=np.zeros((D,D))
+    _variation_tiles(L,V,tiles,tile)
+    return V
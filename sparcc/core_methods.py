@@ -48,7 +48,7 @@ def to_fractions(frame:Union[np.ndarray,pd.DataFrame], method:str='dirichlet',
                     do simple normalization.
     p_counts : int/float (default 1)
         The value of the pseudo counts to add to all counts.
-        Used only if method is dirichlet
+        Used only if method is dirichlet or pseudo
     axis : {0 | 1}
         0 : normalize each column.
         1 : normalize each row.
@@ -73,6 +73,11 @@ def to_fractions(frame:Union[np.ndarray,pd.DataFrame], method:str='dirichlet',
         fracs = normalize(frame, axis)
         return fracs
 
+    #pseudo counts case
+    elif method == 'pseudo':
+        fracs = normalize(frame+p_counts, axis)
+        return fracs
+
     #Dirichlet Case    
     elif method =='dirichlet':
          fracs = np.apply_along_axis(dirichlet_fun, axis, frame)
@@ -0,0 +1,158 @@
+'''
+Differential correlation between two groups of samples.
+
+SparCC is estimated in each group and the per-pair difference of the
+correlations is tested against label permutations. The log fractions of
+every sample are computed once and the statistics of all the samples
+(LogRatioStats) are kept, so a permutation only re-partitions them: the
+statistics of the smaller group are built from its rows of the shared
+log fractions and those of the other group are the total minus them.
+No counts are normalized again and the cost of a replicate is
+O(min(n_a,n_b)*D^2) plus the two SparCC solves.
+
+With norm 'dirichlet' the n_iter draws of the fractions are made once
+and shared by the observed split and all the permutations, so the test
+is conditional on them.
+'''
+import warnings
+import numpy as np
+import pandas as pd
+
+from typing import Union
+
+from .core_methods import to_fractions
+from .incremental_methods import LogRatioStats,stats_corr,median_corr
+from .permutation_methods import get_compare
+from .profiler import span
+
+__all__ = ["split_stats",
+           "group_corr",
+           "differential_corr"]
+
+
+def split_stats(logf:np.ndarray, total:LogRatioStats, members:np.ndarray):
+    '''
+    Statistics of the samples in members and of the rest.
+
+    Parameters
+    ----------
+    logf : array
+        n x D log fractions of all the samples.
+    total : LogRatioStats
+        Statistics of all the rows of logf.
+    members : array
+        n booleans, True for the samples of the first group.
+
+    Returns
+    -------
+    stats_a, stats_b: LogRatioStats
+        Statistics of members and of ~members.
+    '''
+    first = 2*members.sum() <= len(members)
+    small = LogRatioStats(logf.shape[1]).add(logf[members if first else ~members])
+    rest = total.copy().subtract(small)
+    return (small, rest) if first else (rest, small)
+
+def group_corr(stats:list, method:str='sparcc', th:float=0.1, x_iter:int=10):
+    '''
+    Median correlation and covariance over the statistics of the draws
+    of one group, as main_alg.
+    '''
+    cor_list, var_list = [], []
+    for s in stats:
+        C_base, Cov_base = stats_corr(s, method=method, th=th, x_iter=x_iter)
+        cor_list.append(C_base)
+        var_list.append(np.diag(Cov_base))
+    return median_corr(cor_list, var_list)
+
+def _resolve_groups(groups, n:int, order=None):
+    groups = np.asarray(groups)
+    if len(groups) != n:
+        raise ValueError('%d group labels given for %d samples' %(len(groups), n))
+    order = list(pd.unique(np.sort(groups))) if order is None else list(order)
+    if len(order) != 2 or not np.isin(groups, order).all():
+        raise ValueError('Exactly two groups are needed, got %s' %list(pd.unique(groups)))
+    members = groups == order[0]
+    if min(members.sum(), (~members).sum()) < 2:
+        raise ValueError('Every group needs at least two samples')
+    return members, order
+
+def differential_corr(frame:Union[np.ndarray,pd.DataFrame], groups, nperm:int=100,
+                      test_type:str='two_sided',
+                      method:str='sparcc',
+                      norm:str='dirichlet',
+                      n_iter:int=20,
+                      th:float=0.1,
+                      x_iter:int=10,
+                      p_counts:int=1,
+                      order=None,
+                      seed:int=None,
+                      verbose:bool=False):
+    '''
+    SparCC of two groups of samples and permutation p-values of the
+    difference of their correlations.
+
+    Parameters
+    ----------
+    frame : array_like
+        2D array of counts. Columns are components, rows are samples.
+    groups : array_like
+        Group label of every sample, two distinct values.
+    nperm : int, default 100
+        Label permutations, 0 for no p-values.
+    test_type : str, default 'two_sided'
+        two_sided | one_sided, see permutation_methods.get_compare.
+    order : list, default None
+        The two labels as (a, b), sorted by default. diff is a - b.
+    seed : int, default None
+        Seed of the label permutations.
+
+    Returns
+    -------
+    result: dict
+        cor_a, cov_a, cor_b, cov_b: correlations and covariances of the
+        groups. diff: cor_a - cor_b. p_vals: fraction of the permutations
+        with a difference at least as extreme (1 on the diagonal), only
+        when nperm > 0.
+    '''
+    if isinstance(frame,pd.DataFrame):
+        frame=frame.values
+    counts = np.asarray(frame, dtype=np.float64)
+    n, D = counts.shape
+    if D < 4:
+        raise ValueError('Can not detect correlations between compositions of <4 components (%d given)' %D)
+    members, order = _resolve_groups(groups, n, order)
+
+    chains = n_iter if norm == 'dirichlet' else 1
+    with span('log_fractions'):
+        logf = [np.log(to_fractions(counts, method=norm, p_counts=p_counts)) for _ in range(chains)]
+        total = [LogRatioStats(D).add(l) for l in logf]
+
+    def estimate(members):
+        parts = [split_stats(l, t, members) for l, t in zip(logf, total)]
+        a = group_corr([p[0] for p in parts], method=method, th=th, x_iter=x_iter)
+        b = group_corr([p[1] for p in parts], method=method, th=th, x_iter=x_iter)
+        return a, b
+
+    with span('group_corr'):
+        (cor_a, cov_a), (cor_b, cov_b) = estimate(members)
+    diff = cor_a - cor_b
+    result = {'cor_a':cor_a, 'cov_a':cov_a, 'cor_b':cor_b, 'cov_b':cov_b, 'diff':diff}
+    if nperm <= 0:
+        return result
+
+    compare = get_compare(test_type)
+    rng = np.random.default_rng(seed)
+    n_sig = np.zeros((D, D), dtype=np.int64)
+    with span('permutations', nperm=nperm):
+        for i in range(nperm):
+            if verbose:
+                print('\tPermutation: {}/{}'.format(i+1, nperm))
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                (perm_a, _), (perm_b, _) = estimate(rng.permutation(members))
+            n_sig += compare(perm_a-perm_b, diff)
+    p_vals = n_sig/nperm
+    p_vals[np.diag_indices_from(p_vals)] = 1
+    result['p_vals'] = p_vals
+    return result
@@ -0,0 +1,259 @@
+'''
+dask.distributed execution backend.
+
+Every Dirichlet iteration of the estimation, and every permutation
+replicate of the pseudo p-values, is a task submitted to a LocalCluster
+or to a user supplied Client (e.g. a scheduler on several hosts). The
+counts are scattered once. The reductions run on the workers: the
+median of the iterations by row blocks and the exceedance counts of the
+permutations as a pairwise tree of sums, so only the final D x D
+results reach the client.
+
+Each task draws its fractions and permutations from its own numpy
+Generator, spawned from a single seed, so results do not depend on the
+number of workers nor on the scheduling order.
+'''
+import logging
+import warnings
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .SparCC import basic_corr,cov_from_cor
+from .permutation_methods import permute_w_replacement,get_compare
+from .resources import get_thread_budget,init_worker
+
+__all__ = ["cluster_client",
+           "tree_reduce",
+           "permutation_replicate",
+           "replicate_corr",
+           "estimate_corr",
+           "distributed_corr",
+           "distributed_pvalues"]
+
+
+@contextmanager
+def cluster_client(client=None, n_workers:int=None, processes:bool=True):
+    '''
+    Yield a dask Client.
+
+    Parameters
+    ----------
+    client : Client or str, default None
+        Existing client, or the address of a running scheduler. Without
+        it a LocalCluster with one single threaded worker per CPU of the
+        thread budget is started, and closed at exit.
+    n_workers : int, default None
+        Workers of the LocalCluster.
+    processes : bool, default True
+        Workers of the LocalCluster in separate processes. Thread workers
+        (processes=False) launch the numba parallel kernels concurrently
+        from several threads of one process, which numba does not
+        support with its default threading layer.
+    '''
+    from dask.distributed import Client,LocalCluster
+
+    if client is not None and not isinstance(client, str):
+        yield client
+        return
+    if isinstance(client, str):
+        with Client(client) as c:
+            yield c
+        return
+    n_workers = n_workers or get_thread_budget()
+    with LocalCluster(n_workers=n_workers, threads_per_worker=1, processes=processes,
+                      dashboard_address=None) as cluster, Client(cluster) as c:
+        if processes:
+            # numba and BLAS of each single threaded worker use one thread
+            c.run(init_worker, 1)
+        yield c
+
+def tree_reduce(client, futures, fun, fan_in:int=2):
+    '''
+    Reduce futures with fun(*args) in a tree of fan_in arguments per task,
+    computed on the workers. Returns the future of the result.
+    '''
+    futures = list(futures)
+    while len(futures) > 1:
+        futures = [client.submit(fun, *futures[i:i+fan_in]) if len(futures[i:i+fan_in]) > 1
+                   else futures[i] for i in range(0, len(futures), fan_in)]
+    return futures[0]
+
+def _sum(*arrays):
+    return sum(arrays[1:], arrays[0])
+
+def _fractions(counts, norm:str, p_counts, rng):
+    '''
+    to_fractions with the draws of the given Generator.
+    '''
+    if norm == 'normalize':
+        fracs = counts.astype(np.float64)
+    elif norm == 'pseudo':
+        fracs = counts+p_counts
+    elif norm == 'dirichlet':
+        fracs = rng.standard_gamma(counts+int(p_counts))
+    else:
+        raise ValueError('Unsupported method "%s"' %norm)
+    return fracs/fracs.sum(axis=1, keepdims=True)
+
+def _iteration(counts, method, norm, th, x_iter, p_counts, seed):
+    '''
+    One estimation iteration: correlations and basis variances.
+    '''
+    rng = np.random.default_rng(seed)
+    # the dask arrays of basis_var/run_clr run inside the task, see dask_scheduler;
+    # only their RuntimeWarnings are hidden, the clr fallbacks are still reported
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        cor, cov = basic_corr(_fractions(counts, norm, p_counts, rng), method=method, th=th, x_iter=x_iter)
+    return cor, np.diag(cov).copy()
+
+def _rows(result, b0, b1):
+    return result[0][b0:b1]
+
+def _variances(result):
+    return result[1]
+
+def _nanmedian(*arrays):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(np.stack(arrays), axis=0)
+
+def permutation_replicate(counts, cor, method, norm, th, x_iter, n_iter, p_counts, test_type, seed):
+    '''
+    One permutation replicate: SparCC on permuted counts, compared
+    with the real correlations. Returns the exceedance indicators.
+    seed is the SeedSequence of the replicate.
+    '''
+    seeds = seed.spawn(n_iter+1)
+    perm = permute_w_replacement(counts, axis=1, rng=np.random.default_rng(seeds[0]))
+    cor_perm = replicate_corr(perm, method, norm, th, x_iter, p_counts, seeds[1:])
+    return get_compare(test_type)(cor_perm, cor).astype(np.int32)
+
+def replicate_corr(counts, method, norm, th, x_iter, p_counts, seeds):
+    '''
+    Median correlation of the iterations of a replicate, one iteration
+    per SeedSequence in seeds.
+    '''
+    return _nanmedian(*[_iteration(counts, method, norm, th, x_iter, p_counts, s)[0] for s in seeds])
+
+def estimate_corr(counts, method, norm, th, x_iter, p_counts, seeds):
+    '''
+    Median correlation and covariance of the iterations, one iteration
+    per SeedSequence in seeds (distributed_corr in a single process).
+    '''
+    results = [_iteration(counts, method, norm, th, x_iter, p_counts, s) for s in seeds]
+    cor_med = _nanmedian(*[r[0] for r in results])
+    var_med = _nanmedian(*[r[1] for r in results])
+    return cor_med, cov_from_cor(cor_med, var_med)
+
+def _counts(frame):
+    if isinstance(frame, pd.DataFrame):
+        frame = frame.values
+    return np.asarray(frame)
+
+def distributed_corr(frame, method:str='sparcc', th:float=0.1, x_iter:int=10, n_iter:int=20,
+                     norm:str='dirichlet', p_counts:int=1, client=None, n_workers:int=None,
+                     seed=None, block_size:int=512, verbose:bool=True):
+    '''
+    main_alg with one task per iteration on a dask cluster.
+
+    Parameters
+    ----------
+    frame : array_like
+        Counts, samples x components.
+    method, th, x_iter, n_iter, norm :
+        As in main_alg.
+    p_counts : int/float, default 1
+        Pseudo counts added with dirichlet and pseudo.
+    client : Client or str, default None
+        See cluster_client.
+    n_workers : int, default None
+        Workers of the LocalCluster started without a client.
+    seed : int, default None
+        Seed of the Dirichlet draws of all the iterations.
+    block_size : int, default 512
+        Rows of each median task.
+    verbose : bool, default True
+
+    Returns
+    -------
+    cor_med: array
+        Median of the estimated basis correlation matrices.
+    cov_med: array
+        Estimated basis covariance matrix.
+    '''
+    assert (th>0 and th<1.0),"The value must be between 0 and 1"
+    counts = _counts(frame)
+    D = counts.shape[1]
+    if norm != 'dirichlet':
+        n_iter = 1 # the other normalizations are deterministic
+    seeds = np.random.SeedSequence(seed).spawn(n_iter)
+
+    with cluster_client(client, n_workers) as c:
+        counts_f = c.scatter(counts, broadcast=True, hash=False)
+        results = []
+        for i in range(n_iter):
+            if verbose: print ('\tSubmitting iteration '+ str(i))
+            logging.info("Submitting iteration {}".format(i))
+            results.append(c.submit(_iteration, counts_f, method, norm, th, x_iter, p_counts, seeds[i], pure=False))
+
+        # median by row blocks, each block task only receives its rows
+        blocks = []
+        for b0 in range(0, D, block_size):
+            rows = [c.submit(_rows, r, b0, min(b0+block_size, D)) for r in results]
+            blocks.append(c.submit(_nanmedian, *rows))
+        var_med = c.submit(_nanmedian, *[c.submit(_variances, r) for r in results])
+        cor_med = np.vstack(c.gather(blocks))
+        var_med = var_med.result()
+
+    logging.info("The distributed process has finished")
+    return cor_med, cov_from_cor(cor_med, var_med)
+
+def distributed_pvalues(frame, cor, nperm:int=100, test_type:str='two_sided',
+                        method:str='sparcc', th:float=0.1, x_iter:int=10, n_iter:int=20,
+                        norm:str='dirichlet', p_counts:int=1, client=None, n_workers:int=None,
+                        seed=None, fan_in:int=8):
+    '''
+    Pseudo p-values with one task per permutation replicate.
+
+    Each replicate permutes the counts (as MakeBootstraps.py), estimates
+    its correlations (median over n_iter iterations) and compares them
+    with cor (as PseudoPvals.py). The exceedance counts are summed in a
+    tree on the workers.
+
+    Parameters
+    ----------
+    frame : array_like
+        Counts, samples x components.
+    cor : array_like
+        Inferred correlations whose p-values are to be computed.
+    nperm : int, default 100
+        Number of permutations.
+    test_type : 'two_sided' (default) | 'one_sided'
+    fan_in : int, default 8
+        Partial counts summed by each reduction task.
+    Other parameters as in distributed_corr.
+
+    Returns
+    -------
+    p_vals: array
+        Computed pseudo p-values.
+    '''
+    get_compare(test_type)
+    counts = _counts(frame)
+    cor = np.asarray(cor, dtype=np.float64)
+    if norm != 'dirichlet':
+        n_iter = 1
+    seeds = np.random.SeedSequence(seed).spawn(nperm)
+
+    with cluster_client(client, n_workers) as c:
+        counts_f, cor_f = c.scatter([counts, cor], broadcast=True, hash=False)
+        partial = [c.submit(permutation_replicate, counts_f, cor_f, method, norm, th, x_iter, n_iter,
+                            p_counts, test_type, s, pure=False) for s in seeds]
+        n_sig = tree_reduce(c, partial, _sum, fan_in=fan_in).result()
+
+    p_vals = 1.*n_sig/nperm
+    p_vals[np.diag_indices_from(p_vals)] = 1
+    return p_vals
@@ -0,0 +1,170 @@
+'''
+Reusable SparCC estimator.
+
+main_alg allocates everything per call and keeps the estimates of every
+iteration in hdf5 files. The estimator keeps its work buffers (fractions,
+log fractions, covariance, variation matrix, the sparcc_path workspace
+and the per-iteration stack) between calls on data of the same shape,
+and its numba kernels are compiled once per process.
+'''
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+
+from numba import njit,prange
+from typing import Union
+
+from .compositional_methods import clr_from_cov
+from .SparCC import sparcc_path,Workspace
+
+
+@njit(parallel=True)
+def cov_to_variation(S,V):
+    '''
+    Write in V the variation matrix given the covariance S of the log fractions.
+    '''
+    k=S.shape[0]
+    for i in prange(k):
+        for j in range(k):
+            V[i,j]=S[i,i]+S[j,j]-2.*S[i,j]
+        V[i,i]=0.
+
+
+class SparCC(object):
+    '''
+    SparCC estimator with fit(counts).
+
+    Parameters
+    ----------
+    method : str, (sparcc|clr), default 'sparcc'
+    norm : str, (dirichlet|normalize|pseudo), default 'dirichlet'
+        Method used to normalize the counts to fractions.
+    n_iter : int,default 20
+        Number of estimation iteration to average over.
+    th : float,default 0.1
+        Exclusion threshold for SparCC,the valid values are 0.0<th<1.0
+    x_iter : int,default 10
+        Number of exclusion iterations for SparCC.
+    p_counts : int/float, default 1
+        Pseudo counts added with dirichlet and pseudo.
+    random_state : int or numpy Generator, default None
+        Seed of the dirichlet draws.
+
+    Attributes (after fit)
+    ----------------------
+    correlation_ : array
+        Estimated basis correlation matrix (median over the iterations).
+    covariance_ : array
+        Estimated basis covariance matrix.
+    basis_variances_ : array
+        Estimated basis variances (median over the iterations).
+    labels_ : Index or None
+        Columns of the counts when given as a DataFrame.
+
+    Usage:
+        model = SparCC(n_iter=20, random_state=0)
+        for counts in tables:
+            cor = model.fit(counts).correlation_
+    '''
+
+    def __init__(self, method:str='sparcc', norm:str='dirichlet', n_iter:int=20,
+                 th:float=0.1, x_iter:int=10, p_counts:int=1, random_state=None):
+        assert (th>0 and th<1.0),"The value must be between 0 and 1"
+        if method.lower() not in ['sparcc','clr']:
+            raise ValueError('Unsupported basis correlation method: "%s"' %method)
+        if norm not in ['dirichlet','normalize','pseudo']:
+            raise ValueError('Unsupported method "%s"' %norm)
+        self.method = method.lower()
+        self.norm = norm
+        self.n_iter = n_iter if norm == 'dirichlet' else 1
+        self.th = th
+        self.x_iter = x_iter
+        self.p_counts = p_counts
+        self.rng = np.random.default_rng(random_state)
+        self._shape = None
+
+    def _allocate(self, shape):
+        '''
+        Work buffers, reused while the shape of the data does not change.
+        '''
+        if self._shape == shape:
+            return
+        n, D = shape
+        self._alpha = np.empty((n,D))
+        self._fracs = np.empty((n,D))
+        self._S = np.empty((D,D))
+        self._var_mat = np.empty((D,D))
+        self._cor_stack = np.empty((self.n_iter,D,D))
+        self._var_stack = np.empty((self.n_iter,D))
+        self._workspace = Workspace(D, self.x_iter)
+        self._shape = shape
+
+    def _fractions(self):
+        if self.norm == 'dirichlet':
+            self.rng.standard_gamma(self._alpha, out=self._fracs)
+        else:
+            np.copyto(self._fracs, self._alpha)
+        self._fracs /= self._fracs.sum(axis=1, keepdims=True)
+        return self._fracs
+
+    def _basic_corr(self):
+        '''
+        basic_corr on the current buffers.
+        '''
+        n = self._fracs.shape[0]
+        L = np.log(self._fracs, out=self._fracs) # log fractions overwrite the fractions
+        L -= L.mean(axis=0)
+        np.matmul(L.T, L, out=self._S)
+        if self.method == 'clr':
+            return clr_from_cov(self._S/(n-1))
+
+        self._S /= n
+        cov_to_variation(self._S, self._var_mat)
+        for C_base, Cov_base, _ in sparcc_path(self._var_mat, th=self.th, x_iter=self.x_iter,
+                                                 workspace=self._workspace):
+            if C_base is None:
+                warnings.warn('Too many component excluded. Returning clr result.')
+                return clr_from_cov(self._S*(n/(n-1)))
+        tol = 1e-3 # tolerance for correlation range
+        if np.max(np.abs(C_base)) > 1 + tol:
+            warnings.warn('Sparcity assumption violated. Returning clr result.')
+            return clr_from_cov(self._S*(n/(n-1)))
+        return C_base, Cov_base
+
+    def fit(self, counts:Union[np.ndarray,pd.DataFrame]):
+        '''
+        Estimate the basis correlations of counts (samples x components).
+        '''
+        self.labels_ = counts.columns if isinstance(counts, pd.DataFrame) else None
+        counts = np.asarray(counts, dtype=np.float64)
+        k = counts.shape[1]
+        if k<4:
+            raise ValueError('Can not detect correlations between compositions of <4 components (%d given)' %k )
+        self._allocate(counts.shape)
+
+        if self.norm == 'normalize':
+            np.copyto(self._alpha, counts)
+        else:
+            np.add(counts, self.p_counts, out=self._alpha)
+
+        for i in range(self.n_iter):
+            logging.info("Running iteration {}".format(i))
+            self._fractions()
+            C_base, Cov_base = self._basic_corr()
+            self._cor_stack[i] = C_base
+            self._var_stack[i] = np.diag(Cov_base)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.correlation_ = np.nanmedian(self._cor_stack, axis=0)
+            self.basis_variances_ = np.nanmedian(self._var_stack, axis=0)
+        sd = np.sqrt(self.basis_variances_)
+        self.covariance_ = self.correlation_*sd[:,None]*sd[None,:]
+        return self
+
+    def fit_transform(self, counts:Union[np.ndarray,pd.DataFrame]):
+        '''
+        fit and return the estimated basis correlation matrix.
+        '''
+        return self.fit(counts).correlation_
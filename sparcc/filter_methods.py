@@ -0,0 +1,167 @@
+'''
+Optional prefilter of rare components before SparCC.
+
+Components (OTUs) that are almost always zero inflate D, and with it
+every D^2 and D^3 step, without giving usable correlations. The removed
+components are pooled into a single "other" component, so the table of
+the kept components stays closed and their fractions are unchanged, and
+the results are mapped back onto the original labels (NaN for the
+removed components).
+'''
+import logging
+import numpy as np
+import pandas as pd
+from typing import Union
+
+from .planner import plan
+
+__all__ = ["select_components",
+           "prefilter",
+           "expand_result",
+           "expand_knn",
+           "filter_report"]
+
+
+def select_components(frame:Union[np.ndarray,pd.DataFrame], prevalence:float=None,
+                      min_count:float=None, top_n:int=None):
+    '''
+    Mask of the components that pass every given criterion.
+
+    Parameters
+    ----------
+    frame : array_like
+        Counts, samples x components.
+    prevalence : float, default None
+        Minimum fraction of samples where the component is present (>0).
+    min_count : float, default None
+        Minimum total count of the component over all samples.
+    top_n : int, default None
+        Keep at most the top_n components by total count (of those
+        passing the other criteria).
+    '''
+    counts = np.asarray(frame)
+    keep = np.ones(counts.shape[1], dtype=bool)
+    totals = counts.sum(axis=0)
+    if prevalence is not None:
+        assert (prevalence>=0 and prevalence<=1.0),"The prevalence must be between 0 and 1"
+        keep &= (counts>0).mean(axis=0) >= prevalence
+    if min_count is not None:
+        keep &= totals >= min_count
+    if top_n is not None and keep.sum() > top_n:
+        order = np.argsort(-np.where(keep, totals, -np.inf), kind='stable')
+        keep[:] = False
+        keep[order[:top_n]] = True
+    return keep
+
+def prefilter(frame:Union[np.ndarray,pd.DataFrame], prevalence:float=None,
+              min_count:float=None, top_n:int=None, other:str='other'):
+    '''
+    Remove the components that do not pass select_components and pool
+    them into a last column named other.
+
+    Returns
+    -------
+    filtered: DataFrame
+        Counts of the kept components and, if any was removed, other.
+    keep: array
+        Mask of the kept components over the original columns.
+    '''
+    if not isinstance(frame, pd.DataFrame):
+        frame = pd.DataFrame(frame)
+    keep = select_components(frame, prevalence, min_count, top_n)
+    filtered = frame.loc[:, keep].copy()
+    if not keep.all():
+        if other in filtered.columns:
+            raise ValueError('There is already a component named "%s"' %other)
+        filtered[other] = frame.loc[:, ~keep].sum(axis=1)
+    if filtered.shape[1] < 4:
+        raise ValueError('Only %d components left after the filter' %filtered.shape[1])
+    logging.info('Prefilter kept {} of {} components'.format(keep.sum(), len(keep)))
+    return filtered, keep
+
+def expand_result(result:np.ndarray, keep:np.ndarray, labels=None, rows:bool=True):
+    '''
+    Map a result of the filtered table back onto the original components.
+
+    Parameters
+    ----------
+    result : array
+        D' x D' matrix (or q x D' with rows=False) of the filtered table,
+        the pooled other component, if present, being the last one.
+    keep : array
+        Mask returned by prefilter.
+    labels : list, default None
+        Original labels of the components.
+    rows : bool, default True
+        Also expand the rows (square results).
+
+    Returns
+    -------
+    expanded: DataFrame
+        Original components in the columns (and rows), NaN for the
+        removed ones. The other component is dropped.
+    '''
+    D = len(keep)
+    k = keep.sum()
+    idx = np.flatnonzero(keep)
+    labels = np.arange(D) if labels is None else labels
+    if rows:
+        expanded = np.full((D,D), np.nan)
+        expanded[np.ix_(idx,idx)] = result[:k,:k]
+        return pd.DataFrame(expanded, index=labels, columns=labels)
+    expanded = np.full((result.shape[0],D), np.nan)
+    expanded[:,idx] = result[:,:k]
+    return pd.DataFrame(expanded, columns=labels)
+
+def expand_knn(index:np.ndarray, value:np.ndarray, keep:np.ndarray):
+    '''
+    Map a k-NN graph of the filtered table (see knn_methods) back onto
+    the original components. The other component, as a row or as a
+    partner, is dropped, and the removed components have no partners.
+
+    Returns
+    -------
+    index, value: array
+        D x k partners (original positions) and values, -1 and NaN at
+        the end of the rows with less than k partners.
+    '''
+    D = len(keep)
+    idx = np.flatnonzero(keep)
+    k = len(idx)
+    rows = index[:k]
+    valid = (rows >= 0) & (rows < k)
+    # the partners of the kept components, the dropped ones moved last
+    order = np.argsort(~valid, axis=1, kind='stable')
+    rows = np.take_along_axis(rows, order, axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    expanded_index = np.full((D, index.shape[1]), -1, dtype=index.dtype)
+    expanded_value = np.full((D, index.shape[1]), np.nan)
+    expanded_index[idx] = np.where(valid, idx[np.clip(rows, 0, k-1)], -1)
+    expanded_value[idx] = np.where(valid, np.take_along_axis(value[:k], order, axis=1), np.nan)
+    return expanded_index, expanded_value
+
+def filter_report(frame:Union[np.ndarray,pd.DataFrame], keep:np.ndarray, n_iter:int=20,
+                  x_iter:int=10, **kwargs):
+    '''
+    What the filter removed and the compute it saves (planner estimates).
+
+    Returns
+    -------
+    report: dict
+        Components before/after (including other), fraction of the
+        counts pooled into other, and the predicted time and peak memory
+        of one in-memory run before and after.
+    '''
+    counts = np.asarray(frame)
+    n_samples, D = counts.shape
+    D_after = int(keep.sum()) + int(not keep.all())
+    before = plan(n_samples, D, n_iter=n_iter, x_iter=x_iter, **kwargs).loc['in-memory']
+    after = plan(n_samples, D_after, n_iter=n_iter, x_iter=x_iter, **kwargs).loc['in-memory']
+    return {'components_before':D,
+            'components_after':D_after,
+            'pooled_count_fraction':float(counts[:, ~keep].sum()/counts.sum()),
+            'est_seconds_before':float(before['est_seconds']),
+            'est_seconds_after':float(after['est_seconds']),
+            'peak_bytes_before':float(before['peak_bytes']),
+            'peak_bytes_after':float(after['peak_bytes']),
+            'speedup':float(before['est_seconds']/after['est_seconds'])}
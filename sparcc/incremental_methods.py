@@ -0,0 +1,208 @@
+'''
+SparCC from mergeable sufficient statistics of the log fractions.
+
+The variation matrix only needs the number of samples, the mean and the
+co-moment matrix of the log fractions, and these can be updated with new
+samples (or downdated, removing samples) without revisiting the old ones.
+'''
+import warnings
+import numpy as np
+
+from .core_methods import to_fractions
+from .compositional_methods import variation_from_cov,clr_from_cov
+from .SparCC import sparcc_path,Workspace
+
+
+class LogRatioStats(object):
+    '''
+    Count, mean and co-moment matrix of the log fractions.
+    Batches are combined with the pairwise update of Chan et al., which
+    is numerically stable, unlike plain sums of squares.
+    '''
+
+    def __init__(self, D:int):
+        self.n = 0
+        self.mean = np.zeros(D)
+        self.M2 = np.zeros((D,D))
+
+    def _merge(self, n_b:int, mean_b:np.ndarray, M2_b:np.ndarray, sign:int=1):
+        if sign > 0:
+            n = self.n + n_b
+            delta = mean_b - self.mean
+            self.M2 += M2_b
+            self.M2 += np.outer(delta, delta*(self.n*n_b/n))
+            self.mean += delta*(n_b/n)
+        else:
+            n = self.n - n_b
+            if n <= 0:
+                self.__init__(len(self.mean))
+                return self
+            mean_a = (self.n*self.mean - n_b*mean_b)/n
+            delta = mean_b - mean_a
+            self.M2 -= M2_b
+            self.M2 -= np.outer(delta, delta*(n*n_b/self.n))
+            self.mean = mean_a
+        self.n = n
+        return self
+
+    @staticmethod
+    def _batch(logf:np.ndarray):
+        logf = np.atleast_2d(logf)
+        mean_b = logf.mean(axis=0)
+        Xc = logf - mean_b
+        return len(logf), mean_b, Xc.T@Xc
+
+    def add(self, logf:np.ndarray):
+        '''
+        Add a batch of samples (rows) of log fractions.
+        '''
+        return self._merge(*self._batch(logf))
+
+    def remove(self, logf:np.ndarray):
+        '''
+        Remove a batch of samples previously added.
+        '''
+        return self._merge(*self._batch(logf), sign=-1)
+
+    def merge(self, other:'LogRatioStats'):
+        '''
+        Add the samples summarized by other.
+        '''
+        return self._merge(other.n, other.mean, other.M2)
+
+    def subtract(self, other:'LogRatioStats'):
+        '''
+        Remove the samples summarized by other, a subset of these.
+        '''
+        return self._merge(other.n, other.mean, other.M2, sign=-1)
+
+    def copy(self):
+        new = LogRatioStats(len(self.mean))
+        new.n, new.mean, new.M2 = self.n, self.mean.copy(), self.M2.copy()
+        return new
+
+    def cov(self, ddof:int=0):
+        '''
+        Covariance matrix of the log fractions.
+        '''
+        return self.M2/(self.n-ddof)
+
+    def variation(self):
+        '''
+        Variation matrix, same as variation_mat over the samples added.
+        '''
+        return variation_from_cov(self.cov())
+
+
+def path_corr(Var_mat:np.ndarray, cov_fun, th:float=0.1, x_iter:int=10, workspace:Workspace=None):
+    '''
+    SparCC of a variation matrix, falling back as basic_corr to the clr
+    result of the covariance (ddof=1) returned by cov_fun, which is only
+    called then. With a workspace the result is in its buffers.
+    '''
+    for C_base, Cov_base, _ in sparcc_path(Var_mat, th=th, x_iter=x_iter, workspace=workspace):
+        if C_base is None:
+            warnings.warn('Too many component excluded. Returning clr result.')
+            return clr_from_cov(cov_fun())
+    tol = 1e-3 # tolerance for correlation range
+    if np.max(np.abs(C_base)) > 1 + tol:
+        warnings.warn('Sparcity assumption violated. Returning clr result.')
+        return clr_from_cov(cov_fun())
+    return C_base, Cov_base
+
+def stats_corr(stats:LogRatioStats, method:str='sparcc', th:float=0.1, x_iter:int=10):
+    '''
+    basic_corr computed from the statistics of the log fractions.
+
+    Returns
+    -------
+    C_base: array
+        Estimated basis correlation matrix.
+    Cov_base: array
+        Estimated basis covariance matrix.
+    '''
+    assert (th>0 and th<1.0),"The value must be between 0 and 1"
+    method = method.lower()
+    if method == 'clr':
+        return clr_from_cov(stats.cov(ddof=1))
+    elif method != 'sparcc':
+        raise ValueError('Unsupported basis correlation method: "%s"' %method)
+    return path_corr(stats.variation(), lambda: stats.cov(ddof=1), th=th, x_iter=x_iter)
+
+def median_corr(cor_list, var_list):
+    '''
+    Median correlation over the estimations and the covariance rebuilt
+    from the median variances, as in main_alg.
+    '''
+    if len(cor_list) == 1:
+        cor_med, var_med = np.asarray(cor_list[0]), np.asarray(var_list[0])
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            cor_med = np.nanmedian(np.asarray(cor_list), axis=0)
+            var_med = np.nanmedian(np.asarray(var_list), axis=0)
+    sd = np.sqrt(var_med)
+    return cor_med, cor_med*sd[:,None]*sd[None,:]
+
+
+class IncrementalSparCC(object):
+    '''
+    SparCC estimator that accepts new batches of samples.
+
+    With norm 'normalize' or 'pseudo' the fractions of a sample do not
+    change between estimations, so a single set of statistics is kept.
+    With 'dirichlet' every one of the n_iter estimations keeps its own
+    statistics (n_iter D x D matrices) and each new sample gets a new
+    draw in each of them; the result is the median over the estimations,
+    as in main_alg.
+
+    Usage:
+        inc = IncrementalSparCC(norm='pseudo')
+        inc.partial_fit(counts_week1)
+        inc.partial_fit(counts_week2)
+        cor, cov = inc.correlation()
+    '''
+
+    def __init__(self, method:str='sparcc', norm:str='pseudo', n_iter:int=20,
+                 th:float=0.1, x_iter:int=10, p_counts:int=1):
+        self.method = method
+        self.norm = norm
+        self.n_iter = n_iter if norm == 'dirichlet' else 1
+        self.th = th
+        self.x_iter = x_iter
+        self.p_counts = p_counts
+        self.stats = None
+
+    @property
+    def n_samples(self):
+        return 0 if self.stats is None else self.stats[0].n
+
+    def partial_fit(self, counts):
+        '''
+        Update the statistics with a batch of counts (samples x components).
+        '''
+        counts = np.asarray(counts, dtype=np.float64)
+        if self.stats is None:
+            if counts.shape[1] < 4:
+                raise ValueError('Can not detect correlations between compositions of <4 components (%d given)' %counts.shape[1])
+            self.stats = [LogRatioStats(counts.shape[1]) for _ in range(self.n_iter)]
+        elif counts.shape[1] != len(self.stats[0].mean):
+            raise ValueError('The batch has %d components, %d expected' %(counts.shape[1], len(self.stats[0].mean)))
+
+        for stats in self.stats:
+            fracs = to_fractions(counts, method=self.norm, p_counts=self.p_counts)
+            stats.add(np.log(fracs))
+        return self
+
+    def correlation(self):
+        '''
+        Basis correlation & covariance of all the samples seen so far.
+        '''
+        if self.n_samples < 2:
+            raise ValueError('At least two samples are needed')
+        cor_list, var_list = [], []
+        for stats in self.stats:
+            C_base, Cov_base = stats_corr(stats, method=self.method, th=self.th, x_iter=self.x_iter)
+            cor_list.append(C_base)
+            var_list.append(np.diag(Cov_base))
+        return median_corr(cor_list, var_list)
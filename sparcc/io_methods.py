@@ -5,6 +5,7 @@ Created on Dec 6, 2012
 Modified on Feb 06, 2020
 @author: Daniel Legorreta
 '''
+import csv
 import numpy as np
 import pandas as pd 
 from pandas.io.parsers import read_csv as _read_csv
@@ -74,6 +75,104 @@ def read_txt(file_name:str, T:bool=True, verbose:bool=True, **kwargs):
     else:
         return temp 
 
+def _sniff_delimiter(file_name:Union[str,Path]):
+    '''
+    Delimiter of a table (tab, comma or semicolon) from its first lines.
+    '''
+    with open(file_name, newline='') as f:
+        sample=''.join([f.readline() for _ in range(5)])
+    try:
+        return csv.Sniffer().sniff(sample, delimiters='\t,;').delimiter
+    except csv.Error:
+        return '\t' if '\t' in sample else ','
+
+def _count_lines(file_name:Union[str,Path], block:int=2**20):
+    '''
+    Number of lines of a file, the last one with or without newline.
+    '''
+    n,last=0,b'\n'
+    with open(file_name,'rb') as f:
+        while True:
+            data=f.read(block)
+            if not data:
+                break
+            n+=data.count(b'\n')
+            last=data[-1:]
+    return n+(last!=b'\n')
+
+def read_counts(file_name:Union[str,Path], dtype=None, chunk_rows:int=4096,
+                sep:str=None, verbose:bool=True):
+    '''
+    Stream a count table into a samples x components array.
+
+    The table has the layout read by read_txt: one component (OTU) per
+    row, with its label in the first column, and the sample labels in
+    the header. The delimiter is detected once, and the rows are parsed
+    in chunks directly into a preallocated array, so the peak memory is
+    one copy of the counts plus one chunk (read_txt holds the parsed
+    table and its transpose, and the scripts may parse the file twice).
+
+    Parameters
+    ----------
+    file_name : str
+        Path to the table.
+    dtype : numpy dtype, default None
+        dtype of the counts. By default int64, switched to float64 (one
+        conversion) at the first non integer value. With an integer
+        dtype non integer values raise a ValueError.
+    chunk_rows : int, default 4096
+        Rows of the file parsed at once.
+    sep : str, default None
+        Delimiter, detected from the first lines by default.
+    verbose : bool, default True
+        Print the dimensions of the parsed table.
+
+    Returns
+    -------
+    counts: array
+        n_samples x n_components counts, in Fortran order: the counts of
+        every component (a row of the file) are contiguous.
+    components: Index
+        Labels of the components.
+    samples: Index
+        Labels of the samples.
+    '''
+    if sep is None:
+        sep=_sniff_delimiter(file_name)
+    n_rows=_count_lines(file_name)-1
+    if n_rows<1:
+        raise ValueError('The table "%s" has no rows' %file_name)
+    reader=_read_csv(file_name,sep=sep,index_col=0,chunksize=chunk_rows)
+
+    fixed=dtype is not None
+    dtype=np.dtype(dtype or np.int64)
+    counts,labels,r0=None,[],0
+    for chunk in reader:
+        values=chunk.to_numpy()
+        if counts is None:
+            counts=np.empty((chunk.shape[1],n_rows),dtype=dtype,order='F')
+        if np.issubdtype(dtype,np.integer) and not np.issubdtype(values.dtype,np.integer):
+            values=values.astype(np.float64)
+            if not np.all(np.isfinite(values)&(values==np.round(values))):
+                if fixed:
+                    raise ValueError('Non integer or missing counts in "%s", use a float dtype' %file_name)
+                dtype=np.dtype(np.float64)
+                counts=counts.astype(dtype,order='F')
+        counts[:,r0:r0+len(chunk)]=values.T
+        labels.append(chunk.index)
+        r0+=len(chunk)
+    if counts is None:
+        raise ValueError('The table "%s" has no rows' %file_name)
+
+    # blank lines are counted but not parsed
+    counts=counts[:,:r0]
+    components=labels[0].append(labels[1:])
+    samples=chunk.columns
+    if verbose:
+        print('''\nFinished parsing table.\nTable dimensions, num_rows: {0} & num_colums: {1}\n'''
+              .format(counts.shape[0],counts.shape[1]))
+    return counts,components,samples
+
 def write_txt(frame:Union[pd.DataFrame,np.ndarray], file_name:Union[str,Path], T:bool=True, **kwargs):
     '''
     Write frame to txt file.
@@ -0,0 +1,128 @@
+'''
+Leave-one-sample-out (jackknife) stability of the SparCC correlations.
+
+Removing sample k from the statistics of the log fractions is a rank one
+downdate: with d = logf_k - mean, the co-moment matrix loses n/(n-1)*d*d^T,
+so the variation matrix without sample k is
+
+    T_k = (W - n/(n-1)*(d_i-d_j)^2)/(n-1),    W = variation_from_cov(M2)
+
+and is written in O(D^2) into a buffer, instead of the O(n*D^2) of new
+fractions and a new variation_mat. The exclusion path of every sample
+runs on the same Workspace, whose buffers and low rank basis variance
+solve are reused. Only the running mean and variance of the estimates
+are kept (a CorrelationSketch without quantiles), not the n matrices.
+'''
+import numpy as np
+import pandas as pd
+
+from numba import njit,prange
+from typing import Union
+
+from .core_methods import to_fractions
+from .compositional_methods import variation_from_cov,clr_from_cov
+from .incremental_methods import LogRatioStats,path_corr,median_corr
+from .sketch_methods import CorrelationSketch
+from .SparCC import Workspace
+from .profiler import span
+
+__all__ = ["loo_variation",
+           "jackknife_corr"]
+
+
+@njit(parallel=True)
+def loo_variation(W, d, a, b, out):
+    '''
+    out = a*W - b*(d_i-d_j)^2, the variation matrix without one sample
+    (a=1/(n-1), b=n/(n-1)^2, d the deviation of the sample from the mean).
+    '''
+    D = W.shape[0]
+    for i in prange(D):
+        for j in range(D):
+            e = d[i]-d[j]
+            out[i,j] = a*W[i,j]-b*e*e
+
+def jackknife_corr(frame:Union[np.ndarray,pd.DataFrame], method:str='sparcc',
+                   norm:str='pseudo',
+                   n_iter:int=20,
+                   th:float=0.1,
+                   x_iter:int=10,
+                   p_counts:int=1,
+                   verbose:bool=False):
+    '''
+    Jackknife of the basis correlations over the samples.
+
+    Parameters
+    ----------
+    frame : array_like
+        2D array of counts. Columns are components, rows are samples.
+    norm : str, default 'pseudo'
+        With 'dirichlet' n_iter draws are made once and every leave-one-out
+        estimate is the median over them, as main_alg.
+    Other parameters as in main_alg.
+
+    Returns
+    -------
+    result: dict
+        cor, cov: estimates with all the samples.
+        jack_mean: mean of the n leave-one-out correlations.
+        jack_var: jackknife variance, (n-1)/n*sum_k (C_k-jack_mean)^2.
+        n: number of leave-one-out estimates of every pair (not NaN).
+    '''
+    if isinstance(frame,pd.DataFrame):
+        frame=frame.values
+    counts = np.asarray(frame, dtype=np.float64)
+    n, D = counts.shape
+    if n < 3:
+        raise ValueError('The jackknife needs at least three samples')
+    method = method.lower()
+    if method not in ['sparcc', 'clr']:
+        raise ValueError('Unsupported basis correlation method: "%s"' %method)
+
+    chains = n_iter if norm == 'dirichlet' else 1
+    with span('log_fractions'):
+        logf = [np.log(to_fractions(counts, method=norm, p_counts=p_counts)) for _ in range(chains)]
+        stats = [LogRatioStats(D).add(l) for l in logf]
+        W = [variation_from_cov(s.M2) for s in stats]
+
+    ws = Workspace(D, x_iter)
+    T = np.empty((D,D))
+
+    def estimate(s, w, d):
+        # all the samples when d is None, else without the sample at d
+        if d is None:
+            cov_fun = lambda: s.cov(ddof=1)
+            np.copyto(T, s.variation())
+        else:
+            cov_fun = lambda: (s.M2-np.outer(d, d*(n/(n-1.))))/(n-2.)
+            loo_variation(w, d, 1./(n-1), n/(n-1.)**2, T)
+        if method == 'clr':
+            C_base, Cov_base = clr_from_cov(cov_fun())
+        else:
+            C_base, Cov_base = path_corr(T, cov_fun, th=th, x_iter=x_iter, workspace=ws)
+        return C_base.copy(), np.diag(Cov_base).copy()
+
+    def median(deviations):
+        cor_list, var_list = [], []
+        for s, w, d in zip(stats, W, deviations):
+            C_base, V_base = estimate(s, w, d)
+            cor_list.append(C_base)
+            var_list.append(V_base)
+        return median_corr(cor_list, var_list)
+
+    with span('full_corr'):
+        cor, cov = median([None]*chains)
+    sketch = CorrelationSketch(D, quantiles=(), dtype=np.float64)
+    with span('jackknife', n_samples=n):
+        for k in range(n):
+            if verbose:
+                print('\tLeaving out sample {}/{}'.format(k+1, n))
+            cor_k, _ = median([l[k]-s.mean for l, s in zip(logf, stats)])
+            sketch.update(cor_k)
+
+    summary = sketch.result()
+    m = summary['n'].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jack_var = np.where(m > 1, (m-1.)**2/m*summary['sd']**2, np.nan)
+    np.fill_diagonal(jack_var, 0.)
+    return {'cor':cor, 'cov':cov, 'jack_mean':summary['mean'], 'jack_var':jack_var, 'n':summary['n']}
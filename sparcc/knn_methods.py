@@ -0,0 +1,108 @@
+'''
+k nearest neighbor (strongest partner) graphs of the correlations.
+
+Networks usually keep only the k strongest partners of every component.
+They are selected by row blocks with a partial sort (np.argpartition),
+so with main_alg(top_k=k) the median of the iterations is never held as
+a D x D matrix: each block of rows is reduced to its k partners as soon
+as its median is taken.
+'''
+import warnings
+import numpy as np
+import pandas as pd
+
+__all__ = ["top_k_rows",
+           "median_top_k",
+           "knn_edges"]
+
+
+def top_k_rows(block:np.ndarray, k:int, r0:int=0, absolute:bool=True):
+    '''
+    The k strongest entries of every row of a block of rows.
+
+    Parameters
+    ----------
+    block : array
+        b x D rows r0, ..., r0+b-1 of a D x D matrix. The diagonal and
+        NaN entries are never selected.
+    k : int
+        Partners per row, at most D-1.
+    r0 : int, default 0
+        Row of the matrix of the first row of the block.
+    absolute : bool, default True
+        Rank by |value| instead of value.
+
+    Returns
+    -------
+    index: array
+        b x k columns of the partners, strongest first, -1 where a row
+        has less than k valid entries.
+    value: array
+        b x k values of the partners, NaN where index is -1.
+    '''
+    b, D = block.shape
+    k = min(k, D-1)
+    score = np.abs(block) if absolute else np.array(block, dtype=np.float64)
+    score[np.isnan(score)] = -np.inf
+    rows = np.arange(b)
+    diag = rows+r0 < D
+    score[rows[diag], rows[diag]+r0] = -np.inf
+
+    index = np.argpartition(-score, k-1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(score, index, axis=1), axis=1, kind='stable')
+    index = np.take_along_axis(index, order, axis=1)
+    value = np.take_along_axis(block, index, axis=1).astype(np.float64)
+
+    invalid = ~np.isfinite(np.take_along_axis(score, index, axis=1))
+    index[invalid] = -1
+    value[invalid] = np.nan
+    return index, value
+
+def median_top_k(dsets, k:int, block_size:int=512, absolute:bool=True):
+    '''
+    Median over the iterations and top-k partners, by row blocks.
+
+    Parameters
+    ----------
+    dsets : list
+        D x D estimate of every iteration (hdf5 datasets or arrays),
+        only block_size rows of each are read at once.
+    k : int
+        Partners per row.
+    block_size : int, default 512
+    absolute : bool, default True
+
+    Returns
+    -------
+    index, value: array
+        D x k, see top_k_rows.
+    '''
+    D = dsets[0].shape[0]
+    k = min(k, D-1)
+    index = np.empty((D, k), dtype=np.int64)
+    value = np.empty((D, k))
+    for r0 in range(0, D, block_size):
+        r1 = min(r0+block_size, D)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            med = np.nanmedian(np.stack([d[r0:r1] for d in dsets]), axis=0)
+        index[r0:r1], value[r0:r1] = top_k_rows(med, k, r0=r0, absolute=absolute)
+    return index, value
+
+def knn_edges(index:np.ndarray, value:np.ndarray, labels=None):
+    '''
+    Edge list of a k-NN graph.
+
+    Returns
+    -------
+    edges: DataFrame
+        source, target, cor and rank (1 for the strongest partner) of
+        every selected partner. A pair strong for both components
+        appears twice, once per direction.
+    '''
+    labels = np.arange(index.shape[0]) if labels is None else np.asarray(labels)
+    rows, ranks = np.nonzero(index >= 0)
+    return pd.DataFrame({'source':labels[rows],
+                         'target':labels[index[rows, ranks]],
+                         'cor':value[rows, ranks],
+                         'rank':ranks+1})
@@ -0,0 +1,67 @@
+'''
+Permuted datasets and comparisons used to get pseudo p-values.
+
+Shared by MakeBootstraps.py, PseudoPvals.py and the distributed backend.
+'''
+import numpy as np
+import pandas as pd
+from typing import Union
+
+
+def permute_w_replacement(frame:Union[pd.DataFrame,np.ndarray], axis=0, rng=None):
+    '''
+    Permute the frame values across the given axis.
+    Create simulated dataset were the counts of each component (column)
+    in each sample (row), are randomly sampled from the all the
+    counts of that component in all samples.
+
+    Parameters
+    ----------
+    frame : Numpy Array
+        Frame to permute.
+    axis : {0, 1}
+        - 0 - Permute row values across columns
+        - 1 - Permute column values across rows
+    rng : numpy Generator, default None
+        Source of the permutations, the global numpy state by default.
+
+    Returns
+    -------
+    Permuted DataFrame (new instance).
+    '''
+
+    if isinstance(frame,pd.DataFrame):
+        frame=frame.values
+
+    rng=np.random if rng is None else rng
+    fp=lambda x:rng.permutation(x)
+
+    if axis==0:
+        #Along the columns
+        aux=np.apply_along_axis(fp,0,frame)
+        aux=np.apply_along_axis(fp,1,aux)
+        return  aux
+
+    elif axis==1:
+        #Along the rows
+        aux=np.apply_along_axis(fp,1,frame)
+        aux=np.apply_along_axis(fp,0,aux)
+        return aux
+
+def compare2sided(perm,real):
+    return np.abs(perm) >= np.abs(real)
+
+def compare1sided(perm,real):
+    inds_abs = compare2sided(perm,real)
+    inds_sign = np.sign(perm) == np.sign(real)
+    return inds_abs & inds_sign
+
+def get_compare(test_type:str='two_sided'):
+    '''
+    Comparison function of the test type (two_sided|one_sided).
+    '''
+    if test_type == 'two_sided':
+        return compare2sided
+    elif test_type == 'one_sided':
+        return compare1sided
+    raise ValueError('unsupported test type "%s"' %test_type)
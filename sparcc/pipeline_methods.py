@@ -0,0 +1,156 @@
+'''
+Pipelined end-to-end SparCC with pseudo p-values.
+
+General_Execution.py runs the steps one after the other: SparCC, all the
+permuted tables written to disk, SparCC on each of them, and the
+p-values from the files. Here the steps overlap:
+
+    producer thread --(queue of depth tables)--> process pool --> accumulator
+
+The producer draws the permuted tables (and writes them if a template is
+given) while the pool estimates the previous ones, and the main thread
+adds every finished replicate to the exceedance counts as soon as it
+arrives. At most depth tables wait in the queue and at most n_workers
+replicates are in flight, so the memory does not grow with nperm.
+
+Permutation i uses the seeds of distributed_pvalues and shard_counts,
+and the real correlations those of distributed_corr, so the results
+equal theirs for the same seed.
+'''
+import queue
+import logging
+import threading
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import wait,FIRST_COMPLETED
+
+from .distributed_methods import replicate_corr,estimate_corr
+from .permutation_methods import permute_w_replacement,get_compare
+from .shard_methods import permutation_seed
+from .io_methods import write_txt
+from .resources import worker_pool,get_thread_budget
+
+__all__ = ["pipelined_pvalues"]
+
+
+def _produce(counts, nperm, n_iter, seed, tables, stop, perm_template, labels):
+    def put(item):
+        while not stop.is_set():
+            try:
+                tables.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        for i in range(nperm):
+            seeds = permutation_seed(seed, i).spawn(n_iter+1)
+            perm = permute_w_replacement(counts, axis=1, rng=np.random.default_rng(seeds[0]))
+            if perm_template is not None:
+                write_txt(pd.DataFrame(perm, columns=labels), perm_template.replace('#', str(i)), index=True)
+            if not put((i, perm, seeds[1:])):
+                return
+        put(None)
+    except BaseException as e:
+        put(e)
+
+def pipelined_pvalues(frame, cor=None, nperm:int=100, test_type:str='two_sided',
+                      method:str='sparcc', th:float=0.1, x_iter:int=10, n_iter:int=20,
+                      norm:str='dirichlet', p_counts:int=1, n_workers:int=None,
+                      depth:int=4, seed:int=0, perm_template:str=None, verbose:bool=True):
+    '''
+    Correlations and pseudo p-values with sampling, estimation and
+    accumulation running concurrently.
+
+    Parameters
+    ----------
+    frame : array_like
+        Counts, samples x components.
+    cor : array_like, default None
+        Correlations whose p-values are computed. By default they are
+        estimated in the pool, concurrently with the first replicates.
+    nperm : int, default 100
+        Number of permutations.
+    test_type : 'two_sided' (default) | 'one_sided'
+    n_workers : int, default None
+        Processes estimating the replicates, the thread budget by default.
+    depth : int, default 4
+        Permuted tables drawn ahead of the pool.
+    seed : int, default 0
+        Seed of the draws and permutations.
+    perm_template : str, default None
+        If given, every permuted table is also written to this file name,
+        "#" being replaced by the permutation number (as MakeBootstraps.py).
+    Other parameters as in main_alg.
+
+    Returns
+    -------
+    cor: array
+        The given correlations, or the estimated ones.
+    cov: array
+        Estimated basis covariance matrix, None when cor is given.
+    p_vals: array
+        Computed pseudo p-values.
+    '''
+    assert depth >= 1, "The queue must hold at least one table"
+    compare = get_compare(test_type)
+    labels = frame.columns if isinstance(frame, pd.DataFrame) else None
+    counts = frame.values if isinstance(frame, pd.DataFrame) else np.asarray(frame)
+    if norm != 'dirichlet':
+        n_iter = 1
+    n_workers = max(1, n_workers or get_thread_budget())
+    args = (method, norm, th, x_iter, p_counts)
+
+    cov = None
+    waiting = []  # replicates finished before the real correlations
+    n_sig = np.zeros((counts.shape[1],)*2, dtype=np.int64)
+    tables = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    producer = threading.Thread(target=_produce, daemon=True,
+                                args=(counts, nperm, n_iter, seed, tables, stop, perm_template, labels))
+    producer.start()
+    try:
+        with worker_pool(n_workers) as pool:
+            pending = {}
+            if cor is None:
+                real = pool.submit(estimate_corr, counts, *args, np.random.SeedSequence(seed).spawn(n_iter))
+                pending[real] = None
+            else:
+                cor = np.asarray(cor, dtype=np.float64)
+            produced = nperm == 0
+            done_perm = 0
+            while pending or not produced:
+                while not produced and len(pending)+len(waiting) < n_workers:
+                    item = tables.get()
+                    if item is None:
+                        produced = True
+                    elif isinstance(item, BaseException):
+                        raise item
+                    else:
+                        i, perm, seeds = item
+                        pending[pool.submit(replicate_corr, perm, *args, seeds)] = i
+                if not pending:
+                    continue
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = pending.pop(future)
+                    if i is None:
+                        cor, cov = future.result()
+                        continue
+                    waiting.append(future.result())
+                    done_perm += 1
+                    if verbose: print('\tPermutation {} done ({}/{})'.format(i, done_perm, nperm))
+                    logging.info("Permutation {} done".format(i))
+                if cor is not None:
+                    for cor_perm in waiting:
+                        n_sig += compare(cor_perm, cor)
+                    waiting = []
+    finally:
+        stop.set()
+        producer.join()
+
+    p_vals = 1.*n_sig/max(nperm, 1)
+    p_vals[np.diag_indices_from(p_vals)] = 1
+    return cor, cov, p_vals
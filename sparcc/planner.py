@@ -0,0 +1,141 @@
+'''
+Analytic memory and time planner for SparCC runs.
+
+The peak memory of each execution mode is predicted from the sizes of the
+arrays it holds, instead of allocating a trial matrix:
+
+- in-memory: every iteration estimate kept in RAM (as the SparCC estimator).
+- spilled: the estimates of each iteration written to hdf5 and the median
+  taken by row blocks (main_alg), only the D x D working arrays in RAM.
+
+The time estimates are rough, they assume `gflops` of sustained
+throughput per worker and are meant to compare modes and sizes.
+'''
+import math
+import numpy as np
+import pandas as pd
+
+from .resources import cpu_count,memory_info
+
+__all__ = ["plan",
+           "recommend",
+           "available_memory"]
+
+# D x D arrays alive at the peak of run_sparcc: Var_mat and the masked
+# copy, C_base and Cov_base of the sparcc_path workspace.
+N_SQUARE_WORK = 4
+# Extra D x D arrays of the backend (clr fallback, dask chunks).
+N_SQUARE_SOLVE = {'numpy':1, 'numba':1, 'dask':2}
+
+
+def available_memory():
+    '''
+    Available RAM in bytes (see resources.memory_info), None if it is
+    not known.
+    '''
+    info = memory_info()
+    if info is None:
+        return None
+    return float(info['available'])
+
+def plan(n_samples:int, D:int, n_iter:int=20, nperm:int=0, x_iter:int=10,
+         dtype='float64', backend:str='numpy', block_size:int=512,
+         gflops:float=5.):
+    '''
+    Predicted peak memory, disk and time of each execution mode.
+
+    Parameters
+    ----------
+    n_samples : int
+    D : int
+        Number of components.
+    n_iter : int, default 20
+        Estimation iterations.
+    nperm : int, default 0
+        Permutations for the pseudo p-values (each one a full run).
+    x_iter : int, default 10
+        Exclusion iterations.
+    dtype : numpy dtype, default float64
+    backend : str, (numpy|numba|dask), default numpy
+        Backend of the basis variance solve.
+    block_size : int, default 512
+        Rows per block of the median of the spilled mode.
+    gflops : float, default 5.0
+        Assumed throughput per worker for the time estimate.
+
+    Returns
+    -------
+    modes: DataFrame
+        One row per mode with peak_bytes (per run), disk_bytes and
+        est_seconds (one worker, including the permutations).
+    '''
+    if backend not in N_SQUARE_SOLVE:
+        raise ValueError('Unsupported backend "%s"' %backend)
+    b = np.dtype(dtype).itemsize
+    sq = D*D*b
+    data = 3*n_samples*D*b # counts, fractions and log fractions
+    block = min(block_size, D)*D*b
+    work = (N_SQUARE_WORK + N_SQUARE_SOLVE[backend])*sq
+
+    modes = {
+        'in-memory':{'peak_bytes':data + work + (n_iter+1)*sq,
+                     'disk_bytes':0},
+        'spilled':{'peak_bytes':data + work + (n_iter+1)*block,
+                   'disk_bytes':n_iter*(sq + D*b)},
+    }
+
+    # floating point operations of one run
+    variation = 20.*n_samples*D*D/2        # logs and variances of every pair
+    solves = (x_iter+1)*2.*D*(x_iter+1)**2 # Woodbury basis variance solves
+    refine = (x_iter+1)*10.*D*D            # C_from_V and exclusion search
+    median = n_iter*D*D*math.log2(max(n_iter,2))
+    flops = {
+        'in-memory':n_iter*(variation+solves+refine)+median,
+        'spilled':n_iter*(variation+solves+refine)+median,
+    }
+    for mode in modes:
+        modes[mode]['est_seconds'] = (nperm+1)*flops[mode]/(gflops*1e9)
+
+    modes = pd.DataFrame(modes).T
+    modes.index.name = 'mode'
+    return modes
+
+def recommend(n_samples:int, D:int, n_iter:int=20, nperm:int=0,
+              available:float=None, safety:float=0.8, **kwargs):
+    '''
+    Pick the fastest mode, and the number of workers, that fit in memory.
+
+    Parameters
+    ----------
+    available : float, default None
+        Bytes of RAM to plan for, available_memory() by default.
+    safety : float, default 0.8
+        Fraction of the available memory that can be used.
+    kwargs :
+        Passed to plan.
+
+    Returns
+    -------
+    choice: dict
+        mode, workers, peak_bytes (all the workers), est_seconds,
+        available_bytes and the table of every mode.
+        mode is None if nothing fits.
+    '''
+    modes = plan(n_samples, D, n_iter=n_iter, nperm=nperm, **kwargs)
+    if available is None:
+        available = available_memory()
+    budget = float('inf') if available is None else safety*available
+    cpus = cpu_count()
+
+    choice = {'mode':None, 'workers':0, 'peak_bytes':None, 'est_seconds':None,
+              'available_bytes':available, 'modes':modes}
+    for mode in ['in-memory','spilled']:
+        peak = modes.loc[mode,'peak_bytes']
+        if peak > budget:
+            continue
+        # the runs of the permutations are independent
+        workers = max(1, min(cpus, nperm+1, int(budget//peak) if budget < float('inf') else cpus))
+        choice.update(mode=mode, workers=workers, peak_bytes=workers*peak,
+                      est_seconds=modes.loc[mode,'est_seconds']/workers)
+        break
+    return choice
@@ -0,0 +1,144 @@
+'''
+Optional per-stage profiling of the SparCC run.
+
+The stages of main_alg are wrapped in spans, which record wall time,
+CPU time and RSS (peak and at exit, if psutil is available) when the
+profiler is enabled, and cost almost nothing otherwise. Counters (e.g.
+the number of excluded pairs) inherit the labels of the enclosing span.
+'''
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+__all__ = ["PROFILER",
+           "span",
+           "count",
+           "enable_profiling",
+           "disable_profiling"]
+
+
+class Profiler(object):
+
+    def __init__(self, interval:float=0.01):
+        self.enabled = False
+        self.interval = interval
+        self.records = []
+        self._open = []
+        self._sampler = None
+
+    def enable(self):
+        self.enabled = True
+        self.records = []
+        if psutil is not None and self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, daemon=True)
+            self._sampler.start()
+
+    def disable(self):
+        self.enabled = False
+        self._sampler = None
+
+    def _rss(self):
+        return psutil.Process().memory_info().rss/1e6 if psutil is not None else float('nan')
+
+    def _sample(self):
+        '''
+        Keep the peak RSS of the open spans up to date.
+        '''
+        me = threading.current_thread()
+        while self.enabled and self._sampler is me:
+            rss = self._rss()
+            for record in list(self._open):
+                record['peak_rss_mb'] = max(record['peak_rss_mb'], rss)
+            time.sleep(self.interval)
+
+    def _labels(self):
+        labels = {}
+        for record in self._open:
+            labels.update(record['labels'])
+        return labels
+
+    @contextmanager
+    def span(self, stage:str, **labels):
+        if not self.enabled:
+            yield
+            return
+        labels = dict(self._labels(), **labels)
+        rss = self._rss()
+        record = {'stage':stage, 'labels':labels, 'peak_rss_mb':rss}
+        self._open.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record['wall_s'] = time.perf_counter()-wall
+            record['cpu_s'] = time.process_time()-cpu
+            record['rss_mb'] = self._rss()
+            record['peak_rss_mb'] = max(record['peak_rss_mb'], record['rss_mb'])
+            self._open.remove(record)
+            self.records.append(record)
+            logging.info('{} {} wall: {:.3f}s cpu: {:.3f}s peak rss: {:.1f} MB'.format(
+                stage, labels if labels else '', record['wall_s'], record['cpu_s'], record['peak_rss_mb']))
+
+    def count(self, name:str, value, **labels):
+        if not self.enabled:
+            return
+        labels = dict(self._labels(), **labels)
+        self.records.append({'stage':name, 'labels':labels, 'value':value})
+
+    def report(self):
+        '''
+        One row per span or counter, labels as columns.
+        '''
+        rows = [dict({k:v for k,v in r.items() if k != 'labels'}, **r['labels']) for r in self.records]
+        return pd.DataFrame(rows)
+
+    def summary(self):
+        '''
+        Total wall/CPU time, max peak RSS and calls per stage.
+        '''
+        report = self.report()
+        if 'wall_s' not in report:
+            return pd.DataFrame()
+        spans = report[report['wall_s'].notna()]
+        return spans.groupby('stage').agg(calls=('wall_s','size'), wall_s=('wall_s','sum'),
+                                          cpu_s=('cpu_s','sum'), peak_rss_mb=('peak_rss_mb','max'))
+
+    def save(self, prefix:str):
+        '''
+        Write prefix.json (records and summary) and prefix.csv (records).
+        '''
+        self.report().to_csv(prefix+'.csv', index=False)
+        with open(prefix+'.json', 'w') as f:
+            json.dump({'records':self.records,
+                       'summary':self.summary().reset_index().to_dict(orient='records')},
+                      f, indent=1, default=str)
+
+
+PROFILER = Profiler()
+
+def span(stage:str, **labels):
+    '''
+    Context manager timing a stage with the global profiler.
+    '''
+    return PROFILER.span(stage, **labels)
+
+def count(name:str, value, **labels):
+    '''
+    Record a counter with the global profiler.
+    '''
+    PROFILER.count(name, value, **labels)
+
+def enable_profiling():
+    PROFILER.enable()
+
+def disable_profiling():
+    PROFILER.disable()
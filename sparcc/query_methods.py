@@ -0,0 +1,262 @@
+'''
+Correlations of a subset of components (query) against all the others.
+
+The basis variances are still estimated with every component, but the
+variation matrix is never materialized: its row sums come from the
+covariance of the log fractions and the exclusion step scans it in
+blocks of rows. Memory and output scale with len(query)*D instead of D^2.
+'''
+import logging
+import warnings
+import numpy as np
+import pandas as pd
+
+from typing import List,Union
+
+from .core_methods import to_fractions
+from .SparCC import basis_var_lowrank
+from .profiler import span
+
+
+def log_centered(fracs:np.ndarray):
+    '''
+    Return the column centered log fractions and their variances (ddof=0).
+    '''
+    L=np.log(fracs)
+    Lc=L-L.mean(axis=0,keepdims=True)
+    s=np.einsum('ij,ij->j',Lc,Lc)/Lc.shape[0]
+    return Lc,s
+
+def variation_rows(Lc:np.ndarray,s:np.ndarray,rows):
+    '''
+    Rows of the variation matrix, t_ij=var(log(x_i/x_j)),
+    computed as s_i + s_j - 2*cov(log x_i,log x_j).
+    '''
+    rows=np.asarray(rows,dtype=np.int64)
+    T=s[rows,None]+s[None,:]-2.*(Lc[:,rows].T@Lc)/Lc.shape[0]
+    T[np.arange(len(rows)),rows]=0.
+    return T
+
+def variation_row_sums(Lc:np.ndarray,s:np.ndarray):
+    '''
+    Row sums of the variation matrix in O(n*D).
+    '''
+    n,D=Lc.shape
+    r=Lc.T@Lc.sum(axis=1)/n
+    return D*s+s.sum()-2.*r
+
+def strongest_pair_blocks(Lc,s,V_base,excluded_pairs:List=[],block_size:int=512):
+    '''
+    Blockwise version of new_excluded_pair over the implicit correlation matrix.
+
+    Returns
+    -------
+    pair: tuple
+        (i,j) of the strongest pair not previously excluded.
+    cmax: float
+        Its absolute correlation.
+    amax: float
+        Largest absolute correlation, including the excluded pairs.
+    '''
+    D=Lc.shape[1]
+    sd=np.sqrt(V_base)
+    excluded=np.array(excluded_pairs,dtype=np.int64).reshape(-1,2)
+    pair,cmax,amax=(0,0),0.,0.
+
+    for r0 in range(0,D,block_size):
+        rows=np.arange(r0,min(r0+block_size,D))
+        C=np.abs(0.5*(V_base[rows,None]+V_base[None,:]-variation_rows(Lc,s,rows)))
+        C/=sd[rows,None]
+        C/=sd[None,:]
+        C[np.arange(D)[None,:]<=rows[:,None]]=0. # upper triangle only
+        amax=max(amax,C.max())
+
+        inside=(excluded[:,0]>=rows[0])&(excluded[:,0]<=rows[-1])
+        C[excluded[inside,0]-r0,excluded[inside,1]]=0.
+        a=np.unravel_index(np.argmax(C),C.shape)
+        if C[a]>cmax:
+            pair,cmax=(int(rows[a[0]]),int(a[1])),C[a]
+
+    return pair,cmax,amax
+
+def run_sparcc_query(fracs:np.ndarray,query,th:float=0.1,x_iter:int=10,block_size:int=512):
+    '''
+    Estimate the basis correlations of the query components against all components.
+    Same procedure as run_sparcc without holding any D x D array.
+
+    Once a component is excluded its correlations become NaN, which stops the
+    exclusion search of run_sparcc, so the refinement stops there as well.
+
+    Returns
+    -------
+    C_base: array
+        len(query) x D estimated basis correlations.
+    Cov_base: array
+        len(query) x D estimated basis covariances.
+    V_base: array
+        Estimated basis variances of all the components.
+    '''
+    query=np.asarray(query,dtype=np.int64)
+    Lc,s=log_centered(fracs)
+    D=Lc.shape[1]
+
+    V_vec=variation_row_sums(Lc,s)
+    V_base=basis_var_lowrank(V_vec)
+
+    excluded_pairs=[]
+    excluded_comp=np.array([],dtype=np.int64)
+    amax=None
+    for xi in range(x_iter):
+        to_exclude,cmax,amax=strongest_pair_blocks(Lc,s,V_base,excluded_pairs,block_size)
+        if not cmax > th:
+            break
+        excluded_pairs.append(to_exclude)
+        i,j=to_exclude
+        t_ij=variation_rows(Lc,s,[i])[0,j]
+        V_vec[i]-=t_ij
+        V_vec[j]-=t_ij
+
+        nexcluded=np.bincount(np.ravel(excluded_pairs),minlength=D)
+        excluded_comp_prev=set(excluded_comp)
+        excluded_comp=np.where(nexcluded>=D-3)[0]
+        excluded_comp_new=set(excluded_comp)-excluded_comp_prev
+
+        if len(excluded_comp_new)>0:
+            if len(excluded_comp) > D-4:
+                warnings.warn('Too many component excluded. Returning clr result.')
+                return run_clr_query(fracs,query)
+            zeroed=set(excluded_comp_prev)
+            for xcomp in excluded_comp_new:
+                partners={b if a==xcomp else a for a,b in excluded_pairs if xcomp in (a,b)}
+                t_x=variation_rows(Lc,s,[xcomp])[0]
+                mask=np.ones(D,dtype=bool)
+                mask[list(zeroed|partners|{xcomp})]=False
+                V_vec[mask]-=t_x[mask]
+                V_vec[xcomp]=0.
+                zeroed.add(xcomp)
+
+        V_base=basis_var_lowrank(V_vec,excluded_pairs,excluded_comp)
+        amax=None
+        if len(excluded_comp)>0:
+            break
+
+    Cov_base=0.5*(V_base[query,None]+V_base[None,:]-variation_rows(Lc,s,query))
+    C_base=Cov_base/np.sqrt(V_base[query,None])/np.sqrt(V_base[None,:])
+
+    if len(excluded_comp)>0:
+        V_base[excluded_comp]=np.nan
+        C_base[:,excluded_comp]=np.nan
+        Cov_base[:,excluded_comp]=np.nan
+        inq=np.isin(query,excluded_comp)
+        C_base[inq,:]=np.nan
+        Cov_base[inq,:]=np.nan
+    else:
+        # sparsity check of basic_corr, it needs the whole matrix
+        if amax is None:
+            _,_,amax=strongest_pair_blocks(Lc,s,V_base,excluded_pairs,block_size)
+        tol = 1e-3
+        if amax > 1 + tol:
+            warnings.warn('Sparcity assumption violated. Returning clr result.')
+            return run_clr_query(fracs,query)
+
+    return C_base,Cov_base,V_base
+
+def run_clr_query(fracs:np.ndarray,query):
+    '''
+    CLR correlations of the query components against all components.
+    Same normalization as run_clr (ddof=1).
+    '''
+    query=np.asarray(query,dtype=np.int64)
+    z=np.log(fracs)
+    z=z-z.mean(axis=1,keepdims=True)
+    z=z-z.mean(axis=0,keepdims=True)
+    n=z.shape[0]
+    var=np.einsum('ij,ij->j',z,z)/(n-1)
+    Cov_base=z[:,query].T@z/(n-1)
+    C_base=Cov_base/np.sqrt(var[query,None])/np.sqrt(var[None,:])
+    return C_base,Cov_base,var
+
+def resolve_query(frame:Union[np.ndarray,pd.DataFrame],query):
+    '''
+    Positions of the query components. Labels are matched against the
+    columns of a DataFrame (also as strings), integers are taken as positions.
+    '''
+    if isinstance(frame,pd.DataFrame):
+        labels=[str(c) for c in frame.columns]
+        if all(str(q) in labels for q in query):
+            return np.array([labels.index(str(q)) for q in query],dtype=np.int64)
+    query=np.asarray(query,dtype=np.int64)
+    if query.min()<0 or query.max()>=frame.shape[1]:
+        raise ValueError('Query components out of range')
+    return query
+
+def main_alg_query(frame,query,method:str='sparcc',
+                   th:float=0.1,
+                   x_iter:int=10,
+                   n_iter:int=20,
+                   norm:str='dirichlet',
+                   block_size:int=512,
+                   verbose:bool=True):
+    '''
+    Query version of main_alg: median correlations of the query components
+    against all components over n_iter estimations.
+
+    Parameters
+    ----------
+    frame : array_like
+        2D array of counts. Columns are components, rows are samples.
+    query : list
+        Labels (DataFrame columns) or positions of the components of interest.
+    method : str, (sparcc|clr), default 'sparcc'
+    th : float,default 0.1
+        Exclusion threshold for SparCC,the valid values are 0.0<th<1.0
+    x_iter : int,default 10
+        Number of exclusion iterations for SparCC.
+    n_iter : int,default 20
+        Number of estimation iteration to average over.
+    norm : str,(dirichlet|normalize),defualt: dirichlet
+        Method used to normalize the counts to fractions.
+    block_size : int, default 512
+        Rows of the variation matrix held in memory at once.
+    verbose : bool, default True
+
+    Returns
+    -------
+    cor_med: array
+        len(query) x D estimated basis correlations.
+    cov_med: array
+        len(query) x D estimated basis covariances.
+    '''
+    assert (th>0 and th<1.0),"The value must be between 0 and 1"
+    method=method.lower()
+    if method not in ['sparcc','clr']:
+        raise ValueError('Unsupported basis correlation method: "%s"' %method)
+
+    query=resolve_query(frame,query)
+    k=frame.shape[1]
+    if k<4:
+        raise ValueError('Can not detect correlations between compositions of <4 components (%d given)' %k )
+
+    cor_array=np.empty((n_iter,len(query),k))
+    var_array=np.empty((n_iter,k))
+    for i in range(n_iter):
+        if verbose: print ('\tRunning iteration '+ str(i))
+        logging.info("Running iteration {}".format(i))
+        with span('iteration', iteration=i):
+            with span('to_fractions'):
+                fracs=to_fractions(frame,method=norm)
+            with span('basic_corr'):
+                if method=='sparcc':
+                    cor_array[i],_,var_array[i]=run_sparcc_query(fracs,query,th=th,x_iter=x_iter,block_size=block_size)
+                else:
+                    cor_array[i],_,var_array[i]=run_clr_query(fracs,query)
+
+    with span('median'), warnings.catch_warnings():
+        warnings.simplefilter('ignore',RuntimeWarning)
+        cor_med=np.nanmedian(cor_array,axis=0)
+        var_med=np.nanmedian(var_array,axis=0)
+
+    with span('cov_med'):
+        cov_med=cor_med*np.sqrt(var_med[query,None])*np.sqrt(var_med[None,:])
+    logging.info("The query process has finished")
+    return cor_med,cov_med
@@ -0,0 +1,268 @@
+'''
+Detection of the CPU and memory quota of the process and thread budget.
+
+Containers limit a process through cgroups (v1 or v2) while os.cpu_count
+and psutil report the host. The quota found here sets the number of
+threads of numba, BLAS and dask, and the threads of each worker of a
+process pool, so nested parallelism stays within the quota.
+
+Only the standard library is imported at module level: the scripts call
+default_thread_env() before they import numpy and numba.
+'''
+import os
+import sys
+import math
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+__all__ = ["cgroup_cpu_limit",
+           "cgroup_memory_limit",
+           "cpu_count",
+           "memory_info",
+           "default_thread_env",
+           "get_thread_budget",
+           "set_thread_budget",
+           "thread_budget",
+           "split_budget",
+           "init_worker",
+           "worker_pool"]
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+PROC_CGROUP = '/proc/self/cgroup'
+# cgroup v1 reports "no limit" as a huge page aligned number
+V1_UNLIMITED = 2**60
+
+THREAD_ENV = ['OMP_NUM_THREADS',
+              'OPENBLAS_NUM_THREADS',
+              'MKL_NUM_THREADS',
+              'BLIS_NUM_THREADS',
+              'VECLIB_MAXIMUM_THREADS',
+              'NUMEXPR_NUM_THREADS']
+
+_BUDGET = None
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (OSError, ValueError):
+        return None
+
+def _v2_dirs(root:str=CGROUP_ROOT, proc_cgroup:str=PROC_CGROUP):
+    '''
+    cgroup v2 directories of the process, from its own group up to the root.
+    A limit set on any ancestor also applies.
+    '''
+    if _read(os.path.join(root,'cgroup.controllers')) is None:
+        return []
+    path = '/'
+    for line in (_read(proc_cgroup) or '').splitlines():
+        if line.startswith('0::'):
+            path = line[3:] or '/'
+    dirs = []
+    parts = [p for p in path.split('/') if p]
+    for k in range(len(parts),-1,-1):
+        d = os.path.join(root,*parts[:k])
+        if os.path.isdir(d):
+            dirs.append(d)
+    return dirs
+
+def cgroup_cpu_limit(root:str=CGROUP_ROOT, proc_cgroup:str=PROC_CGROUP):
+    '''
+    CPU quota of the process in (possibly fractional) CPUs, None if unlimited.
+
+    Reads cpu.max (cgroup v2) and cpu.cfs_quota_us/cpu.cfs_period_us (v1).
+    '''
+    limits = []
+    for d in _v2_dirs(root, proc_cgroup):
+        value = _read(os.path.join(d,'cpu.max'))
+        if value is None:
+            continue
+        quota, _, period = value.partition(' ')
+        if quota != 'max':
+            limits.append(int(quota)/int(period or 100000))
+
+    # The directory name isn't standardized across linux distros, check all
+    for dirname in ["cpuacct,cpu", "cpu,cpuacct", "cpu"]:
+        quota = _read(os.path.join(root,dirname,'cpu.cfs_quota_us'))
+        period = _read(os.path.join(root,dirname,'cpu.cfs_period_us'))
+        if quota is not None and period is not None:
+            if int(quota) > 0:
+                limits.append(int(quota)/int(period))
+            break
+
+    return min(limits) if limits else None
+
+def cgroup_memory_limit(root:str=CGROUP_ROOT, proc_cgroup:str=PROC_CGROUP):
+    '''
+    Memory limit and current usage of the process cgroup in bytes,
+    (None, None) if unlimited.
+
+    Reads memory.max/memory.current (cgroup v2) and
+    memory.limit_in_bytes/memory.usage_in_bytes (v1).
+    '''
+    limit, usage = None, None
+    for d in _v2_dirs(root, proc_cgroup):
+        value = _read(os.path.join(d,'memory.max'))
+        if value is None or value == 'max':
+            continue
+        if limit is None or int(value) < limit:
+            limit = int(value)
+            current = _read(os.path.join(d,'memory.current'))
+            usage = None if current is None else int(current)
+
+    value = _read(os.path.join(root,'memory','memory.limit_in_bytes'))
+    if value is not None and int(value) < V1_UNLIMITED:
+        if limit is None or int(value) < limit:
+            limit = int(value)
+            current = _read(os.path.join(root,'memory','memory.usage_in_bytes'))
+            usage = None if current is None else int(current)
+
+    return limit, usage
+
+def cpu_count():
+    """Get the available CPU count for this system.
+    Takes the minimum value from the following locations:
+    - Total system cpus available on the host.
+    - CPU Affinity (if set)
+    - Cgroups limit, v1 or v2 (if set)
+    """
+    count = os.cpu_count()
+
+    # Check CPU affinity if available
+    if hasattr(os, 'sched_getaffinity'):
+        count = min(count, len(os.sched_getaffinity(0)) or count)
+    elif psutil is not None:
+        try:
+            affinity_count = len(psutil.Process().cpu_affinity())
+            if affinity_count > 0:
+                count = min(count, affinity_count)
+        except Exception:
+            pass
+
+    # Check cgroups if available
+    if sys.platform == "linux":
+        quota = cgroup_cpu_limit()
+        if quota is not None:
+            # We round up on fractional CPUs
+            count = min(count, max(1, math.ceil(quota)))
+
+    return count
+
+def memory_info():
+    '''
+    Total and available memory in bytes, the smaller of the host
+    (psutil) and the cgroup limit. None if neither is known.
+    '''
+    total, available = None, None
+    if psutil is not None:
+        mem = psutil.virtual_memory()
+        total, available = mem.total, mem.available
+    limit, usage = cgroup_memory_limit() if sys.platform == "linux" else (None, None)
+    if limit is not None:
+        free = limit-(usage or 0)
+        total = limit if total is None else min(total, limit)
+        available = free if available is None else min(available, free)
+    if total is None:
+        return None
+    return {'total':total, 'available':max(available, 0)}
+
+def default_thread_env(n:int=None):
+    '''
+    Default the thread count of numba and the BLAS/OpenMP libraries to
+    the CPU quota. Variables already set by the user are kept. Only has
+    effect before those libraries are loaded.
+    '''
+    n = str(n or cpu_count())
+    os.environ.setdefault('NUMBA_NUM_THREADS', n)
+    for name in THREAD_ENV:
+        os.environ.setdefault(name, n)
+
+def get_thread_budget():
+    '''
+    Threads that parallel sections of this process may use.
+    '''
+    return _BUDGET if _BUDGET is not None else cpu_count()
+
+def set_thread_budget(n:int):
+    '''
+    Limit numba, BLAS (through threadpoolctl when installed) and the dask
+    threaded scheduler to n threads, and export the limit to the
+    environment of child processes.
+
+    Returns the previous budget.
+    '''
+    global _BUDGET
+    previous = get_thread_budget()
+    n = max(1, int(n))
+    _BUDGET = n
+    for name in THREAD_ENV:
+        os.environ[name] = str(n)
+
+    import numba
+    numba.set_num_threads(min(n, numba.config.NUMBA_NUM_THREADS))
+    import dask
+    dask.config.set(num_workers=n)
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=n)
+    except ImportError:
+        pass
+    return previous
+
+@contextmanager
+def thread_budget(n:int):
+    '''
+    Context manager version of set_thread_budget, the previous budget is
+    restored at exit.
+
+    Usage:
+        with thread_budget(1):
+            run_sparcc(fracs)
+    '''
+    previous = set_thread_budget(n)
+    try:
+        yield n
+    finally:
+        set_thread_budget(previous)
+
+def split_budget(n_workers:int, total:int=None):
+    '''
+    Threads per worker so that n_workers processes use at most total
+    (the thread budget by default) threads.
+    '''
+    total = total or get_thread_budget()
+    return max(1, total//max(1, n_workers))
+
+def init_worker(threads:int):
+    '''
+    Initializer of pool workers: apply their share of the budget.
+    '''
+    set_thread_budget(threads)
+
+def worker_pool(n_workers:int=None, threads:int=None):
+    '''
+    ProcessPoolExecutor whose workers split the thread budget.
+
+    Parameters
+    ----------
+    n_workers : int, default None
+        Number of processes, the thread budget by default.
+    threads : int, default None
+        Threads of each worker, split_budget(n_workers) by default.
+
+    The workers are spawned, not forked: a fork of a process whose numba
+    or BLAS thread pools are already running can deadlock.
+    '''
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    n_workers = n_workers or get_thread_budget()
+    threads = threads or split_budget(n_workers)
+    return ProcessPoolExecutor(max_workers=n_workers, initializer=init_worker,
+                               initargs=(threads,), mp_context=multiprocessing.get_context('spawn'))
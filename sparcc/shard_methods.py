@@ -0,0 +1,143 @@
+'''
+Sharded pseudo p-values.
+
+The permutations [start, stop) of a shard are generated, estimated and
+compared with the real correlations in one process, and only their
+exceedance counts (one D x D integer matrix) are written to a partial
+file. Permutation i always uses the seed SeedSequence(seed, spawn_key=(i,)),
+the same stream as distributed_pvalues, so the result does not depend on
+how the permutations are split. merge_partials sums the partials into
+the p-values.
+'''
+import hashlib
+import logging
+import warnings
+import numpy as np
+import pandas as pd
+
+from .distributed_methods import permutation_replicate
+from .permutation_methods import get_compare
+
+__all__ = ["permutation_seed",
+           "shard_counts",
+           "save_partial",
+           "load_partial",
+           "merge_partials"]
+
+
+def permutation_seed(seed:int, i:int):
+    '''
+    SeedSequence of permutation i, equal to SeedSequence(seed).spawn(n)[i].
+    '''
+    return np.random.SeedSequence(seed, spawn_key=(i,))
+
+def _digest(cor):
+    return hashlib.sha1(np.ascontiguousarray(cor, dtype=np.float64).tobytes()).hexdigest()
+
+def shard_counts(frame, cor, start:int, stop:int, seed:int=0, test_type:str='two_sided',
+                 method:str='sparcc', th:float=0.1, x_iter:int=10, n_iter:int=20,
+                 norm:str='dirichlet', p_counts:int=1, verbose:bool=True):
+    '''
+    Exceedance counts of the permutations [start, stop).
+
+    Parameters
+    ----------
+    frame : array_like
+        Counts, samples x components.
+    cor : array_like
+        Inferred correlations whose p-values are to be computed.
+    start, stop : int
+        Range of permutations of the shard.
+    seed : int, default 0
+        Seed of the whole permutation stream, the same for every shard.
+    test_type : 'two_sided' (default) | 'one_sided'
+    Other parameters as in main_alg.
+
+    Returns
+    -------
+    n_sig: array
+        Number of permutations with a correlation at least as extreme,
+        with the smallest unsigned integer type that holds stop-start.
+    '''
+    assert 0 <= start < stop, "The shard must contain at least one permutation"
+    get_compare(test_type)
+    counts = frame.values if isinstance(frame, pd.DataFrame) else np.asarray(frame)
+    cor = np.asarray(cor, dtype=np.float64)
+    if norm != 'dirichlet':
+        n_iter = 1
+
+    n_sig = np.zeros(cor.shape, dtype=np.min_scalar_type(stop-start))
+    for i in range(start, stop):
+        if verbose: print ('\tRunning permutation '+ str(i))
+        logging.info("Running permutation {}".format(i))
+        n_sig += permutation_replicate(counts, cor, method, norm, th, x_iter, n_iter,
+                                       p_counts, test_type, permutation_seed(seed, i)).astype(n_sig.dtype)
+    return n_sig
+
+def save_partial(file_name:str, n_sig, start:int, stop:int, seed:int, test_type:str, cor, labels=None,
+                 method:str='sparcc', th:float=0.1, x_iter:int=10, n_iter:int=20, norm:str='dirichlet'):
+    '''
+    Write the counts of a shard with the information needed to merge it
+    (compressed npz). method, th, x_iter, n_iter and norm are those given
+    to shard_counts.
+    '''
+    labels = np.arange(n_sig.shape[0]).astype(str) if labels is None else np.asarray(labels).astype(str)
+    if norm != 'dirichlet':
+        n_iter = 1
+    np.savez_compressed(file_name, n_sig=n_sig, start=start, stop=stop, seed=seed,
+                        test_type=test_type, cor_digest=_digest(cor), labels=labels,
+                        method=method.lower(), th=th, x_iter=x_iter, n_iter=n_iter, norm=norm)
+
+def load_partial(file_name:str):
+    '''
+    Read a partial written by save_partial as a dict.
+    '''
+    with np.load(file_name) as f:
+        partial = {k:f[k] for k in f.files}
+    for k in ['start','stop','seed','x_iter','n_iter']:
+        partial[k] = int(partial[k])
+    for k in ['test_type','cor_digest','method','norm']:
+        partial[k] = str(partial[k])
+    partial['th'] = float(partial['th'])
+    return partial
+
+def merge_partials(file_names):
+    '''
+    Sum the counts of the shards into pseudo p-values.
+
+    Raises ValueError if the partials come from different correlations,
+    seeds, test types or estimation parameters, or if their permutation
+    ranges overlap. Missing
+    ranges only give a warning, the p-values use the permutations found.
+
+    Returns
+    -------
+    p_vals: DataFrame
+        Computed pseudo p-values, labelled as the correlations.
+    nperm: int
+        Number of permutations merged.
+    '''
+    partials = sorted([load_partial(f) for f in file_names], key=lambda p:p['start'])
+    if len(partials) == 0:
+        raise ValueError('No partial files to merge')
+    first = partials[0]
+    n_sig = np.zeros(first['n_sig'].shape, dtype=np.int64)
+    end = first['start']
+    for p in partials:
+        for k in ['seed','test_type','cor_digest','method','norm','n_iter','th','x_iter']:
+            if p[k] != first[k]:
+                raise ValueError('The partials have different %s' %k)
+        if p['n_sig'].shape != n_sig.shape:
+            raise ValueError('The partials have different shapes')
+        if p['start'] < end:
+            raise ValueError('Overlapping permutations [%d, %d)' %(p['start'],end))
+        if p['start'] > end:
+            warnings.warn('Permutations [%d, %d) are missing' %(end,p['start']))
+        n_sig += p['n_sig']
+        end = p['stop']
+
+    nperm = sum(p['stop']-p['start'] for p in partials)
+    p_vals = 1.*n_sig/nperm
+    p_vals[np.diag_indices_from(p_vals)] = 1
+    labels = first['labels']
+    return pd.DataFrame(p_vals, index=labels, columns=labels), nperm
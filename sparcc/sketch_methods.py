@@ -0,0 +1,235 @@
+'''
+Streaming quantile sketches of the estimates of the iterations.
+
+main_alg reduces the n_iter estimates of every pair to their median. A
+QuantileSketch follows the iterations as they finish and keeps, for
+every element, the P2 markers of each requested quantile (Jain and
+Chlamtac, 1985) and the running mean and variance (Welford), so the
+intervals and the dispersion of the estimates are obtained with memory
+independent of n_iter, without saving or re-reading the estimates.
+
+P2 keeps five markers per quantile, an approximation whose error
+shrinks with the number of observations but is large for a few tens of
+them. The `tail` smallest (largest for p>0.5) observations are also
+kept, so the quantile is exact (as np.quantile) as long as it falls
+inside them, e.g. the 2.5% and 97.5% quantiles up to 281 iterations with
+tail=8, and P2 is only used beyond.
+'''
+import warnings
+import numpy as np
+
+__all__ = ["P2Quantile",
+           "QuantileSketch",
+           "CorrelationSketch"]
+
+
+class P2Quantile(object):
+    '''
+    Vectorized P2 estimate of the p-quantile of every element of a
+    stream of arrays. NaN observations are skipped per element.
+
+    Parameters
+    ----------
+    p : float
+        Quantile, 0<p<1.
+    size : int
+        Number of elements.
+    tail : int, default 8
+        Extreme observations kept for the exact quantiles.
+    dtype : numpy dtype, default float64
+        dtype of the kept observations and of the markers.
+    '''
+    def __init__(self, p:float, size:int, tail:int=8, dtype=np.float64):
+        assert (p>0 and p<1.0),"The quantile must be between 0 and 1"
+        self.p = p
+        # the tail smallest of sign*x, sorted
+        self._sign = 1. if p <= 0.5 else -1.
+        self.low = np.full((tail, size), np.inf, dtype=dtype)
+        self.q = np.zeros((5, size), dtype=dtype)           # marker heights
+        self.n = np.tile(np.arange(1., 6., dtype=np.float32)[:,None], (1, size))  # marker positions
+        self.count = np.zeros(size, dtype=np.int32)
+        self.f = np.array([0., p/2, p, (1+p)/2, 1.])       # increments of the desired positions
+
+    def update(self, x:np.ndarray):
+        x = np.ravel(x)
+        valid = ~np.isnan(x)
+        v = np.flatnonzero(valid)
+        if len(self.low):
+            low = self.low[:, v]
+            low[-1] = np.minimum(low[-1], self._sign*x[v])
+            self.low[:, v] = np.sort(low, axis=0)
+
+        # the first five observations are kept sorted
+        init = np.flatnonzero(valid & (self.count < 5))
+        m = np.flatnonzero(valid & (self.count >= 5))
+        if init.size:
+            self.q[self.count[init], init] = x[init]
+            self.count[init] += 1
+            full = init[self.count[init] == 5]
+            self.q[:, full] = np.sort(self.q[:, full], axis=0)
+        if m.size == 0:
+            return
+
+        q, n, xm = self.q[:, m].astype(np.float64), self.n[:, m].astype(np.float64), x[m]
+        k = np.where(xm < q[0], 0, np.where(xm >= q[4], 3,
+                     (xm >= q[1]).astype(np.int64)+(xm >= q[2])+(xm >= q[3])))
+        q[0] = np.minimum(q[0], xm)
+        q[4] = np.maximum(q[4], xm)
+        n[1:] += np.arange(1, 5)[:,None] > k[None,:]
+        self.count[m] += 1
+        desired = 1.+(self.count[m]-1)[None,:]*self.f[:,None]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in (1, 2, 3):
+                d = desired[i]-n[i]
+                up = (d >= 1) & (n[i+1]-n[i] > 1)
+                down = (d <= -1) & (n[i-1]-n[i] < -1)
+                move = up | down
+                if not move.any():
+                    continue
+                s = np.where(up, 1., -1.)
+                parabolic = q[i]+s/(n[i+1]-n[i-1])*((n[i]-n[i-1]+s)*(q[i+1]-q[i])/(n[i+1]-n[i])
+                                                   +(n[i+1]-n[i]-s)*(q[i]-q[i-1])/(n[i]-n[i-1]))
+                linear = q[i]+s*np.where(up, (q[i+1]-q[i])/(n[i+1]-n[i]), (q[i-1]-q[i])/(n[i-1]-n[i]))
+                new = np.where((q[i-1] < parabolic) & (parabolic < q[i+1]), parabolic, linear)
+                q[i] = np.where(move, new, q[i])
+                n[i] = np.where(move, n[i]+s, n[i])
+        self.q[:, m] = q
+        self.n[:, m] = n
+
+    def value(self):
+        '''
+        Current estimates, NaN without observations. Exact while the
+        quantile is one of the kept tail observations.
+
+        Otherwise the estimate is the marker polygon at the desired position
+        1+(count-1)*p, the middle marker once it has reached it. With
+        few observations the middle marker can not reach the extreme
+        positions, while the outer markers hold (nearly) exact order
+        statistics.
+        '''
+        h = 1.+(self.count-1)*self.p
+        n = self.n.astype(np.float64)
+        j = np.clip((n <= h[None,:]).sum(axis=0), 1, 4)
+        cols = np.arange(len(h))
+        n0, n1, q0, q1 = n[j-1, cols], n[j, cols], self.q[j-1, cols], self.q[j, cols]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = np.where(np.abs(n[2]-h) < 1, self.q[2], q0+(h-n0)*(q1-q0)/(n1-n0)).astype(np.float64)
+        few = np.flatnonzero(self.count < 5)
+        if few.size:
+            kept = np.where(np.arange(5)[:,None] < self.count[few][None,:], self.q[:, few], np.nan)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                out[few] = np.nanquantile(kept, self.p, axis=0)
+
+        # exact from the tail, np.quantile (linear) of the order statistics
+        pt = self.p if self._sign > 0 else 1.-self.p
+        h = np.maximum(self.count-1, 0)*pt
+        i0 = np.floor(h).astype(np.int64)
+        i1 = np.minimum(i0+1, np.maximum(self.count-1, 0))
+        exact = np.flatnonzero((i1 < len(self.low)) & (self.count > 0))
+        if exact.size:
+            a, b = self.low[i0[exact], exact].astype(np.float64), self.low[i1[exact], exact]
+            out[exact] = self._sign*(a+(h[exact]-i0[exact])*(b-a))
+        out[self.count == 0] = np.nan
+        return out
+
+
+class QuantileSketch(object):
+    '''
+    Streaming quantiles and dispersion of arrays of the same shape.
+
+    Parameters
+    ----------
+    shape : tuple
+        Shape of the arrays, e.g. (D, D) for the correlations.
+    quantiles : tuple, default (0.025, 0.975)
+        Quantiles to follow, a 95% interval by default.
+    tail : int, default 8
+        Extreme observations kept per quantile, see P2Quantile.
+    dtype : numpy dtype, default float64
+        dtype of the state of the quantiles.
+
+    Examples
+    --------
+    >>> sketch = QuantileSketch((D, D))
+    >>> cor_med, cov_med = main_alg(counts, sketch=sketch)
+    >>> summary = sketch.result()   # q0.025, q0.975, mean, sd and n
+    '''
+    def __init__(self, shape, quantiles=(0.025, 0.975), tail:int=8, dtype=np.float64):
+        self.shape = tuple(np.atleast_1d(shape))
+        size = int(np.prod(self.shape))
+        self.quantiles = tuple(quantiles)
+        self._p2 = [P2Quantile(p, size, tail, dtype) for p in self.quantiles]
+        self._count = np.zeros(size, dtype=np.int32)
+        self._mean = np.zeros(size)
+        self._m2 = np.zeros(size)
+
+    def update(self, x:np.ndarray):
+        '''
+        Add the estimate of one iteration.
+        '''
+        x = np.asarray(x, dtype=np.float64)
+        if x.shape != self.shape:
+            raise ValueError('Expected an array of shape %s, got %s' %(self.shape, x.shape))
+        x = x.ravel()
+        for p2 in self._p2:
+            p2.update(x)
+        valid = ~np.isnan(x)
+        self._count += valid
+        delta = np.where(valid, x-self._mean, 0.)
+        self._mean += delta/np.maximum(self._count, 1)
+        self._m2 += delta*np.where(valid, x-self._mean, 0.)
+
+    def result(self):
+        '''
+        Returns
+        -------
+        summary: dict
+            'q<p>' for every quantile, 'mean', 'sd' (ddof=1) and 'n',
+            the number of non NaN estimates, as arrays of the shape.
+        '''
+        out = {'q%g' %p:p2.value().reshape(self.shape) for p, p2 in zip(self.quantiles, self._p2)}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sd = np.sqrt(self._m2/(self._count-1))
+        out['mean'] = np.where(self._count > 0, self._mean, np.nan).reshape(self.shape)
+        out['sd'] = np.where(self._count > 1, sd, np.nan).reshape(self.shape)
+        out['n'] = self._count.reshape(self.shape).copy()
+        return out
+
+
+class CorrelationSketch(QuantileSketch):
+    '''
+    QuantileSketch of symmetric D x D matrices with unit diagonal (the
+    correlations), which only follows the upper triangle, in float32.
+    About 90 bytes per element of the D x D matrix with the defaults.
+
+    Parameters
+    ----------
+    D : int
+        Number of components.
+    quantiles, tail :
+        As in QuantileSketch.
+    '''
+    def __init__(self, D:int, quantiles=(0.025, 0.975), tail:int=8, dtype=np.float32):
+        self.D = D
+        self._triu = np.triu_indices(D, 1)
+        super(CorrelationSketch, self).__init__((len(self._triu[0]),), quantiles, tail, dtype)
+
+    def update(self, x:np.ndarray):
+        super(CorrelationSketch, self).update(np.asarray(x)[self._triu])
+
+    def result(self):
+        '''
+        As QuantileSketch.result, as symmetric D x D matrices (1 on the
+        diagonal, 0 for sd and n).
+        '''
+        out = {}
+        for name, values in super(CorrelationSketch, self).result().items():
+            full = np.zeros((self.D, self.D), dtype=values.dtype)
+            full[self._triu] = values
+            full += full.T
+            if name not in ['sd', 'n']:
+                np.fill_diagonal(full, 1.)
+            out[name] = full
+        return out
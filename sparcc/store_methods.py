@@ -0,0 +1,156 @@
+'''
+Result store of memory-mappable arrays.
+
+A store is a folder with one .npy file per result (cor, cov, variances,
+p_vals, ...) and a meta.json file with the labels of the components and
+the shape and dtype of every array. Every array has one row per
+component, in the order of the labels. The arrays are opened with
+np.load(mmap_mode='r'), so reading a row, a submatrix or the top
+partners of a component only reads those rows from disk, not the whole
+D x D matrix.
+'''
+import json
+import numpy as np
+import pandas as pd
+
+from pathlib import Path
+from typing import Union
+
+__all__ = ["write_store",
+           "ResultStore"]
+
+META_FILE = 'meta.json'
+
+
+def _read_meta(path:Path):
+    with open(path/META_FILE) as f:
+        return json.load(f)
+
+def write_store(path:Union[str,Path], labels, **arrays):
+    '''
+    Write arrays to a result store, created if needed.
+
+    Parameters
+    ----------
+    path : str
+        Folder of the store.
+    labels : list
+        Labels of the components. They must be those of the store when
+        adding arrays to an existing one.
+    arrays :
+        name=array, with one row per component (D x D matrices such as
+        cor, cov and p_vals, or vectors such as variances). DataFrames
+        are stored by their values. None values are skipped.
+    '''
+    path = Path(path)
+    labels = [str(l) for l in labels]
+    if (path/META_FILE).exists():
+        meta = _read_meta(path)
+        if meta['labels'] != labels:
+            raise ValueError('The labels do not match those of the store "%s"' %path)
+    else:
+        path.mkdir(parents=True, exist_ok=True)
+        meta = {'labels':labels, 'arrays':{}}
+
+    for name, array in arrays.items():
+        if array is None:
+            continue
+        array = np.asarray(array)
+        if array.shape[0] != len(labels):
+            raise ValueError('"%s" has %d rows for %d labels' %(name, array.shape[0], len(labels)))
+        np.save(path/(name+'.npy'), array)
+        meta['arrays'][name] = {'shape':list(array.shape), 'dtype':str(array.dtype)}
+
+    with open(path/META_FILE, 'w') as f:
+        json.dump(meta, f)
+
+
+class ResultStore(object):
+    '''
+    Lazy reader of a result store.
+
+    Parameters
+    ----------
+    path : str
+        Folder written by write_store.
+
+    Examples
+    --------
+    >>> store = ResultStore('results/')
+    >>> store.row('OTU_12')
+    >>> store.submatrix(['OTU_1','OTU_2'], name='p_vals')
+    >>> store.top_k('OTU_12', k=10)
+    '''
+    def __init__(self, path:Union[str,Path]):
+        self.path = Path(path)
+        meta = _read_meta(self.path)
+        self.labels = pd.Index(meta['labels'])
+        self.shapes = {name:tuple(a['shape']) for name, a in meta['arrays'].items()}
+        self._position = {l:i for i, l in enumerate(meta['labels'])}
+        self._arrays = {}
+
+    @property
+    def names(self):
+        return list(self.shapes)
+
+    def array(self, name:str='cor'):
+        '''
+        Memory mapped array (read only).
+        '''
+        if name not in self.shapes:
+            raise KeyError('"%s" is not in the store, it has %s' %(name, self.names))
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.path/(name+'.npy'), mmap_mode='r')
+        return self._arrays[name]
+
+    def index(self, otus):
+        '''
+        Positions of the given labels.
+        '''
+        try:
+            return np.array([self._position[str(o)] for o in otus], dtype=np.int64)
+        except KeyError as e:
+            raise KeyError('Unknown component %s' %e)
+
+    def row(self, otu, name:str='cor'):
+        '''
+        Row of a component, a Series indexed by the labels for D x D
+        arrays, its value for vectors.
+        '''
+        i = self.index([otu])[0]
+        values = np.array(self.array(name)[i])
+        if values.ndim == 0:
+            return values.item()
+        index = self.labels if len(values) == len(self.labels) else None
+        return pd.Series(values, index=index, name=self.labels[i])
+
+    def submatrix(self, rows, cols=None, name:str='cor'):
+        '''
+        rows x cols block of a D x D array, all the columns by default.
+        '''
+        r = self.index(rows)
+        c = np.arange(len(self.labels)) if cols is None else self.index(cols)
+        order = np.argsort(r, kind='stable')
+        block = np.empty((len(r), len(c)), dtype=self.array(name).dtype)
+        # sorted rows read the file sequentially
+        block[order] = self.array(name)[r[order]][:, c]
+        return pd.DataFrame(block, index=self.labels[r], columns=self.labels[c])
+
+    def top_k(self, otu, k:int=10, name:str='cor', absolute:bool=True):
+        '''
+        The k strongest partners of a component, NaN and itself excluded.
+
+        Returns
+        -------
+        partners: DataFrame
+            partner and value, strongest first.
+        '''
+        i = self.index([otu])[0]
+        values = np.array(self.array(name)[i], dtype=np.float64)
+        score = np.abs(values) if absolute else values.copy()
+        score[i] = -np.inf
+        score[np.isnan(score)] = -np.inf
+        k = min(k, int(np.isfinite(score).sum()))
+        top = np.argpartition(-score, k-1)[:k] if k > 0 else np.array([], dtype=np.int64)
+        top = top[np.argsort(-score[top], kind='stable')]
+        return pd.DataFrame({'partner':self.labels[top], 'value':values[top]})
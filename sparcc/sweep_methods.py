@@ -0,0 +1,155 @@
+'''
+Parameter sweeps of SparCC over a grid of th / x_iter values.
+
+The fractions and the variation matrix are computed once per iteration,
+and since the exclusion sequence is the same for every grid point (th and
+x_iter only decide where it stops), a single refinement path run with the
+smallest th and the largest x_iter serves the whole grid.
+'''
+import os
+import logging
+import tempfile
+import warnings
+import h5py
+import numpy as np
+import pandas as pd
+import dask.array as da
+
+from itertools import product
+from typing import List
+
+from .core_methods import to_fractions
+from .compositional_methods import run_clr,variation_mat_tiled
+from .SparCC import sparcc_path
+
+
+def make_grid(th_list:List[float],x_iter_list:List[int]):
+    '''
+    Labelled grid with every combination of th and x_iter.
+    '''
+    for th in th_list:
+        assert (th>0 and th<1.0),"The value must be between 0 and 1"
+    grid=pd.DataFrame(list(product(th_list,x_iter_list)),columns=['th','x_iter'])
+    return grid
+
+def sweep_path(Var_mat,grid:pd.DataFrame):
+    '''
+    Resolve every (th,x_iter) point of grid from a single exclusion path.
+
+    Returns
+    -------
+    states: list
+        For each grid point (n_excluded,C_base,Cov_base), or None when the
+        path gave up (too many components excluded) before reaching it.
+    '''
+    ths=grid['th'].values
+    xs=grid['x_iter'].values
+    states=[None]*len(grid)
+
+    k=0
+    for C_base,Cov_base,cmax in sparcc_path(Var_mat,th=ths.min(),x_iter=int(xs.max())):
+        if C_base is None:
+            break
+        done=[g for g in range(len(grid)) if states[g] is None and
+              (xs[g]==k or cmax is None or not cmax > ths[g])]
+        if len(done)>0:
+            state=(k,C_base.copy(),Cov_base.copy())
+            for g in done:
+                states[g]=state
+        k+=1
+    return states
+
+def sweep_corr(frame,grid:pd.DataFrame,method:str='sparcc',
+               n_iter:int=20,
+               norm:str='dirichlet',
+               path_tmp:str=None,
+               verbose:bool=True):
+    '''
+    Estimate the basis correlations for every point of a th / x_iter grid.
+
+    Parameters
+    ----------
+    frame : array_like
+        2D array of counts. Columns are components, rows are samples.
+    grid : DataFrame
+        Columns th and x_iter, see make_grid.
+    method : str, (sparcc|clr), default 'sparcc'
+        With clr every grid point gets the same result.
+    n_iter : int,default 20
+        Number of estimation iteration to average over.
+    norm : str,(dirichlet|normalize),defualt: dirichlet
+        Method used to normalize the counts to fractions.
+    path_tmp : str, default None
+        Folder for the temporary hdf5 file with the estimates of every
+        iteration. The system temporary folder by default.
+    verbose : bool, default True
+
+    Returns
+    -------
+    grid: DataFrame
+        The grid with the median number of excluded pairs and the fraction
+        of iterations that fell back to clr for each point.
+    cor_stack: array
+        Estimated basis correlations, shape (len(grid),D,D).
+    cov_stack: array
+        Estimated basis covariances, shape (len(grid),D,D).
+    '''
+    method=method.lower()
+    if method not in ['sparcc','clr']:
+        raise ValueError('Unsupported basis correlation method: "%s"' %method)
+    k=frame.shape[1]
+    if k<4:
+        raise ValueError('Can not detect correlations between compositions of <4 components (%d given)' %k )
+
+    G=len(grid)
+    n_excluded=np.zeros((G,n_iter))
+    n_clr=np.zeros(G)
+    tol = 1e-3 # tolerance for correlation range
+
+    with tempfile.TemporaryDirectory(dir=path_tmp) as tmp:
+        h5f=h5py.File(os.path.join(tmp,'sweep.hdf5'),'w')
+        cor_set=h5f.create_dataset('cor',shape=(G,n_iter,k,k),chunks=(1,1,k,k),dtype='f8')
+        var_set=h5f.create_dataset('var',shape=(G,n_iter,k),dtype='f8')
+
+        for i in range(n_iter):
+            if verbose: print ('\tRunning iteration '+ str(i))
+            logging.info("Running iteration {}".format(i))
+            fracs=to_fractions(frame,method=norm)
+            clr_res=None
+
+            if method=='sparcc':
+                states=sweep_path(variation_mat_tiled(fracs),grid)
+            else:
+                states=[None]*G
+
+            for g,state in enumerate(states):
+                if state is not None and not np.max(np.abs(state[1])) > 1 + tol:
+                    n_excluded[g,i],C_base,Cov_base=state
+                else:
+                    if method=='sparcc' and state is None:
+                        warnings.warn('Too many component excluded. Returning clr result.')
+                    elif method=='sparcc':
+                        warnings.warn('Sparcity assumption violated. Returning clr result.')
+                    if clr_res is None:
+                        clr_res=run_clr(fracs)
+                    C_base,Cov_base=clr_res
+                    n_clr[g]+=1
+                cor_set[g,i]=C_base
+                var_set[g,i]=np.diag(Cov_base)
+
+        logging.info("Computing the medians of the sweep")
+        cor_stack=np.empty((G,k,k))
+        cov_stack=np.empty((G,k,k))
+        cor_array=da.from_array(cor_set,chunks=(1,n_iter,min(k,256),k))
+        for g in range(G):
+            var_med=np.nanmedian(var_set[g],axis=0)
+            cor_med=da.nanmedian(cor_array[g],axis=0).compute()
+            sd=np.sqrt(var_med)
+            cor_stack[g]=cor_med
+            cov_stack[g]=cor_med*sd[:,None]*sd[None,:]
+        h5f.close()
+
+    grid=grid.copy()
+    grid['n_excluded']=np.median(n_excluded,axis=1)
+    grid['clr_fraction']=n_clr/n_iter
+    return grid,cor_stack,cov_stack
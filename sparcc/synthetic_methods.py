@@ -0,0 +1,126 @@
+'''
+Seeded generator of synthetic compositional count data.
+
+Counts are drawn from a multinomial log-normal model, like the fake
+dataset in example/: the log abundances of the basis are normal, with
+a sparse correlation structure, they are closed into fractions and the
+counts of each sample are a multinomial draw of those fractions.
+'''
+import numpy as np
+import pandas as pd
+
+
+def make_edges(D:int,density:float=0.01,strength:float=1.,seed=None):
+    '''
+    Random sparse set of correlated pairs.
+
+    Parameters
+    ----------
+    D : int
+        Number of components.
+    density : float, default 0.01
+        Fraction of the D*(D-1)/2 pairs that are correlated.
+    strength : float, default 1.0
+        Loading of the shared factor of each pair, larger values give
+        stronger correlations.
+
+    Returns
+    -------
+    edges: DataFrame
+        Columns i, j (i<j), sign and loading.
+    '''
+    rng=np.random.default_rng(seed)
+    n_pairs=D*(D-1)//2
+    E=int(round(density*n_pairs))
+    flat=rng.choice(n_pairs,size=E,replace=False) if E>0 else np.array([],dtype=np.int64)
+    # flat index of the upper triangle to (i,j)
+    i=(D-2-np.floor(np.sqrt(-8*flat+4*D*(D-1)-7)/2.-0.5)).astype(np.int64)
+    j=(flat+i+1-D*(D-1)//2+(D-i)*((D-i)-1)//2).astype(np.int64)
+    sign=rng.choice([-1.,1.],size=E)
+    return pd.DataFrame({'i':i,'j':j,'sign':sign,'loading':np.full(E,strength)})
+
+def true_correlation(edges:pd.DataFrame,D:int,dense:bool=True):
+    '''
+    Basis correlations implied by the edges: each pair shares a standard
+    normal factor with loadings a and sign*a on top of unit noise.
+
+    Returns the dense D x D matrix or, with dense=False, the edges with
+    a column 'cor'.
+    '''
+    a2=edges['loading'].values**2
+    load=np.ones(D)
+    np.add.at(load,edges['i'].values,a2)
+    np.add.at(load,edges['j'].values,a2)
+    cor=edges['sign'].values*a2/np.sqrt(load[edges['i'].values]*load[edges['j'].values])
+    if not dense:
+        return edges.assign(cor=cor)
+    C=np.eye(D)
+    C[edges['i'].values,edges['j'].values]=cor
+    C[edges['j'].values,edges['i'].values]=cor
+    return C
+
+def make_counts(n_samples:int=200,D:int=50,density:float=0.01,
+                strength:float=1.,
+                log_sd:float=1.,
+                depth:int=10000,
+                sparsity:float=0.,
+                dominant:bool=True,
+                seed=None):
+    '''
+    Synthetic multinomial log-normal counts.
+
+    Parameters
+    ----------
+    n_samples : int, default 200
+    D : int, default 50
+        Number of components (OTUs).
+    density : float, default 0.01
+        Fraction of correlated pairs, see make_edges.
+    strength : float, default 1.0
+        Strength of the correlations, see make_edges.
+    log_sd : float, default 1.0
+        Spread of the mean log abundances, larger values give more rare
+        components and more zeros.
+    depth : int, default 10000
+        Mean number of reads per sample.
+    sparsity : float, default 0.0
+        Extra fraction of counts set to zero (dropout).
+    dominant : bool, default True
+        Make the first component dominant, as otu 0 in the fake dataset.
+
+    Returns
+    -------
+    counts: array
+        n_samples x D integer counts.
+    edges: DataFrame
+        The correlated pairs, see true_correlation.
+    '''
+    rng=np.random.default_rng(seed)
+    edges=make_edges(D,density,strength,seed=rng)
+
+    mu=rng.normal(0.,log_sd,size=D)
+    if dominant:
+        mu[0]=mu.max()+np.log(D)
+    X=rng.standard_normal((n_samples,D))
+    for e0 in range(0,len(edges),65536): # shared factors in chunks of pairs
+        chunk=edges.iloc[e0:e0+65536]
+        F=rng.standard_normal((n_samples,len(chunk)))*chunk['loading'].values
+        np.add.at(X.T,chunk['i'].values,F.T)
+        np.add.at(X.T,chunk['j'].values,(F*chunk['sign'].values).T)
+    X+=mu
+
+    X-=X.max(axis=1,keepdims=True)
+    fracs=np.exp(X)
+    fracs/=fracs.sum(axis=1,keepdims=True)
+
+    reads=rng.poisson(depth,size=n_samples)
+    counts=rng.multinomial(reads,fracs)
+    if sparsity>0:
+        counts[rng.random(counts.shape)<sparsity]=0
+    return counts,edges
+
+def make_frame(counts:np.ndarray):
+    '''
+    DataFrame with the layout returned by read_txt (samples x OTUs).
+    '''
+    return pd.DataFrame(counts,columns=[str(c) for c in range(counts.shape[1])])
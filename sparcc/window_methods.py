@@ -0,0 +1,166 @@
+'''
+Sliding-window SparCC for sample-ordered (time-series) count tables.
+
+The statistics of the log fractions are updated by removing the samples
+that leave the window and adding the ones that enter it, so the update
+of each step costs O(shift*D^2) instead of O(window*D^2).
+'''
+import csv
+import logging
+import h5py
+import numpy as np
+import pandas as pd
+
+from typing import Union
+
+from .core_methods import to_fractions
+from .incremental_methods import LogRatioStats,stats_corr,median_corr
+
+
+def iter_windows(frame:Union[np.ndarray,pd.DataFrame],window:int,step:int=1,
+                 method:str='sparcc',
+                 norm:str='pseudo',
+                 n_iter:int=20,
+                 th:float=0.1,
+                 x_iter:int=10,
+                 p_counts:int=1,
+                 refresh:int=100):
+    '''
+    Generator over the windows of a sample-ordered count table.
+
+    The log fractions of the samples inside the window are kept in a ring
+    buffer so they can be removed exactly (with 'dirichlet' each of the
+    n_iter estimations keeps its own draws).
+
+    Parameters
+    ----------
+    frame : array_like
+        2D array of counts. Columns are components, rows are samples in order.
+    window : int
+        Number of samples per window.
+    step : int, default 1
+        Shift between consecutive windows.
+    refresh : int, default 100
+        The statistics are recomputed from the buffer every refresh steps,
+        to stop the rounding errors of the downdates from accumulating.
+
+    Yields
+    ------
+    start: int
+        First sample of the window.
+    C_base: array
+        Estimated basis correlation matrix of the window.
+    Cov_base: array
+        Estimated basis covariance matrix of the window.
+    '''
+    if isinstance(frame,pd.DataFrame):
+        frame=frame.values
+    counts=np.asarray(frame,dtype=np.float64)
+    n,D=counts.shape
+    if window<2 or window>n:
+        raise ValueError('The window must have between 2 and %d samples' %n)
+    if step<1:
+        raise ValueError('The step must be positive')
+
+    chains=n_iter if norm=='dirichlet' else 1
+    ring=np.empty((chains,window,D))
+    stats=[LogRatioStats(D) for _ in range(chains)]
+
+    def enter(a,b):
+        for c in range(chains):
+            logf=np.log(to_fractions(counts[a:b],method=norm,p_counts=p_counts))
+            ring[c,np.arange(a,b)%window]=logf
+            stats[c].add(logf)
+
+    def leave(a,b):
+        for c in range(chains):
+            stats[c].remove(ring[c,np.arange(a,b)%window])
+
+    def rebuild():
+        for c in range(chains):
+            stats[c]=LogRatioStats(D).add(ring[c])
+
+    enter(0,window)
+    for w,start in enumerate(range(0,n-window+1,step)):
+        if start>0:
+            prev=start-step
+            if step>=window:
+                for c in range(chains):
+                    stats[c]=LogRatioStats(D)
+                enter(start,start+window)
+            else:
+                leave(prev,start)
+                enter(prev+window,start+window)
+                if w%refresh==0:
+                    rebuild()
+
+        cor_list,var_list=[],[]
+        for s in stats:
+            C_base,Cov_base=stats_corr(s,method=method,th=th,x_iter=x_iter)
+            cor_list.append(C_base)
+            var_list.append(np.diag(Cov_base))
+        C_base,Cov_base=median_corr(cor_list,var_list)
+        yield start,C_base,Cov_base
+
+def sliding_window_corr(frame:Union[np.ndarray,pd.DataFrame],window:int,step:int=1,
+                        out_stack:str=None,
+                        out_edges:str=None,
+                        edge_th:float=0.3,
+                        verbose:bool=True,
+                        **kwargs):
+    '''
+    Run iter_windows and write the correlations of each window.
+
+    Parameters
+    ----------
+    out_stack : str, default None
+        hdf5 file with the dataset 'cor' of shape (n_windows,D,D), chunked
+        by window, and the dataset 'start' with the first sample of each window.
+    out_edges : str, default None
+        csv file with a row (start,otu_i,otu_j,cor) for each pair of each
+        window with |cor| >= edge_th.
+    edge_th : float, default 0.3
+    kwargs :
+        Passed to iter_windows.
+
+    Returns
+    -------
+    starts: list
+        First sample of every window.
+    '''
+    labels=list(frame.columns) if isinstance(frame,pd.DataFrame) else list(range(frame.shape[1]))
+    n,D=frame.shape
+    n_windows=len(range(0,n-window+1,step))
+
+    h5f=edges=writer=None
+    if out_stack is not None:
+        h5f=h5py.File(out_stack,'w')
+        cor_set=h5f.create_dataset('cor',shape=(n_windows,D,D),chunks=(1,D,D),dtype='f8')
+        start_set=h5f.create_dataset('start',shape=(n_windows,),dtype='i8')
+        h5f.attrs['labels']=[str(l) for l in labels]
+        h5f.attrs['window']=window
+    if out_edges is not None:
+        edges=open(out_edges,'w',newline='')
+        writer=csv.writer(edges)
+        writer.writerow(['start','otu_i','otu_j','cor'])
+    iu=np.triu_indices(D,1)
+
+    starts=[]
+    try:
+        for w,(start,C_base,_) in enumerate(iter_windows(frame,window,step,**kwargs)):
+            if verbose: print ('\tWindow starting at sample '+ str(start))
+            logging.info("Window starting at sample {}".format(start))
+            if h5f is not None:
+                cor_set[w]=C_base
+                start_set[w]=start
+            if writer is not None:
+                c=C_base[iu]
+                keep=np.where(np.abs(c)>=edge_th)[0]
+                writer.writerows((start,labels[iu[0][p]],labels[iu[1][p]],c[p]) for p in keep)
+            starts.append(start)
+    finally:
+        if h5f is not None:
+            h5f.close()
+        if edges is not None:
+            edges.close()
+    return starts
@@ -3,7 +3,9 @@ import numpy as np
 
 from SparCC.sparcc.SparCC import Mesh,new_excluded_pair
 from SparCC.sparcc.SparCC import basic_corr,basis_var
-from SparCC.sparcc.SparCC import C_from_V,run_sparcc
+from SparCC.sparcc.SparCC import C_from_V,cov_from_cor,run_sparcc
+from SparCC.sparcc.SparCC import Workspace,sparcc_path,strongest_pair,strongest_pair_inplace
+from SparCC.sparcc.compositional_methods import variation_mat
 
 
 #Constant
@@ -95,6 +97,18 @@ def test_C_from_V():
 
     assert np.all(A==M3)
 
+def test_C_from_V_fused():
+    rs=np.random.RandomState(3)
+    for D in [7,8]:
+        X=rs.rand(D,D)
+        T=X+X.T
+        np.fill_diagonal(T,0)
+        v=rs.rand(D)+1
+        C,Cov=C_from_V(T,v)
+        Vi,Vj=Mesh(v)
+        assert np.allclose(Cov,0.5*(Vi+Vj-T)) and np.allclose(C,Cov/np.sqrt(Vi)/np.sqrt(Vj))
+        assert np.allclose(cov_from_cor(C,v),Cov)
+
 def test_run_sparcc():
     V=np.ones((7,7))
     A,B=run_sparcc(V)
@@ -112,3 +126,23 @@ def test_basic_corr():
 
 
 
+
+def test_sparcc_path_workspace():
+    rng=np.random.default_rng(0)
+    f=rng.dirichlet(np.ones(20),size=30)
+    Var_mat=variation_mat(f)
+    ws=Workspace(20,x_iter=10)
+    for C,Cov,cmax in sparcc_path(Var_mat,workspace=ws):
+        assert C is ws.C and Cov is ws.Cov
+    C1=C.copy()
+    C2=[C for C,_,_ in sparcc_path(Var_mat,workspace=ws)][-1]
+    assert np.array_equal(C1,C2)
+
+def test_strongest_pair_inplace():
+    rng=np.random.default_rng(1)
+    ws=Workspace(12,x_iter=2)
+    ws.C[:]=rng.uniform(-1,1,(12,12))
+    a,c=strongest_pair(ws.C)
+    assert strongest_pair_inplace(ws,0)==(a,c)
+    ws.excluded[0]=a
+    assert strongest_pair_inplace(ws,1)==strongest_pair(ws.C,[a])
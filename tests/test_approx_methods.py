@@ -0,0 +1,32 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import run_sparcc
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.synthetic_methods import make_counts
+from SparCC.sparcc.approx_methods import run_sparcc_approx,approx_edges,screen_margin
+
+
+#Data Test
+counts,_=make_counts(300,40,density=0.05,seed=0)
+F=to_fractions(counts,method='pseudo')
+C,Cov=run_sparcc(F)
+iu=np.triu_indices(40,1)
+
+def test_run_sparcc_approx_exact_screen():
+    i,j,Ca,Cova,_=run_sparcc_approx(F,edge_th=0.2,k=1024)
+    assert set(zip(i,j))==set(zip(*[x[np.abs(C[iu])>=0.2] for x in iu]))
+    assert np.allclose(Ca,C[i,j]) and np.allclose(Cova,Cov[i,j])
+
+def test_run_sparcc_approx_sketch():
+    assert screen_margin(100,300)>0 and screen_margin(300,300)==0
+    i,j,Ca,_,_=run_sparcc_approx(F,edge_th=0.3,k=100,seed=1)
+    true=set(zip(*[x[np.abs(C[iu])>=0.3] for x in iu]))
+    assert len(true & set(zip(i,j)))>=0.9*len(true)
+    assert np.allclose(Ca,C[i,j]) and np.all(np.abs(Ca)>=0.3)
+
+def test_approx_edges():
+    edges=approx_edges(counts,edge_th=0.3,k=1024)
+    assert list(edges.columns)==['source','target','cor','cov']
+    assert np.all(np.diff(np.abs(edges['cor']))<=0)
+    with pytest.raises(ValueError):
+        approx_edges(counts[:,:10])
@@ -0,0 +1,22 @@
+import pytest
+import numpy as np
+import pandas as pd
+from SparCC.sparcc.batch_methods import read_manifest,run_batch
+from SparCC.sparcc.synthetic_methods import make_counts,make_frame
+from SparCC.sparcc.io_methods import write_txt
+
+
+def test_run_batch(tmp_path):
+    for i,D in enumerate([8,12,3]):
+        write_txt(make_frame(make_counts(30,D,seed=i)[0]),tmp_path/f'site_{i}.csv')
+    jobs=read_manifest(str(tmp_path/'site_*.csv'),outpath=str(tmp_path/'out'),
+                       defaults={'n_iter':2,'norm':'pseudo'})
+    assert list(jobs['name'])==['site_0','site_1','site_2'] and jobs['n_iter'].eq(2).all()
+
+    report=run_batch(jobs,n_workers=2,scratch=str(tmp_path/'scratch'),
+                     summary=str(tmp_path/'summary.csv'),verbose=False)
+    assert list(report['status'])==['done','done','failed']
+    assert list(tmp_path.joinpath('scratch').iterdir())==[]
+    cor=pd.read_csv(tmp_path/'out'/'site_1.cor.csv',index_col=0)
+    assert cor.shape==(12,12) and np.allclose(np.diag(cor),1)
+    assert pd.read_csv(tmp_path/'summary.csv').shape[0]==3
@@ -2,7 +2,9 @@ import pytest
 import numpy as np 
 from SparCC.sparcc.compositional_methods import clr
 from SparCC.sparcc.compositional_methods import run_clr
-from SparCC.sparcc.compositional_methods import variation_mat
+from SparCC.sparcc.compositional_methods import variation_mat,variation_mat_tiled
+from SparCC.sparcc.compositional_methods import select_backend
+import dask.array as da
 
 
 #Data Test
@@ -21,6 +23,20 @@ def test_variation_mat():
     m=variation_mat(L1)
     assert m.sum()==0.0
 
+def test_variation_mat_tiled():
+    f=np.random.default_rng(2).dirichlet(np.ones(23),size=40)
+    for tile in [4,7,64]:
+        assert np.allclose(variation_mat_tiled(f,tile=tile),variation_mat(f))
+    assert variation_mat_tiled(L1).sum()==0.0
+
+def test_run_clr_backends():
+    rng=np.random.default_rng(0)
+    f=rng.dirichlet(np.ones(30),size=40)
+    a=run_clr(f,backend='numpy')
+    b=run_clr(f,backend='dask')
+    assert np.allclose(a[0],b[0]) and np.allclose(a[1],b[1])
+    assert select_backend(f)=='numpy' and select_backend(da.from_array(f))=='dask'
+
 
 
 
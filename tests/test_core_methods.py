@@ -16,5 +16,6 @@ def test_to_fractions():
     m=to_fractions(L2)
     assert m.mean()==0.02
 
-
-
+def test_to_fractions_pseudo():
+    m=to_fractions(L2,method='pseudo')
+    assert m.mean()==0.02
@@ -0,0 +1,28 @@
+import numpy as np
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.incremental_methods import LogRatioStats
+from SparCC.sparcc.differential_methods import split_stats,differential_corr
+
+
+#Data Test
+rs=np.random.RandomState(1)
+L1=rs.randint(1,100,size=(40,10))
+G=np.array(['case']*15+['control']*25)
+
+def test_split_stats():
+    logf=np.log(to_fractions(L1,method='pseudo'))
+    total=LogRatioStats(10).add(logf)
+    for members in [G=='case',G=='control']:
+        a,b=split_stats(logf,total,members)
+        assert np.allclose(a.M2,LogRatioStats(10).add(logf[members]).M2)
+        assert np.allclose(b.variation(),LogRatioStats(10).add(logf[~members]).variation())
+
+def test_differential_corr():
+    res=differential_corr(L1,G,nperm=5,norm='pseudo',seed=0)
+    F=to_fractions(L1,method='pseudo')
+    assert np.allclose(res['cor_a'],basic_corr(F[:15])[0])
+    assert np.allclose(res['diff'],res['cor_a']-basic_corr(F[15:])[0])
+    p=res['p_vals']
+    assert p.shape==(10,10) and np.all(np.diag(p)==1) and p.min()>=0
+    assert np.array_equal(p,differential_corr(L1,G,nperm=5,norm='pseudo',seed=0)['p_vals'])
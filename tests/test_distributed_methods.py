@@ -0,0 +1,35 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.distributed_methods import cluster_client,distributed_corr,distributed_pvalues,tree_reduce
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.synthetic_methods import make_counts
+
+counts,_=make_counts(60,12,density=0.1,seed=0)
+
+
+@pytest.fixture(scope='module')
+def client():
+    # worker processes, numba parallel kernels are not thread safe across worker threads
+    with cluster_client(n_workers=2) as c:
+        yield c
+
+def test_tree_reduce(client):
+    futures=client.map(lambda x:np.full(3,x),range(10))
+    assert np.all(tree_reduce(client,futures,lambda *a:sum(a),fan_in=3).result()==45)
+
+def test_distributed_corr(client):
+    C,Cov=distributed_corr(counts,norm='pseudo',client=client,block_size=5,verbose=False)
+    C0,Cov0=basic_corr(to_fractions(counts,'pseudo'))
+    assert np.allclose(C,C0) and np.allclose(Cov,Cov0)
+
+    a,_=distributed_corr(counts,n_iter=3,seed=1,client=client,verbose=False)
+    b,_=distributed_corr(counts,n_iter=3,seed=1,client=client,block_size=4,verbose=False)
+    assert np.array_equal(a,b)
+
+def test_distributed_pvalues(client):
+    C,_=distributed_corr(counts,norm='pseudo',client=client,verbose=False)
+    p=distributed_pvalues(counts,C,nperm=4,norm='pseudo',seed=0,client=client,fan_in=2)
+    assert p.shape==C.shape and np.all(np.diag(p)==1)
+    assert np.all((p*4)%1==0)
+    assert np.array_equal(p,distributed_pvalues(counts,C,nperm=4,norm='pseudo',seed=0,client=client))
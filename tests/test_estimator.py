@@ -0,0 +1,24 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.estimator import SparCC
+
+
+#Data Test
+rs=np.random.RandomState(0)
+L1=rs.randint(0,100,size=(60,12))
+
+def test_fit_pseudo():
+    model=SparCC(norm='pseudo').fit(L1)
+    A,B=basic_corr(to_fractions(L1,method='pseudo'))
+    assert np.allclose(model.correlation_,A,equal_nan=True)
+    assert np.allclose(model.covariance_,B,equal_nan=True)
+
+def test_fit_reuses_buffers():
+    model=SparCC(n_iter=3,random_state=0)
+    C1=model.fit_transform(L1)
+    S=model._S
+    C2=model.fit_transform(L1)
+    assert model._S is S and C1.shape==C2.shape==(12,12)
+    assert np.allclose(SparCC(n_iter=3,random_state=0).fit_transform(L1),C1,equal_nan=True)
@@ -0,0 +1,36 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.filter_methods import select_components,prefilter,expand_result,expand_knn,filter_report
+from SparCC.sparcc.synthetic_methods import make_counts,make_frame
+
+counts,_=make_counts(40,30,log_sd=2.,seed=0)
+frame=make_frame(counts)
+
+
+def test_select_components():
+    keep=select_components(counts,top_n=10)
+    assert keep.sum()==10 and counts[:,keep].sum(axis=0).min()>=counts[:,~keep].sum(axis=0).max()
+    keep=select_components(counts,prevalence=0.9,min_count=100)
+    assert np.all((counts[:,keep]>0).mean(axis=0)>=0.9) and np.all(counts[:,keep].sum(axis=0)>=100)
+
+def test_prefilter():
+    filtered,keep=prefilter(frame,top_n=10)
+    assert list(filtered.columns[:-1])==list(frame.columns[keep]) and filtered.columns[-1]=='other'
+    assert np.array_equal(filtered.sum(axis=1),frame.sum(axis=1))
+
+    cor=np.arange(121.).reshape(11,11)
+    full=expand_result(cor,keep,frame.columns)
+    assert full.shape==(30,30) and np.isnan(full.values).sum()==900-100
+    assert full.loc[frame.columns[keep],frame.columns[keep]].values.sum()==cor[:10,:10].sum()
+
+    report=filter_report(frame,keep)
+    assert report['components_after']==11 and report['speedup']>1
+
+def test_expand_knn():
+    keep=np.array([True,False,True,True])
+    # filtered components 0,2,3 of the original and other (position 3)
+    index=np.array([[3,1],[2,0],[0,3],[0,1]])
+    value=np.array([[.9,.5],[.4,.3],[.8,.2],[.7,.6]])
+    I,V=expand_knn(index,value,keep)
+    assert np.array_equal(I,[[2,-1],[-1,-1],[3,0],[0,-1]])
+    assert np.allclose(V[0],[.5,np.nan],equal_nan=True) and np.all(np.isnan(V[1]))
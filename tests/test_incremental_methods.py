@@ -0,0 +1,25 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.compositional_methods import variation_mat
+from SparCC.sparcc.incremental_methods import LogRatioStats,IncrementalSparCC
+
+
+#Data Test
+rs=np.random.RandomState(0)
+L1=rs.randint(0,100,size=(60,12))
+F=to_fractions(L1,method='pseudo')
+
+def test_log_ratio_stats():
+    s=LogRatioStats(12).add(np.log(F[:25])).add(np.log(F[25:]))
+    assert np.allclose(s.variation(),variation_mat(F))
+    s.remove(np.log(F[40:]))
+    assert np.allclose(s.variation(),variation_mat(F[:40]))
+
+def test_incremental_sparcc():
+    inc=IncrementalSparCC(norm='pseudo')
+    inc.partial_fit(L1[:30]).partial_fit(L1[30:])
+    C,Cov=inc.correlation()
+    A,B=basic_corr(F)
+    assert inc.n_samples==60 and np.allclose(C,A) and np.allclose(Cov,B)
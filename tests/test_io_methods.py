@@ -0,0 +1,27 @@
+import pytest
+import numpy as np
+import pandas as pd
+from SparCC.sparcc.io_methods import read_counts,read_txt
+
+
+def test_read_counts(tmp_path):
+    rng=np.random.default_rng(0)
+    table=pd.DataFrame(rng.poisson(5,(30,6)),index=['otu%d'%i for i in range(30)],
+                       columns=['s%d'%i for i in range(6)]).rename_axis('OTU_id')
+    for sep,name in [('\t','t.txt'),(',','t.csv')]:
+        table.to_csv(tmp_path/name,sep=sep)
+        counts,otus,samples=read_counts(tmp_path/name,chunk_rows=7,verbose=False)
+        assert counts.flags.f_contiguous and counts.dtype==np.int64
+        assert np.array_equal(counts,table.values.T)
+        assert list(otus)==list(table.index) and list(samples)==list(table.columns)
+
+    L1=read_txt(tmp_path/'t.txt',index_col=0,verbose=False)
+    assert np.array_equal(read_counts(tmp_path/'t.txt',verbose=False)[0],L1.values)
+
+def test_read_counts_float(tmp_path):
+    table=pd.DataFrame({'s0':[1.,2.],'s1':[0.5,3.]},index=['a','b'])
+    table.to_csv(tmp_path/'f.txt',sep='\t')
+    counts,_,_=read_counts(tmp_path/'f.txt',chunk_rows=1,verbose=False)
+    assert counts.dtype==np.float64 and np.array_equal(counts,table.values.T)
+    with pytest.raises(ValueError):
+        read_counts(tmp_path/'f.txt',dtype=np.int64,verbose=False)
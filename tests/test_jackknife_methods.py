@@ -0,0 +1,27 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.jackknife_methods import jackknife_corr
+
+
+#Data Test
+rs=np.random.RandomState(0)
+L1=rs.randint(0,100,size=(30,12))
+F=to_fractions(L1,method='pseudo')
+
+@pytest.mark.parametrize('method',['sparcc','clr'])
+def test_jackknife_corr(method):
+    res=jackknife_corr(L1,method=method,norm='pseudo')
+    A,B=basic_corr(F,method=method)
+    assert np.allclose(res['cor'],A) and np.allclose(res['cov'],B)
+    loo=np.array([basic_corr(np.delete(F,k,axis=0),method=method)[0] for k in range(len(F))])
+    n=len(F)
+    mean=loo.mean(axis=0)
+    assert np.allclose(res['jack_mean'],mean)
+    assert np.allclose(res['jack_var'],(n-1.)/n*((loo-mean)**2).sum(axis=0))
+    assert np.all(res['n'][np.triu_indices(12,1)]==n)
+
+def test_jackknife_few_samples():
+    with pytest.raises(ValueError):
+        jackknife_corr(L1[:2])
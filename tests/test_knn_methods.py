@@ -0,0 +1,43 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.knn_methods import top_k_rows,median_top_k,knn_edges
+from SparCC.sparcc.SparCC import main_alg
+from SparCC.sparcc.synthetic_methods import make_counts
+
+rng=np.random.default_rng(0)
+stack=np.tanh(rng.normal(0,0.5,(5,12,12)))
+stack[:,2,7]=np.nan
+
+
+def test_top_k_rows():
+    cor=stack[0]
+    index,value=top_k_rows(cor,4)
+    for i in range(12):
+        score=np.abs(cor[i])
+        score[i]=-1
+        score[np.isnan(score)]=-1
+        assert list(index[i])==list(np.argsort(-score,kind='stable')[:4])
+        assert np.array_equal(value[i],cor[i,index[i]])
+    assert 7 not in index[2]
+    index,_=top_k_rows(cor,20)
+    assert index.shape==(12,11) and index[2,-1]==-1 and np.all(index[3]>=0)
+
+def test_median_top_k():
+    med=np.nanmedian(stack,axis=0)
+    index,value=median_top_k(list(stack),3,block_size=5)
+    assert np.array_equal(index,top_k_rows(med,3)[0]) and np.allclose(value,top_k_rows(med,3)[1])
+
+    edges=knn_edges(index,value,labels=np.arange(12)+100)
+    assert len(edges)==36 and edges['rank'].max()==3
+    assert np.allclose(edges['cor'],med[edges['source']-100,edges['target']-100])
+
+def test_main_alg_top_k(tmp_path):
+    counts,_=make_counts(40,15,seed=0)
+    for sub in ['cor','cov']:
+        (tmp_path/sub).mkdir()
+    kwargs=dict(n_iter=2,norm='pseudo',path_subdir_cor=str(tmp_path/'cor'),
+                path_subdir_cov=str(tmp_path/'cov'),verbose=False)
+    cor,_=main_alg(counts,**kwargs)
+    index,value=main_alg(counts,top_k=4,block_size=6,**kwargs)
+    assert index.shape==(15,4)
+    assert np.array_equal(index,top_k_rows(cor,4)[0])
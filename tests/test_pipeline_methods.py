@@ -0,0 +1,23 @@
+import numpy as np
+from SparCC.sparcc.pipeline_methods import pipelined_pvalues
+from SparCC.sparcc.distributed_methods import estimate_corr
+from SparCC.sparcc.shard_methods import shard_counts
+from SparCC.sparcc.synthetic_methods import make_counts
+
+counts,_=make_counts(40,8,density=0.1,seed=1)
+
+
+def test_pipelined_pvalues(tmp_path):
+    kwargs=dict(norm='dirichlet',n_iter=2,x_iter=3)
+    cor,cov,p_vals=pipelined_pvalues(counts,nperm=4,seed=5,n_workers=2,depth=1,verbose=False,
+                                     perm_template=str(tmp_path/'perm_#.csv'),**kwargs)
+    real=estimate_corr(counts,'sparcc','dirichlet',0.1,3,1,np.random.SeedSequence(5).spawn(2))
+    assert np.allclose(cor,real[0],equal_nan=True) and np.allclose(cov,real[1],equal_nan=True)
+
+    full=shard_counts(counts,cor,0,4,seed=5,verbose=False,**kwargs)/4.
+    np.fill_diagonal(full,1)
+    assert np.array_equal(p_vals,full)
+    assert len(list(tmp_path.glob('perm_*.csv')))==4
+
+    _,cov,same=pipelined_pvalues(counts,cor,nperm=4,seed=5,n_workers=1,verbose=False,**kwargs)
+    assert cov is None and np.array_equal(same,p_vals)
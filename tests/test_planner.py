@@ -0,0 +1,14 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.planner import plan,recommend
+
+
+def test_plan():
+    P=plan(200,1000,n_iter=20)
+    assert P.loc['in-memory','peak_bytes']>P.loc['spilled','peak_bytes']
+    assert plan(200,1000,dtype='float32').loc['spilled','peak_bytes']<P.loc['spilled','peak_bytes']
+
+def test_recommend():
+    assert recommend(200,100,available=1e12)['mode']=='in-memory'
+    assert recommend(200,5000,available=4e9)['mode']=='spilled'
+    assert recommend(200,20000,available=1e6)['mode'] is None
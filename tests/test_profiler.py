@@ -0,0 +1,23 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.profiler import Profiler
+
+
+def test_profiler_spans():
+    P=Profiler()
+    P.enable()
+    with P.span('iteration',iteration=3):
+        with P.span('inner'):
+            np.ones((100,100)).sum()
+        P.count('excluded_pairs',5)
+    P.disable()
+    R=P.report()
+    assert list(R['stage'])==['inner','excluded_pairs','iteration']
+    assert np.all(R['iteration']==3) and R['wall_s'].iloc[2]>=R['wall_s'].iloc[0]
+    assert P.summary().loc['inner','calls']==1
+
+def test_profiler_disabled():
+    P=Profiler()
+    with P.span('stage'):
+        P.count('n',1)
+    assert len(P.records)==0
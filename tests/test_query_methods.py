@@ -0,0 +1,31 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import run_sparcc,basis_var,basis_var_lowrank
+from SparCC.sparcc.query_methods import run_sparcc_query,run_clr_query
+from SparCC.sparcc.compositional_methods import run_clr
+
+
+#Data Test
+rs=np.random.RandomState(0)
+F=rs.dirichlet(np.ones(20),size=60)
+F[:,1]=F[:,0]*rs.lognormal(0,0.1,60)
+F=F/F.sum(axis=1,keepdims=True)
+Q=[0,1,7]
+
+def test_basis_var_lowrank():
+    D=10
+    V=np.diag(np.arange(1.,D+1))
+    M=np.ones((D,D)) + np.diag([D-2]*D)
+    for i,j in [(0,1),(2,5)]:
+        M[i,j]-=1; M[j,i]-=1; M[i,i]-=1; M[j,j]-=1
+    assert np.allclose(basis_var(V,M),basis_var_lowrank(V.sum(axis=1),[(0,1),(2,5)]))
+
+def test_run_sparcc_query():
+    C,Cov=run_sparcc(F,th=0.1,x_iter=10)
+    Cq,Covq,_=run_sparcc_query(F,Q,th=0.1,x_iter=10,block_size=3)
+    assert np.allclose(C[Q],Cq) and np.allclose(Cov[Q],Covq)
+
+def test_run_clr_query():
+    C,Cov=run_clr(F)
+    Cq,Covq,_=run_clr_query(F,Q)
+    assert np.allclose(C[Q],Cq) and np.allclose(Cov[Q],Covq)
@@ -0,0 +1,40 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.resources import (cgroup_cpu_limit,cgroup_memory_limit,split_budget,
+                                     thread_budget,get_thread_budget)
+
+
+def _write(path,text):
+    path.parent.mkdir(parents=True,exist_ok=True)
+    path.write_text(text)
+
+def test_cgroup_v2(tmp_path):
+    proc=tmp_path/'cgroup'
+    _write(proc,'0::/kubepods/pod1\n')
+    root=tmp_path/'fs'
+    _write(root/'cgroup.controllers','cpu memory')
+    _write(root/'kubepods'/'cpu.max','max 100000')
+    _write(root/'kubepods'/'memory.max','8000000000')
+    _write(root/'kubepods'/'pod1'/'cpu.max','250000 100000')
+    _write(root/'kubepods'/'pod1'/'memory.max','max')
+    _write(root/'kubepods'/'memory.current','1000')
+    assert cgroup_cpu_limit(str(root),str(proc))==2.5
+    assert cgroup_memory_limit(str(root),str(proc))==(8000000000,1000)
+
+def test_cgroup_v1(tmp_path):
+    root=tmp_path/'fs'
+    _write(root/'cpu,cpuacct'/'cpu.cfs_quota_us','400000')
+    _write(root/'cpu,cpuacct'/'cpu.cfs_period_us','100000')
+    _write(root/'memory'/'memory.limit_in_bytes',str(2**63-4096))
+    assert cgroup_cpu_limit(str(root),str(tmp_path/'none'))==4.0
+    assert cgroup_memory_limit(str(root),str(tmp_path/'none'))==(None,None)
+
+def test_thread_budget():
+    import numba
+    assert split_budget(4,total=10)==2
+    assert split_budget(16,total=4)==1
+    before=get_thread_budget()
+    with thread_budget(1):
+        assert get_thread_budget()==1
+        assert numba.get_num_threads()==1
+    assert get_thread_budget()==before
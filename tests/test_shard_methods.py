@@ -0,0 +1,37 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.shard_methods import shard_counts,save_partial,merge_partials
+from SparCC.sparcc.distributed_methods import cluster_client,distributed_pvalues
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.synthetic_methods import make_counts
+
+counts,_=make_counts(60,10,density=0.1,seed=0)
+cor,_=basic_corr(to_fractions(counts,'pseudo'))
+
+
+def test_merge_partials(tmp_path):
+    kwargs=dict(seed=3,norm='pseudo',verbose=False)
+    files=[]
+    for a,b in [(0,2),(2,5)]:
+        n_sig=shard_counts(counts,cor,a,b,**kwargs)
+        assert n_sig.max()<=b-a
+        files.append(str(tmp_path/f'p{a}.npz'))
+        save_partial(files[-1],n_sig,a,b,3,'two_sided',cor,norm='pseudo')
+    p_vals,nperm=merge_partials(files)
+    assert nperm==5
+
+    full=shard_counts(counts,cor,0,5,**kwargs)/5.
+    np.fill_diagonal(full,1)
+    assert np.array_equal(p_vals.values,full)
+
+    with cluster_client(n_workers=1) as c:
+        assert np.array_equal(p_vals.values,distributed_pvalues(counts,cor,nperm=5,seed=3,norm='pseudo',client=c))
+
+    with pytest.raises(ValueError):
+        merge_partials(files+[files[0]])
+
+    other=str(tmp_path/'p5.npz')
+    save_partial(other,shard_counts(counts,cor,5,6,**kwargs),5,6,3,'two_sided',cor,norm='pseudo',th=0.2)
+    with pytest.raises(ValueError):
+        merge_partials(files+[other])
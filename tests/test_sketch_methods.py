@@ -0,0 +1,50 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.sketch_methods import P2Quantile,QuantileSketch,CorrelationSketch
+from SparCC.sparcc.SparCC import main_alg
+from SparCC.sparcc.synthetic_methods import make_counts
+
+rng=np.random.default_rng(0)
+
+
+def test_p2_quantile():
+    # example of Jain and Chlamtac (1985)
+    data=[0.02,0.15,0.74,3.39,0.83,22.37,10.15,15.43,38.62,15.92,
+          34.60,10.28,1.47,0.40,0.05,11.39,0.27,0.42,0.09,11.37]
+    p2=P2Quantile(0.5,1,tail=0)
+    for x in data:
+        p2.update(np.array([x]))
+    assert np.allclose(p2.q[:,0],[0.02,0.49,4.44,17.20,38.62],atol=5e-3)
+    assert np.isclose(p2.value()[0],4.44,atol=5e-3)
+
+    X=rng.normal(size=(3000,50))
+    for p in [0.1,0.9]:
+        p2=P2Quantile(p,50)
+        for x in X:
+            p2.update(x)
+        assert np.abs(p2.value()-np.quantile(X,p,axis=0)).mean()<0.05
+
+def test_quantile_sketch():
+    X=rng.normal(size=(40,20))
+    X[:5,3]=np.nan
+    sketch=QuantileSketch((20,))
+    for x in X:
+        sketch.update(x)
+    r=sketch.result()
+    # exact inside the tails
+    assert np.allclose(r['q0.025'],np.nanquantile(X,0.025,axis=0))
+    assert np.allclose(r['q0.975'],np.nanquantile(X,0.975,axis=0))
+    assert np.allclose(r['sd'],np.nanstd(X,axis=0,ddof=1)) and r['n'][3]==35
+    with pytest.raises(ValueError):
+        sketch.update(np.zeros(3))
+
+def test_main_alg_sketch(tmp_path):
+    counts,_=make_counts(40,10,seed=0)
+    for sub in ['cor','cov']:
+        (tmp_path/sub).mkdir()
+    sketch=CorrelationSketch(10)
+    main_alg(counts,n_iter=6,path_subdir_cor=str(tmp_path/'cor'),
+             path_subdir_cov=str(tmp_path/'cov'),sketch=sketch,verbose=False)
+    r=sketch.result()
+    assert np.all(r['n'][np.triu_indices(10,1)]==6)
+    assert np.all(r['q0.025']<=r['q0.975']+1e-6) and np.allclose(r['q0.025'],r['q0.025'].T)
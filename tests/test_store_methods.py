@@ -0,0 +1,26 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.store_methods import write_store,ResultStore
+
+
+def test_result_store(tmp_path):
+    rng=np.random.default_rng(0)
+    cor=np.tanh(rng.normal(size=(6,6)))
+    cor=(cor+cor.T)/2
+    np.fill_diagonal(cor,1)
+    cor[0,3]=cor[3,0]=np.nan
+    labels=['a','b','c','d','e','f']
+    write_store(tmp_path,labels,cor=cor,variances=np.arange(6.))
+    write_store(tmp_path,labels,p_vals=np.ones((6,6)))
+    with pytest.raises(ValueError):
+        write_store(tmp_path,labels[::-1],p_vals=np.ones((6,6)))
+
+    store=ResultStore(tmp_path)
+    assert sorted(store.names)==['cor','p_vals','variances']
+    assert np.array_equal(store.row('b').values,cor[1]) and store.row('c','variances')==2.
+    assert np.array_equal(store.submatrix(['e','b'],['a','f']).values,cor[np.ix_([4,1],[0,5])])
+
+    top=store.top_k('a',k=3)
+    order=[j for j in np.argsort(-np.abs(cor[0])) if j not in (0,3)][:3]
+    assert list(top['partner'])==[labels[j] for j in order]
+    assert len(store.top_k('a',k=10))==4
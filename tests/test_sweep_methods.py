@@ -0,0 +1,24 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import run_sparcc
+from SparCC.sparcc.compositional_methods import variation_mat
+from SparCC.sparcc.sweep_methods import make_grid,sweep_path,sweep_corr
+
+
+#Data Test
+rs=np.random.RandomState(0)
+F=rs.dirichlet(np.ones(20),size=60)
+F[:,1]=F[:,0]*rs.lognormal(0,0.1,60)
+F=F/F.sum(axis=1,keepdims=True)
+grid=make_grid([0.05,0.1,0.3],[1,3,10])
+
+def test_sweep_path():
+    states=sweep_path(variation_mat(F),grid)
+    for g,(th,x) in grid.iterrows():
+        C,Cov=run_sparcc(F,th=th,x_iter=int(x))
+        assert np.allclose(C,states[g][1]) and np.allclose(Cov,states[g][2])
+
+def test_sweep_corr():
+    counts=rs.randint(1,100,size=(30,10))
+    G,C,Cov=sweep_corr(counts,grid,n_iter=2,verbose=False)
+    assert C.shape==(len(grid),10,10) and np.all(G['n_excluded']<=G['x_iter'])
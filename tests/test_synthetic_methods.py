@@ -0,0 +1,15 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.synthetic_methods import make_edges,make_counts,true_correlation
+
+
+def test_make_edges():
+    e=make_edges(30,density=1.0,seed=0)
+    assert len(e)==435 and np.all(e['i']<e['j']) and len(set(zip(e['i'],e['j'])))==435
+
+def test_make_counts():
+    c1,e1=make_counts(40,25,density=0.1,seed=3)
+    c2,e2=make_counts(40,25,density=0.1,seed=3)
+    T=true_correlation(e1,25)
+    assert c1.shape==(40,25) and np.all(c1==c2)
+    assert np.allclose(T,T.T) and np.all(np.abs(T)<=1)
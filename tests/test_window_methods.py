@@ -0,0 +1,16 @@
+import pytest
+import numpy as np
+from SparCC.sparcc.SparCC import basic_corr
+from SparCC.sparcc.core_methods import to_fractions
+from SparCC.sparcc.window_methods import iter_windows
+
+
+#Data Test
+rs=np.random.RandomState(0)
+L1=rs.randint(0,100,size=(50,12))
+
+@pytest.mark.parametrize('step',[3,20])
+def test_iter_windows(step):
+    for start,C,Cov in iter_windows(L1,20,step,refresh=2):
+        A,B=basic_corr(to_fractions(L1[start:start+20],method='pseudo'))
+        assert np.allclose(C,A,equal_nan=True) and np.allclose(Cov,B,equal_nan=True)